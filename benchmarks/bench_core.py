@@ -0,0 +1,195 @@
+"""
+Times the hot paths of money.money: construction, parsing, the arithmetic
+and comparison operators, currency checks, string conversion, pickling and
+summing lists. The `backend_<name>_*` benchmarks repeat construction, the
+arithmetic and summing with Money types using each backend of
+money.backends, to compare the representations. When NumPy is installed,
+`numpy_column_sum` sums the amounts as an array of minor units for
+reference.
+
+    $ python -m benchmarks.bench_core [--output new.json] [--baseline old.json]
+
+Results are in nanoseconds per operation, the best of --repeat runs. With
+--baseline, benchmarks slower than the baseline by more than --threshold
+are reported as regressions and the exit status is 1.
+"""
+import json
+import optparse
+import platform
+import sys
+import timeit
+from decimal import Decimal
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from money import Money, CURRENCY, CurrencyMismatchException, var
+from money.backends import DECIMAL, FRACTION, MINOR_UNITS
+
+# The number of elements of the summed lists
+LIST_SIZE = 1000
+
+
+def make_benchmarks():
+    """ The list of (name, function, operations per call) """
+    usd = CURRENCY['USD']
+    amount = Decimal('1234.56')
+    a = Money('1234.56', 'USD')
+    b = Money('65.43', 'USD')
+    eur = Money('65.43', 'EUR')
+    pickled = pickle.dumps(a, 2)
+    moneys = [Money(Decimal(i) / 100, 'USD') for i in range(LIST_SIZE)]
+    minor_units = [int(m.amount * 100) for m in moneys]
+    zero = Money(0, 'USD')
+    discount = Money('1.50', 'USD')
+    tax = Decimal('0.2')
+    formula = ((var('price', 'USD') * var('qty') - var('discount', 'USD')) * (1 + var('tax')) / 2).compile()
+    row = {'price': a, 'qty': 3, 'discount': discount, 'tax': tax}
+
+    def mismatch():
+        try:
+            a + eur
+        except CurrencyMismatchException:
+            pass
+
+    benchmarks = [
+        ('construct_str', lambda: Money('1234.56', 'USD'), 1),
+        ('construct_int', lambda: Money(1234, 'USD'), 1),
+        ('construct_decimal', lambda: Money(amount, 'USD'), 1),
+        ('construct_float', lambda: Money(1234.56, 'USD'), 1),
+        ('construct_currency', lambda: Money(amount, usd), 1),
+        ('from_string', lambda: Money.from_string('USD 1234.56'), 1),
+        ('add', lambda: a + b, 1),
+        ('sub', lambda: a - b, 1),
+        ('mul', lambda: a * 3, 1),
+        ('div', lambda: a / 3, 1),
+        ('neg', lambda: -a, 1),
+        ('eq', lambda: a == b, 1),
+        ('lt', lambda: a < b, 1),
+        ('le', lambda: a <= b, 1),
+        ('gt', lambda: a > b, 1),
+        ('ge', lambda: a >= b, 1),
+        ('bool', lambda: bool(a), 1),
+        ('currency_check', lambda: a._currency_check(b), 1),
+        ('currency_mismatch', mismatch, 1),
+        ('str', lambda: str(a), 1),
+        ('str_new', lambda: str(Money(amount, usd)), 1),
+        ('repr', lambda: repr(a), 1),
+        ('format', lambda: format(a, ','), 1),
+        ('pickle_dumps', lambda: pickle.dumps(a, 2), 1),
+        ('pickle_loads', lambda: pickle.loads(pickled), 1),
+        ('formula_eager', lambda: (a * 3 - discount) * (1 + tax) / 2, 1),
+        ('formula_compiled', lambda: formula(row), 1),
+        ('sum_list', lambda: sum(moneys, zero), LIST_SIZE),
+    ]
+    for backend in (DECIMAL, MINOR_UNITS, FRACTION):
+        benchmarks.extend(_backend_benchmarks(backend))
+    if numpy is not None:
+        array = numpy.array(minor_units, dtype=numpy.int64)
+        benchmarks.append(('numpy_column_sum', lambda: array.sum(), LIST_SIZE))
+    return benchmarks
+
+
+def _backend_benchmarks(backend):
+    """ The benchmarks of a Money type using `backend` """
+    cls = type('%sMoney' % backend.__class__.__name__, (Money,), {'backend': backend})
+    a = cls('1234.56', 'USD')
+    b = cls('65.43', 'USD')
+    moneys = [cls(Decimal(i) / 100, 'USD') for i in range(LIST_SIZE)]
+    zero = cls(0, 'USD')
+    prefix = 'backend_%s_' % backend.name
+    return [
+        (prefix + 'construct', lambda: cls('1234.56', 'USD'), 1),
+        (prefix + 'add', lambda: a + b, 1),
+        (prefix + 'mul', lambda: a * 3, 1),
+        (prefix + 'div', lambda: a / 3, 1),
+        (prefix + 'lt', lambda: a < b, 1),
+        # str() is cached on the instance, this is the conversion it caches
+        (prefix + 'to_string', lambda: backend.to_string(a.value, a.currency), 1),
+        (prefix + 'sum', lambda: sum(moneys, zero), LIST_SIZE),
+    ]
+
+
+def run(repeat=5, number=10000, names=None, verbose=True):
+    """
+    Runs the benchmarks. Each is called `number` times per run, fewer for
+    those doing many operations per call, and the best run is kept.
+    """
+    results = []
+    for name, function, ops in make_benchmarks():
+        if names and name not in names:
+            continue
+        calls = max(1, number // ops)
+        best = min(timeit.Timer(function).repeat(repeat, calls))
+        ns_per_op = best * 1e9 / (calls * ops)
+        results.append({'name': name, 'ops': calls * ops, 'ns_per_op': round(ns_per_op, 2)})
+        if verbose:
+            print("%-30s %10.1f ns/op" % (name, ns_per_op))
+    return results
+
+
+def compare(results, baseline, threshold=0.1, key='ns_per_op'):
+    """
+    Compares results with the results of a baseline run. Returns the list of
+    (name, ratio) of the benchmarks whose `key` grew by more than
+    `threshold` over the baseline, e.g. 0.1 for 10%.
+    """
+    previous = dict((r['name'], r) for r in baseline['results'])
+    regressions = []
+    for result in results:
+        old = previous.get(result['name'])
+        if not old or not old.get(key):
+            continue
+        ratio = result[key] / old[key]
+        if ratio > 1 + threshold:
+            regressions.append((result['name'], ratio))
+    return regressions
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'numpy': numpy.__version__ if numpy is not None else None,
+        'platform': platform.platform(),
+    }
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage="python -m benchmarks.bench_core [options]")
+    parser.add_option('--repeat', type='int', default=5,
+                      help='Runs per benchmark, the best is kept [default: %default]')
+    parser.add_option('--number', type='int', default=10000,
+                      help='Operations per run [default: %default]')
+    parser.add_option('--only', default='',
+                      help='Comma separated benchmark names to run')
+    parser.add_option('--output', help='Write the results as JSON to this file')
+    parser.add_option('--baseline', help='A JSON file of earlier results to compare with')
+    parser.add_option('--threshold', type='float', default=0.1,
+                      help='Slowdown reported as a regression [default: %default]')
+    options, _ = parser.parse_args(argv)
+
+    names = [name for name in options.only.split(',') if name]
+    results = {'environment': environment(), 'results': run(options.repeat, options.number, names)}
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+    if options.baseline:
+        with open(options.baseline) as baseline:
+            regressions = compare(results['results'], json.load(baseline), options.threshold)
+        for name, ratio in regressions:
+            print("REGRESSION %-30s %6.2fx" % (name, ratio))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
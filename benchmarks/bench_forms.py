@@ -0,0 +1,65 @@
+"""
+Times rendering a formset of money fields with and without the cached
+currency choices and the cached currency select.
+
+    $ python -m benchmarks.bench_forms [rows]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'money.tests.settings')
+
+from django import forms
+from django.forms.formsets import formset_factory
+
+from money import Money, CURRENCY
+from money.contrib.django.forms.fields import MoneyField
+
+
+class UncachedChoicesField(MoneyField):
+    """ The field as it was before the choices were cached """
+
+    def __init__(self, *args, **kwargs):
+        kwargs['choices'] = [
+            (c.code, u"{0} - {1}".format(c.code, c.name),) for i, c in sorted(CURRENCY.items()) if c.code != u'XXX']
+        super(UncachedChoicesField, self).__init__(*args, **kwargs)
+
+
+class UncachedForm(forms.Form):
+    price = UncachedChoicesField()
+
+
+class CachedChoicesForm(forms.Form):
+    price = MoneyField()
+
+
+class CachedWidgetForm(forms.Form):
+    price = MoneyField(cache_widget=True)
+
+
+def render_formset(form_class, rows):
+    formset_class = formset_factory(form_class, extra=0)
+    initial = [{'price': Money(i, 'USD' if i % 2 else 'EUR')} for i in range(rows)]
+    start = time.time()
+    formset = formset_class(initial=initial)
+    html = formset.as_p()
+    return time.time() - start, len(html)
+
+
+def main(rows=500):
+    results = []
+    for label, form_class in [
+            ('uncached', UncachedForm),
+            ('cached choices', CachedChoicesForm),
+            ('cached choices and widget', CachedWidgetForm)]:
+        # The first run fills the caches
+        render_formset(form_class, rows)
+        elapsed, size = render_formset(form_class, rows)
+        results.append((label, elapsed))
+        print("%-28s %4d rows  %8.1f ms  %d bytes" % (label, rows, elapsed * 1000, size))
+    return results
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,174 @@
+"""
+Measures the memory held by large collections of Money values, to size the
+processes that keep millions of them.
+
+    $ python -m benchmarks.bench_memory [--count 100000] [--currencies USD:6,EUR:3,JPY:1]
+                                        [--precision 2] [--output new.json] [--baseline old.json]
+
+A population of --count values is built with the given currency mix and
+amounts with --precision decimal places, and the bytes per element are
+reported for:
+
+    money               a Money instance with its Decimal amount
+    money_str_cached    the same after str() was called, which caches the string
+    currency            a Currency of the registry
+    decimal_column      an element of a list of Decimal amounts
+    minor_units_column  an element of an array of integer minor units
+
+Sizes are computed with sys.getsizeof() by walking the objects, counting
+each object once. Currencies are shared by all values and are not counted
+in the other rows. With --baseline, sizes larger than the baseline by more
+than --threshold are reported as regressions and the exit status is 1.
+"""
+import array
+import json
+import optparse
+import platform
+import random
+import sys
+import types
+from decimal import Decimal
+
+from money import Money, CURRENCY
+
+from benchmarks.bench_core import compare
+
+# Objects that are never part of a value's footprint
+_SHARED_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+                 types.MethodType)
+
+
+def deep_sizeof(obj, seen):
+    """
+    The bytes of obj and everything it references, skipping the objects
+    whose ids are in `seen` and adding the ones counted.
+    """
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _SHARED_TYPES):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        if hasattr(obj, '__dict__'):
+            stack.append(obj.__dict__)
+        for cls in type(obj).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                if hasattr(obj, name):
+                    stack.append(getattr(obj, name))
+    return size
+
+
+def parse_currencies(value):
+    """ Parses 'USD:6,EUR:3,JPY:1' into [('USD', 6), ('EUR', 3), ('JPY', 1)] """
+    mix = []
+    for part in value.split(','):
+        code, _, weight = part.partition(':')
+        mix.append((code.strip().upper(), float(weight or 1)))
+    return mix
+
+
+def make_population(count, currencies, precision, seed=0):
+    """ A list of count Money values with the currency mix and precision """
+    rnd = random.Random(seed)
+    codes = [code for code, _ in currencies]
+    total = sum(weight for _, weight in currencies)
+    cumulative = []
+    running = 0.0
+    for _, weight in currencies:
+        running += weight / total
+        cumulative.append(running)
+
+    population = []
+    for _ in xrange(count):
+        pick = rnd.random()
+        code = codes[-1]
+        for index, limit in enumerate(cumulative):
+            if pick < limit:
+                code = codes[index]
+                break
+        amount = Decimal(rnd.randint(0, 10 ** 7)).scaleb(-precision)
+        population.append(Money(amount, code))
+    return population
+
+
+def _shared():
+    """ The ids of the objects shared by all values: the currencies """
+    seen = set()
+    deep_sizeof(CURRENCY, seen)
+    return seen
+
+
+def measure(count=100000, currencies=(('USD', 6), ('EUR', 3), ('JPY', 1)), precision=2):
+    """ Returns the list of {'name', 'count', 'bytes_per_item'} results """
+    population = make_population(count, currencies, precision)
+    results = []
+
+    def add(name, total, items):
+        results.append({'name': name, 'count': items, 'bytes_per_item': round(total / float(items), 2)})
+
+    add('money', deep_sizeof(population, _shared()) - sys.getsizeof(population), count)
+    for money in population:
+        str(money)
+    add('money_str_cached', deep_sizeof(population, _shared()) - sys.getsizeof(population), count)
+
+    currency_seen = set()
+    add('currency', sum(deep_sizeof(currency, currency_seen) for currency in CURRENCY.values()),
+        len(CURRENCY))
+
+    amounts = [money.amount for money in population]
+    add('decimal_column', deep_sizeof(amounts, set()), count)
+
+    minor_units = array.array('l', (int(money.amount.scaleb(precision)) for money in population))
+    add('minor_units_column', sys.getsizeof(minor_units), count)
+    return results
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+    }
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage="python -m benchmarks.bench_memory [options]")
+    parser.add_option('--count', type='int', default=100000,
+                      help='The number of values [default: %default]')
+    parser.add_option('--currencies', default='USD:6,EUR:3,JPY:1',
+                      help='The currency mix as code:weight pairs [default: %default]')
+    parser.add_option('--precision', type='int', default=2,
+                      help='Decimal places of the amounts [default: %default]')
+    parser.add_option('--output', help='Write the results as JSON to this file')
+    parser.add_option('--baseline', help='A JSON file of earlier results to compare with')
+    parser.add_option('--threshold', type='float', default=0.05,
+                      help='Growth reported as a regression [default: %default]')
+    options, _ = parser.parse_args(argv)
+
+    results = measure(options.count, parse_currencies(options.currencies), options.precision)
+    for result in results:
+        print("%-20s %10d items %10.1f bytes/item" % (result['name'], result['count'], result['bytes_per_item']))
+
+    output = {'environment': environment(), 'results': results}
+    if options.output:
+        with open(options.output, 'w') as stream:
+            json.dump(output, stream, indent=2, sort_keys=True)
+    if options.baseline:
+        with open(options.baseline) as stream:
+            regressions = compare(results, json.load(stream), options.threshold, key='bytes_per_item')
+        for name, ratio in regressions:
+            print("REGRESSION %-20s %6.2fx" % (name, ratio))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,209 @@
+"""
+Times MoneyField round trips through the ORM on SQLite: saving, fetching,
+filtering by Money, bulk inserts, iteration, serialization and ModelForm
+rendering, at several table sizes.
+
+    $ python -m benchmarks.bench_orm [--sizes 1000,100000,1000000] [--output results.json]
+
+The results are printed and, with --output, written as JSON so that runs of
+different releases can be compared, e.g. with --compare old.json. Each
+result records the table size, the number of operations timed and the best
+time out of --repeat runs.
+"""
+import json
+import optparse
+import os
+import platform
+import random
+import sqlite3
+import sys
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'money.tests.settings')
+
+import django
+from django import forms
+from django.core import serializers
+from django.db import connection, transaction
+
+from money import Money
+from money.contrib.django.serializers import dump_jsonl
+from money.tests.models import SimpleMoneyModel
+
+CURRENCIES = ('USD', 'EUR', 'JPY', 'GBP')
+
+# Operations whose cost does not depend on the table size are timed on a
+# fixed number of rows
+SAMPLE = 1000
+
+
+class SimpleMoneyForm(forms.ModelForm):
+    class Meta:
+        model = SimpleMoneyModel
+        fields = ('name', 'price')
+
+
+class NullStream(object):
+    def write(self, data):
+        pass
+
+
+def make_instances(count, start=0):
+    return [
+        SimpleMoneyModel(name="item %d" % i, price=Money("%d.%02d" % (i % 1000, i % 100), CURRENCIES[i % 4]))
+        for i in xrange(start, start + count)
+    ]
+
+
+def fill(rows):
+    SimpleMoneyModel.objects.all().delete()
+    with transaction.atomic():
+        for start in xrange(0, rows, 10000):
+            SimpleMoneyModel.objects.bulk_create(make_instances(min(10000, rows - start), start))
+
+
+def bench_create(rows):
+    with transaction.atomic():
+        for instance in make_instances(SAMPLE, rows):
+            SimpleMoneyModel.objects.create(name=instance.name, price=instance.price)
+        transaction.set_rollback(True)
+    return SAMPLE
+
+
+def bench_bulk_create(rows):
+    with transaction.atomic():
+        SimpleMoneyModel.objects.bulk_create(make_instances(SAMPLE, rows), batch_size=500)
+        transaction.set_rollback(True)
+    return SAMPLE
+
+
+def bench_get(rows):
+    pks = SimpleMoneyModel.objects.values_list('pk', flat=True)
+    low, high = pks.order_by('pk')[0], pks.order_by('-pk')[0]
+    rnd = random.Random(rows)
+    for _ in xrange(SAMPLE):
+        SimpleMoneyModel.objects.get(pk=rnd.randint(low, high))
+    return SAMPLE
+
+
+def bench_filter(rows):
+    # Each filter scans the table, so fewer are run on large tables
+    count = max(1, min(100, 10 ** 7 // rows))
+    for i in xrange(count):
+        list(SimpleMoneyModel.objects.filter(price=Money(i % 1000, CURRENCIES[i % 4]))[:100])
+    return count
+
+
+def bench_iterate(rows):
+    for instance in SimpleMoneyModel.objects.stream(chunk_size=2000):
+        instance.price
+    return rows
+
+
+def bench_iterate_values(rows):
+    for chunk in SimpleMoneyModel.objects.chunked_values('name', 'price', chunk_size=2000):
+        pass
+    return rows
+
+
+def bench_dump_jsonl(rows):
+    return dump_jsonl(SimpleMoneyModel.objects.all(), NullStream(), chunk_size=2000)
+
+
+def bench_serialize(rows):
+    serializers.serialize('json', SimpleMoneyModel.objects.all()[:SAMPLE])
+    return min(rows, SAMPLE)
+
+
+def bench_modelform(rows):
+    count = 100
+    for instance in SimpleMoneyModel.objects.all()[:count]:
+        SimpleMoneyForm(instance=instance).as_p()
+    return count
+
+
+BENCHMARKS = [
+    ('create', bench_create),
+    ('bulk_create', bench_bulk_create),
+    ('get', bench_get),
+    ('filter_money', bench_filter),
+    ('iterate', bench_iterate),
+    ('iterate_values', bench_iterate_values),
+    ('dump_jsonl', bench_dump_jsonl),
+    ('serialize', bench_serialize),
+    ('modelform', bench_modelform),
+]
+
+
+def run(sizes, repeat=3, names=None):
+    results = []
+    for rows in sizes:
+        fill(rows)
+        for name, bench in BENCHMARKS:
+            if names and name not in names:
+                continue
+            best = None
+            for _ in range(repeat):
+                start = time.time()
+                ops = bench(rows)
+                elapsed = time.time() - start
+                best = elapsed if best is None else min(best, elapsed)
+            results.append({
+                'name': name,
+                'rows': rows,
+                'ops': ops,
+                'seconds': round(best, 6),
+                'us_per_op': round(best * 1e6 / ops, 3),
+            })
+            print("%-16s %9d rows %9d ops %10.1f ms %10.2f us/op" % (
+                name, rows, ops, best * 1000, best * 1e6 / ops))
+    return results
+
+
+def compare(results, baseline):
+    """ Prints the time of each result relative to the same one in baseline """
+    previous = dict(((r['name'], r['rows']), r) for r in baseline['results'])
+    for result in results:
+        old = previous.get((result['name'], result['rows']))
+        if old:
+            print("%-16s %9d rows %8.2fx" % (
+                result['name'], result['rows'], result['us_per_op'] / old['us_per_op']))
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+    }
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage="python -m benchmarks.bench_orm [options]")
+    parser.add_option('--sizes', default='1000,100000',
+                      help='Comma separated table sizes [default: %default]')
+    parser.add_option('--repeat', type='int', default=3,
+                      help='Runs per benchmark, the best is kept [default: %default]')
+    parser.add_option('--only', default='',
+                      help='Comma separated benchmark names to run')
+    parser.add_option('--output', help='Write the results as JSON to this file')
+    parser.add_option('--compare', help='A JSON file of earlier results to compare with')
+    options, _ = parser.parse_args(argv)
+
+    sizes = [int(size) for size in options.sizes.split(',')]
+    names = [name for name in options.only.split(',') if name]
+
+    connection.creation.create_test_db(verbosity=0)
+    results = {'environment': environment(), 'results': run(sizes, options.repeat, names)}
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+    if options.compare:
+        with open(options.compare) as baseline:
+            compare(results['results'], json.load(baseline))
+    return results
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
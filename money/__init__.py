@@ -1 +1,2 @@
 from money import *
+from expressions import expr, var
@@ -0,0 +1,158 @@
+"""
+Amortization schedules of loans.
+
+The payments, interest and principal of every period are computed in
+integer minor units of the loan's currency, with the interest of each
+period rounded half up to the currency's decimals. Rounding differences
+end up in the last period, which pays off the exact remaining balance:
+
+    from money.amortization import schedule
+
+    loan = schedule(Money('10000', 'USD'), rate='0.05', periods=12)
+    loan.payment[:2]        # [85607, 85607], in cents
+    for period, payment, interest, principal, balance in loan:
+        ...                 # Money values, created as the rows are read
+
+Plans are 'annuity' (equal payments), 'linear' (equal principal
+repayments) and 'interest_only' (the principal is repaid in the last
+period). `rate` is the yearly rate, divided over `periods_per_year`.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from fractions import Fraction
+
+from money import Money
+
+__all__ = ('PLANS', 'AmortizationSchedule', 'schedule', 'schedules', 'amortization')
+
+PLANS = ('annuity', 'linear', 'interest_only')
+
+
+def _round(numerator, denominator=1):
+    """ numerator / denominator rounded half away from zero """
+    quotient, remainder = divmod(abs(numerator), denominator)
+    if 2 * remainder >= denominator:
+        quotient += 1
+    return -quotient if numerator < 0 else quotient
+
+
+def _truncate(numerator, denominator):
+    """ numerator / denominator rounded towards zero """
+    quotient = abs(numerator) // denominator
+    return -quotient if numerator < 0 else quotient
+
+
+class _Plan(object):
+    """ A plan, rate and number of periods, shared by the loans of a batch """
+
+    def __init__(self, rate, periods, plan, periods_per_year):
+        if plan not in PLANS:
+            raise ValueError("Unknown plan %r, expected one of %s" % (plan, ", ".join(PLANS)))
+        if periods < 1:
+            raise ValueError("A schedule has at least one period")
+        self.plan = plan
+        self.periods = periods
+        self.rate = Fraction(Decimal(rate)) / periods_per_year
+        if plan == 'annuity':
+            if self.rate:
+                growth = (1 + self.rate) ** periods
+                self.factor = self.rate * growth / (growth - 1)
+            else:
+                self.factor = Fraction(1, periods)
+
+    def rows(self, principal):
+        """ Yields (payment, interest, principal, balance) in minor units """
+        rate = self.rate
+        if self.plan == 'annuity':
+            payment = _round(principal * self.factor.numerator, self.factor.denominator)
+        elif self.plan == 'linear':
+            # Rounded down, so the repayments never add up to more than the
+            # principal and the remainder is repaid in the last period
+            repayment = _truncate(principal, self.periods)
+
+        balance = principal
+        for period in range(1, self.periods + 1):
+            interest = _round(balance * rate.numerator, rate.denominator)
+            if period == self.periods:
+                repaid = balance
+            elif self.plan == 'annuity':
+                repaid = payment - interest
+            elif self.plan == 'linear':
+                repaid = repayment
+            else:
+                repaid = 0
+            if abs(repaid) > abs(balance):
+                # A payment rounded up on a small balance would overpay it
+                repaid = balance
+            balance -= repaid
+            yield interest + repaid, interest, repaid, balance
+
+
+class AmortizationSchedule(object):
+    """
+    The columns of a schedule, lists of integer minor units indexed by
+    period - 1. Iterating gives (period, payment, interest, principal,
+    balance) tuples of Money.
+    """
+
+    def __init__(self, currency, rows):
+        self.currency = currency
+        self.decimals = currency.decimals or 0
+        self.payment = []
+        self.interest = []
+        self.principal = []
+        self.balance = []
+        for payment, interest, principal, balance in rows:
+            self.payment.append(payment)
+            self.interest.append(interest)
+            self.principal.append(principal)
+            self.balance.append(balance)
+
+    def __len__(self):
+        return len(self.payment)
+
+    def _money(self, minor):
+        return Money(Decimal(minor).scaleb(-self.decimals), self.currency)
+
+    def __iter__(self):
+        for index in range(len(self.payment)):
+            yield (index + 1, self._money(self.payment[index]), self._money(self.interest[index]),
+                   self._money(self.principal[index]), self._money(self.balance[index]))
+
+    def total_interest(self):
+        return self._money(sum(self.interest))
+
+    def total_payment(self):
+        return self._money(sum(self.payment))
+
+
+def _minor_units(principal):
+    decimals = principal.currency.decimals or 0
+    return int(principal.amount.scaleb(decimals).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def schedule(principal, rate, periods, plan='annuity', periods_per_year=12):
+    """ The AmortizationSchedule of a loan of `principal`, a Money value """
+    return AmortizationSchedule(principal.currency,
+                                _Plan(rate, periods, plan, periods_per_year).rows(_minor_units(principal)))
+
+
+def schedules(principals, rate, periods, plan='annuity', periods_per_year=12):
+    """
+    Yields the AmortizationSchedule of each of many loans with the same
+    terms. The annuity factor is computed once for the batch.
+    """
+    terms = _Plan(rate, periods, plan, periods_per_year)
+    for principal in principals:
+        yield AmortizationSchedule(principal.currency, terms.rows(_minor_units(principal)))
+
+
+def amortization(principal, rate, periods, plan='annuity', periods_per_year=12):
+    """
+    Yields the (period, payment, interest, principal, balance) Money tuples
+    of a loan one period at a time, without keeping the schedule.
+    """
+    currency = principal.currency
+    decimals = currency.decimals or 0
+    rows = _Plan(rate, periods, plan, periods_per_year).rows(_minor_units(principal))
+    for period, row in enumerate(rows, 1):
+        yield (period,) + tuple(Money(Decimal(minor).scaleb(-decimals), currency) for minor in row)
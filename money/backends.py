@@ -0,0 +1,251 @@
+"""
+Representations of the amount of Money values.
+
+Money keeps its amount as a Decimal by default. A backend defines another
+representation with its own arithmetic, comparison, rounding and string
+conversion, and is chosen per Money type:
+
+    from money import Money
+    from money.backends import MINOR_UNITS
+
+    class LedgerMoney(Money):
+        backend = MINOR_UNITS
+
+    LedgerMoney('12.34', 'USD').value       # 1234, an int of cents
+
+The backends are:
+
+    DECIMAL         Decimal amounts, computed in the current MoneyContext
+    MINOR_UNITS     ints of the minor unit of the currency. Amounts with
+                    more decimals and results of multiplication and
+                    division are rounded half even to the decimals of
+                    the currency; MinorUnitsBackend(rounding) rounds
+                    otherwise
+    FRACTION        exact fractions.Fraction amounts
+
+Backends are also registered by name, see register_backend() and
+get_backend(). Whatever the backend, Money.amount is a Decimal.
+"""
+from decimal import (Decimal, DivisionByZero, ROUND_CEILING, ROUND_DOWN, ROUND_FLOOR, ROUND_HALF_DOWN,
+                     ROUND_HALF_EVEN, ROUND_HALF_UP, ROUND_UP)
+from fractions import Fraction
+
+from context import get_money_context
+
+__all__ = ('Backend', 'DecimalBackend', 'MinorUnitsBackend', 'FractionBackend',
+           'DECIMAL', 'MINOR_UNITS', 'FRACTION', 'register_backend', 'get_backend')
+
+
+def _cmp(a, b):
+    return (a > b) - (a < b)
+
+
+class Backend(object):
+    """
+    The interface of backends. Values are amounts in the backend's
+    representation; `currency` is the Currency of the amounts, for backends
+    whose representation depends on it.
+    """
+    name = None
+
+    def from_decimal(self, amount, currency):
+        """ The value of a Decimal amount """
+        raise NotImplementedError
+
+    def to_decimal(self, value, currency):
+        """ The Decimal amount of a value """
+        raise NotImplementedError
+
+    def add(self, a, b):
+        return a + b
+
+    def subtract(self, a, b):
+        return a - b
+
+    def negate(self, a):
+        return -a
+
+    def multiply(self, value, factor, currency):
+        """ Multiplies a value by a Decimal factor """
+        raise NotImplementedError
+
+    def divide(self, value, divisor, currency):
+        """ Divides a value by an int or Decimal """
+        raise NotImplementedError
+
+    def compare(self, a, b):
+        """ -1, 0 or 1 as a is less than, equal to or greater than b """
+        return _cmp(a, b)
+
+    def is_zero(self, value):
+        return value == 0
+
+    def round(self, value, currency, rounding=ROUND_HALF_UP):
+        """ A value rounded to the decimals of the currency """
+        raise NotImplementedError
+
+    def to_string(self, value, currency):
+        """ The amount as shown by str(money) """
+        return str(self.to_decimal(value, currency))
+
+    def serialize(self, value, currency):
+        """ A string from which deserialize() recreates the exact value """
+        return self.to_string(value, currency)
+
+    def deserialize(self, string, currency):
+        return self.from_decimal(Decimal(string), currency)
+
+    def __repr__(self):
+        return "<%s>" % self.__class__.__name__
+
+
+class DecimalBackend(Backend):
+    name = 'decimal'
+
+    def from_decimal(self, amount, currency):
+        return amount
+
+    def to_decimal(self, value, currency):
+        return value
+
+    def multiply(self, value, factor, currency):
+        return get_money_context().multiply(value, factor, currency)
+
+    def divide(self, value, divisor, currency):
+        return get_money_context().divide(value, divisor, currency)
+
+    def round(self, value, currency, rounding=ROUND_HALF_UP):
+        return value.quantize(Decimal(1).scaleb(-(currency.decimals or 0)), rounding=rounding)
+
+    def to_string(self, value, currency):
+        return str(value)
+
+
+class MinorUnitsBackend(Backend):
+    """
+    Amounts as ints of the minor unit of their currency, e.g. cents. Amounts
+    with more decimals than the currency, and the results of multiplication
+    and division, are rounded with `rounding`, one of the decimal module's
+    rounding modes.
+    """
+    name = 'minor_units'
+
+    def __init__(self, rounding=ROUND_HALF_EVEN):
+        if rounding not in _ROUND_UP_IF:
+            raise ValueError("Unknown rounding %r" % rounding)
+        self.rounding = rounding
+
+    def _divide(self, numerator, denominator):
+        """ numerator / denominator rounded with the rounding of the backend """
+        if not denominator:
+            raise DivisionByZero("Division by zero")
+        if denominator < 0:
+            numerator, denominator = -numerator, -denominator
+        negative = numerator < 0
+        quotient, remainder = divmod(abs(numerator), denominator)
+        if remainder and _ROUND_UP_IF[self.rounding](quotient, 2 * remainder, denominator, negative):
+            quotient += 1
+        return -quotient if negative else quotient
+
+    def from_decimal(self, amount, currency):
+        fraction = Fraction(amount) * 10 ** (currency.decimals or 0)
+        return self._divide(fraction.numerator, fraction.denominator)
+
+    def to_decimal(self, value, currency):
+        return Decimal(value).scaleb(-(currency.decimals or 0))
+
+    def multiply(self, value, factor, currency):
+        factor = Fraction(factor)
+        return self._divide(value * factor.numerator, factor.denominator)
+
+    def divide(self, value, divisor, currency):
+        if isinstance(divisor, float):
+            raise TypeError("Cannot divide by a float: %r" % divisor)
+        divisor = Fraction(divisor)
+        return self._divide(value * divisor.denominator, divisor.numerator)
+
+    def round(self, value, currency, rounding=ROUND_HALF_UP):
+        """
+        Returns the value unchanged: values are whole minor units, already
+        rounded with the rounding of the backend when they were created or
+        computed. `rounding` has no effect.
+        """
+        return value
+
+    def serialize(self, value, currency):
+        return str(value)
+
+    def deserialize(self, string, currency):
+        return int(string)
+
+
+# Whether to round the magnitude of a quotient up, given the quotient, twice
+# the remainder, the divisor and the sign of the result
+_ROUND_UP_IF = {
+    ROUND_HALF_EVEN: lambda q, twice, d, negative: twice > d or (twice == d and q % 2 == 1),
+    ROUND_HALF_UP: lambda q, twice, d, negative: twice >= d,
+    ROUND_HALF_DOWN: lambda q, twice, d, negative: twice > d,
+    ROUND_DOWN: lambda q, twice, d, negative: False,
+    ROUND_UP: lambda q, twice, d, negative: True,
+    ROUND_FLOOR: lambda q, twice, d, negative: negative,
+    ROUND_CEILING: lambda q, twice, d, negative: not negative,
+}
+
+
+class FractionBackend(Backend):
+    """ Exact amounts as fractions.Fraction, never rounded by arithmetic """
+    name = 'fraction'
+
+    def from_decimal(self, amount, currency):
+        return Fraction(amount)
+
+    def to_decimal(self, value, currency):
+        if value.denominator == 1:
+            return Decimal(value.numerator)
+        return get_money_context().decimal_context.divide(Decimal(value.numerator), Decimal(value.denominator))
+
+    def multiply(self, value, factor, currency):
+        return value * Fraction(factor)
+
+    def divide(self, value, divisor, currency):
+        if isinstance(divisor, float):
+            raise TypeError("Cannot divide by a float: %r" % divisor)
+        if not divisor:
+            raise DivisionByZero("Division by zero")
+        return value / Fraction(divisor)
+
+    def round(self, value, currency, rounding=ROUND_HALF_UP):
+        quantum = Fraction(1, 10 ** (currency.decimals or 0))
+        return Fraction(self.to_decimal(value / quantum, currency).to_integral_value(rounding=rounding)) * quantum
+
+    def serialize(self, value, currency):
+        return str(value)
+
+    def deserialize(self, string, currency):
+        return Fraction(string)
+
+
+DECIMAL = DecimalBackend()
+MINOR_UNITS = MinorUnitsBackend()
+FRACTION = FractionBackend()
+
+_BACKENDS = {}
+
+
+def register_backend(backend):
+    """ Makes a backend available to get_backend() by its name """
+    _BACKENDS[backend.name] = backend
+    return backend
+
+
+def get_backend(name):
+    """ The backend registered under a name, e.g. 'minor_units' """
+    try:
+        return _BACKENDS[name]
+    except KeyError:
+        raise ValueError("Unknown backend %r, expected one of %s" % (name, ", ".join(sorted(_BACKENDS))))
+
+
+register_backend(DECIMAL)
+register_backend(MINOR_UNITS)
+register_backend(FRACTION)
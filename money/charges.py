@@ -0,0 +1,256 @@
+"""
+Taxes and fees applied to batches of amounts.
+
+A Schedule is a list of rules, percentages and fixed fees, that is compiled
+once per currency into integer arithmetic on minor units. Applying it to a
+batch of amounts creates no intermediate Money values:
+
+    from money.charges import Schedule, percent, fixed
+
+    checkout = Schedule([
+        percent('vat', '0.20', inclusive=True),
+        percent('card', '0.029', minimum=Money('0.30', 'USD')),
+        fixed('handling', Money('0.50', 'USD')),
+    ])
+
+    result = checkout.apply([Money('10', 'USD'), Money('99.99', 'USD')])
+    result.line(0)      # {'net': USD 8.33, 'vat': USD 1.67, 'card': USD 0.30, 'handling': USD 0.50,
+                        #  'total': USD 10.80}
+    result.totals()     # the same, summed over the batch
+
+Percentages are of the net amount, or with `compound` of the net amount
+plus all the charges before them. Inclusive percentages are taxes already
+included in the amounts: the net amount is what is left after taking them
+out. Charges are rounded half up (or with the schedule's rounding) to the
+decimals of the currency, and `minimum` and `maximum` bound their size.
+"""
+from decimal import Decimal, ROUND_HALF_EVEN, ROUND_HALF_UP
+from fractions import Fraction
+
+from money import Money, CURRENCY, Currency, CurrencyMismatchException
+
+__all__ = ('Rule', 'percent', 'fixed', 'Schedule', 'ChargeResult')
+
+
+class Rule(object):
+    """ A percentage or fixed charge, see percent() and fixed() """
+
+    def __init__(self, name, rate=None, amounts=None, minimum=None, maximum=None,
+                 compound=False, inclusive=False):
+        if inclusive and compound:
+            raise ValueError("An inclusive rule can not be compound")
+        self.name = name
+        self.rate = None if rate is None else Decimal(rate)
+        self.amounts = _by_currency(amounts)
+        self.minimum = _by_currency(minimum)
+        self.maximum = _by_currency(maximum)
+        self.compound = compound
+        self.inclusive = inclusive
+
+    def __repr__(self):
+        return "<Rule: %s>" % self.name
+
+
+def _by_currency(values):
+    """ A Money, list of Money or dict of Money as {currency code: Money} """
+    if values is None:
+        return {}
+    if isinstance(values, Money):
+        values = [values]
+    elif isinstance(values, dict):
+        values = values.values()
+    return dict((money.currency.code, money) for money in values)
+
+
+def percent(name, rate, minimum=None, maximum=None, compound=False, inclusive=False):
+    """
+    A charge of `rate` times the amount, e.g. '0.2' for 20%. `minimum` and
+    `maximum` are Money values, or lists of them for several currencies.
+    """
+    return Rule(name, rate=rate, minimum=minimum, maximum=maximum, compound=compound, inclusive=inclusive)
+
+
+def fixed(name, amounts):
+    """ A fixed fee, a Money value or a list of them for several currencies """
+    return Rule(name, amounts=amounts)
+
+
+def _minor_units(money, decimals):
+    return int(money.amount.scaleb(decimals).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+class _CompiledSchedule(object):
+    """ A Schedule for one currency, with all the amounts in minor units """
+
+    def __init__(self, schedule, currency):
+        self.currency = currency
+        self.decimals = currency.decimals or 0
+        self.half_even = schedule.rounding == ROUND_HALF_EVEN
+        self.names = [rule.name for rule in schedule.rules]
+
+        inclusive_rate = sum((Fraction(rule.rate) for rule in schedule.rules if rule.inclusive), Fraction(0))
+        # (index, kind, numerator, denominator or fee, minimum, maximum)
+        self.inclusive = []
+        self.exclusive = []
+        for index, rule in enumerate(schedule.rules):
+            bounds = (self._bound(rule.minimum, rule), self._bound(rule.maximum, rule))
+            if rule.rate is None:
+                if currency.code not in rule.amounts:
+                    raise CurrencyMismatchException(u"The fee %s has no amount in %s" % (rule.name, currency.code))
+                self.exclusive.append((index, 'fixed', _minor_units(rule.amounts[currency.code], self.decimals),
+                                       None) + bounds)
+            elif rule.inclusive:
+                share = Fraction(rule.rate) / (1 + inclusive_rate)
+                self.inclusive.append((index, 'percent', share.numerator, share.denominator) + bounds)
+            else:
+                rate = Fraction(rule.rate)
+                kind = 'compound' if rule.compound else 'percent'
+                self.exclusive.append((index, kind, rate.numerator, rate.denominator) + bounds)
+
+    def _bound(self, values, rule):
+        if not values:
+            return None
+        if self.currency.code not in values:
+            raise CurrencyMismatchException(u"The bounds of %s have no amount in %s" % (rule.name, self.currency.code))
+        return _minor_units(values[self.currency.code], self.decimals)
+
+    def _round(self, numerator, denominator):
+        quotient, remainder = divmod(abs(numerator), denominator)
+        twice = 2 * remainder
+        if twice > denominator or (twice == denominator and not (self.half_even and quotient % 2 == 0)):
+            quotient += 1
+        return -quotient if numerator < 0 else quotient
+
+    def _charge(self, base, numerator, denominator, minimum, maximum):
+        charge = self._round(base * numerator, denominator)
+        if minimum is None and maximum is None:
+            return charge
+        size = abs(charge)
+        if minimum is not None and size < minimum:
+            size = minimum
+        if maximum is not None and size > maximum:
+            size = maximum
+        return -size if charge < 0 else size
+
+    def apply(self, amounts):
+        """ Applies the schedule to a list of minor unit amounts, returns the columns """
+        count = len(self.names)
+        net = []
+        total = []
+        columns = [[] for _ in range(count)]
+        inclusive = self.inclusive
+        exclusive = self.exclusive
+        for amount in amounts:
+            charges = [0] * count
+            running = amount
+            for index, kind, numerator, denominator, minimum, maximum in inclusive:
+                charge = self._charge(amount, numerator, denominator, minimum, maximum)
+                charges[index] = charge
+                running -= charge
+            line_net = running
+            running = amount
+            for index, kind, numerator, denominator, minimum, maximum in exclusive:
+                if kind == 'fixed':
+                    charge = numerator
+                else:
+                    charge = self._charge(running if kind == 'compound' else line_net,
+                                          numerator, denominator, minimum, maximum)
+                charges[index] = charge
+                running += charge
+            net.append(line_net)
+            total.append(running)
+            for index in range(count):
+                columns[index].append(charges[index])
+        return net, columns, total
+
+
+class Schedule(object):
+    """
+    An ordered list of Rules. The compiled form of each currency is cached,
+    so a Schedule is best created once and applied to many batches.
+    """
+
+    def __init__(self, rules, rounding=ROUND_HALF_UP):
+        if rounding not in (ROUND_HALF_UP, ROUND_HALF_EVEN):
+            raise ValueError("Only ROUND_HALF_UP and ROUND_HALF_EVEN are supported")
+        names = [rule.name for rule in rules]
+        for reserved in ('net', 'total'):
+            if reserved in names:
+                raise ValueError("'%s' can not be the name of a rule" % reserved)
+        if len(set(names)) != len(names):
+            raise ValueError("The names of the rules must be unique")
+        self.rules = list(rules)
+        self.rounding = rounding
+        self._compiled = {}
+
+    def compile(self, currency):
+        """ The schedule compiled for a Currency or currency code """
+        if not isinstance(currency, Currency):
+            currency = CURRENCY[str(currency).upper()]
+        key = currency.code, currency.decimals
+        try:
+            return self._compiled[key]
+        except KeyError:
+            compiled = self._compiled[key] = _CompiledSchedule(self, currency)
+            return compiled
+
+    def apply(self, amounts, currency=None):
+        """
+        Applies the schedule to a batch of Money values of one currency, or
+        of Decimals in `currency`. Returns a ChargeResult.
+        """
+        amounts = list(amounts)
+        if currency is None:
+            if not amounts:
+                raise ValueError("The currency of an empty batch must be given")
+            currency = amounts[0].currency
+        compiled = self.compile(currency)
+        minor = []
+        for amount in amounts:
+            if isinstance(amount, Money):
+                if amount.currency != compiled.currency:
+                    raise CurrencyMismatchException(u"Currency mismatch: %s != %s" % (
+                        amount.currency, compiled.currency))
+                amount = amount.amount
+            minor.append(int(Decimal(amount).scaleb(compiled.decimals).to_integral_value(rounding=self.rounding)))
+        return ChargeResult(compiled, *compiled.apply(minor))
+
+    def apply_minor_units(self, amounts, currency):
+        """ Applies the schedule to integer amounts in minor units of `currency` """
+        compiled = self.compile(currency)
+        return ChargeResult(compiled, *compiled.apply(amounts))
+
+
+class ChargeResult(object):
+    """
+    The breakdown of a batch. The columns `net`, `total` and `charges[name]`
+    are lists of integer amounts in minor units; line() and totals() give
+    Money values.
+    """
+
+    def __init__(self, compiled, net, columns, total):
+        self.currency = compiled.currency
+        self.decimals = compiled.decimals
+        self.net = net
+        self.total = total
+        self.charges = dict(zip(compiled.names, columns))
+
+    def __len__(self):
+        return len(self.net)
+
+    def _money(self, minor):
+        return Money(Decimal(minor).scaleb(-self.decimals), self.currency)
+
+    def line(self, index):
+        """ The breakdown of one line as {name: Money}, with 'net' and 'total' """
+        line = dict((name, self._money(column[index])) for name, column in self.charges.items())
+        line['net'] = self._money(self.net[index])
+        line['total'] = self._money(self.total[index])
+        return line
+
+    def totals(self):
+        """ The breakdown of the batch as {name: Money}, with 'net' and 'total' """
+        totals = dict((name, self._money(sum(column))) for name, column in self.charges.items())
+        totals['net'] = self._money(sum(self.net))
+        totals['total'] = self._money(sum(self.total))
+        return totals
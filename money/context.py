@@ -0,0 +1,112 @@
+"""
+Decimal contexts for Money arithmetic.
+
+Multiplying and dividing Money used the decimal context of the current
+thread, so Money(10, 'USD') / 3 carried 28 digits into every later step and
+the result depended on whatever another part of the program had set. Money
+operations use a MoneyContext instead, which has its own precision, rounding
+and traps and can round results to a number of places sized to the currency:
+
+    from money import Money, money_context
+
+    with money_context(extra_places=2):
+        Money(10, 'USD') / 3        # USD 3.3333
+        Money(10, 'JPY') / 3        # JPY 3.33
+
+The contexts are per thread. Outside of money_context() the default context
+is used, which can be replaced with set_default_money_context(); the initial
+default does not round results to places, like earlier releases.
+"""
+import threading
+from contextlib import contextmanager
+from decimal import Context, Decimal, DivisionByZero, InvalidOperation, Overflow, ROUND_HALF_EVEN
+
+__all__ = ('MoneyContext', 'money_context', 'get_money_context', 'set_default_money_context')
+
+_local = threading.local()
+
+
+class MoneyContext(object):
+    """
+    How the results of Money multiplication and division are computed.
+
+    `prec`, `rounding` and `traps` configure the decimal.Context the
+    operations run in. With `extra_places`, results are rounded to the
+    decimals of their currency plus that many places; `places` maps currency
+    codes to a number of places overriding that. Currencies without a number
+    of places are not rounded.
+    """
+
+    def __init__(self, prec=28, rounding=ROUND_HALF_EVEN, extra_places=None, places=None, traps=None):
+        if traps is None:
+            traps = [DivisionByZero, Overflow, InvalidOperation]
+        self.decimal_context = Context(prec=prec, rounding=rounding, traps=traps)
+        self.extra_places = extra_places
+        self.places = dict(places or {})
+        # Quantize exponents by (currency code, decimals)
+        self._exponents = {}
+
+    def __repr__(self):
+        return "<MoneyContext: prec=%s rounding=%s extra_places=%s>" % (
+            self.decimal_context.prec, self.decimal_context.rounding, self.extra_places)
+
+    def places_for(self, currency):
+        """ The number of places results in a currency are rounded to, or None """
+        places = self.places.get(currency.code)
+        if places is None and self.extra_places is not None:
+            places = (currency.decimals or 0) + self.extra_places
+        return places
+
+    def _exponent(self, currency):
+        key = currency.code, currency.decimals
+        try:
+            return self._exponents[key]
+        except KeyError:
+            places = self.places_for(currency)
+            exponent = None if places is None else Decimal(1).scaleb(-places)
+            self._exponents[key] = exponent
+            return exponent
+
+    def round(self, amount, currency):
+        """ Rounds an amount to the places of its currency """
+        exponent = self._exponent(currency)
+        if exponent is None or not amount.is_finite():
+            return amount
+        return amount.quantize(exponent, context=self.decimal_context)
+
+    def multiply(self, amount, factor, currency):
+        return self.round(self.decimal_context.multiply(amount, factor), currency)
+
+    def divide(self, amount, divisor, currency):
+        return self.round(self.decimal_context.divide(amount, divisor), currency)
+
+
+_default = [MoneyContext()]
+
+
+def get_money_context():
+    """ The MoneyContext in effect in this thread """
+    stack = getattr(_local, 'stack', None)
+    return stack[-1] if stack else _default[0]
+
+
+def set_default_money_context(context):
+    """ Replaces the context used outside of money_context(), in all threads """
+    _default[0] = context
+
+
+@contextmanager
+def money_context(context=None, **kwargs):
+    """
+    Makes Money operations in this thread use `context`, or a MoneyContext
+    created from the keyword arguments, until the block exits.
+    """
+    if context is None:
+        context = MoneyContext(**kwargs)
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    _local.stack.append(context)
+    try:
+        yield context
+    finally:
+        _local.stack.pop()
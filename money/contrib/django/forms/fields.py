@@ -4,18 +4,35 @@ from widgets import CurrencySelectWidget
 from money import Money, CURRENCY
 
 
+_CURRENCY_CHOICES = {'version': None, 'choices': ()}
+
+
+def currency_choices():
+    """
+    The default choices for the currency select. The sorted list is built once
+    and rebuilt only when the CURRENCY registry changes.
+    """
+    if _CURRENCY_CHOICES['version'] != CURRENCY.version:
+        _CURRENCY_CHOICES['choices'] = tuple(
+            (c.code, u"{0} - {1}".format(c.code, c.name),) for i, c in sorted(CURRENCY.items()) if c.code != u'XXX')
+        _CURRENCY_CHOICES['version'] = CURRENCY.version
+    return _CURRENCY_CHOICES['choices']
+
+
 class MoneyField(forms.MultiValueField):
     """
     A MultiValueField to represent both the quantity of money and the currency
+
+    With `cache_widget=True` the rendered currency select is cached. See
+    CachedSelect.
     """
 
-    def __init__(self, choices=None, decimal_places=2, max_digits=12, *args, **kwargs):
+    def __init__(self, choices=None, decimal_places=2, max_digits=12, cache_widget=False, *args, **kwargs):
         # Note that we catch args and kwargs that must only go to one field
         # or the other. The rest of them pass onto the decimal field.
-        choices = choices or [
-            (c.code, u"{0} - {1}".format(c.code, c.name),) for i, c in sorted(CURRENCY.items()) if c.code != u'XXX']
+        choices = choices or currency_choices()
 
-        self.widget = CurrencySelectWidget(choices)
+        self.widget = CurrencySelectWidget(choices, cache_render=cache_widget)
 
         fields = (
             forms.DecimalField(
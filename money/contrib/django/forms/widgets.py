@@ -1,4 +1,37 @@
 from django import forms
+from django.utils.encoding import force_text
+
+
+class CachedSelect(forms.Select):
+    """
+    A Select widget that caches its rendered options for each combination of
+    choices and selected value. A currency select has around 180 options, and
+    rendering them dominates the rendering time of forms and formsets with
+    many money fields. Only the surrounding <select> tag, which holds the
+    name and id of each field, is rendered every time.
+
+    The cache is shared between instances and cleared when it holds more
+    than `max_entries` renderings.
+    """
+    max_entries = 1000
+    _cache = {}
+
+    def render_options(self, choices, selected_choices):
+        key = (
+            tuple(self.choices),
+            tuple(choices),
+            frozenset(force_text(v) for v in selected_choices),
+        )
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+
+        output = super(CachedSelect, self).render_options(choices, selected_choices)
+        if len(self._cache) >= self.max_entries:
+            self._cache.clear()
+        self._cache[key] = output
+        return output
 
 
 class CurrencySelectWidget(forms.MultiWidget):
@@ -6,10 +39,11 @@ class CurrencySelectWidget(forms.MultiWidget):
     Custom widget for entering a value and choosing a currency
     """
 
-    def __init__(self, choices=None, attrs=None):
+    def __init__(self, choices=None, attrs=None, cache_render=False):
+        select_class = CachedSelect if cache_render else forms.Select
         widgets = (
             forms.TextInput(attrs=attrs),
-            forms.Select(attrs=attrs, choices=choices),
+            select_class(attrs=attrs, choices=choices),
         )
         super(CurrencySelectWidget, self).__init__(widgets, attrs)
 
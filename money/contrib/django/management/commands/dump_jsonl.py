@@ -0,0 +1,43 @@
+import sys
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, models
+
+from money.contrib.django.serializers import dump_jsonl
+
+
+class Command(BaseCommand):
+    args = '<app_label.ModelName ...>'
+    help = ("Streams the rows of the given models to JSON lines, reading them "
+            "in primary key order one chunk at a time.")
+
+    option_list = BaseCommand.option_list + (
+        make_option('--output', '-o', dest='output', default=None,
+                    help='The file to write to. Defaults to standard output.'),
+        make_option('--chunk-size', dest='chunk_size', type='int', default=2000,
+                    help='The number of rows read per query.'),
+        make_option('--database', dest='database', default=DEFAULT_DB_ALIAS,
+                    help='The database to dump from.'),
+    )
+
+    def handle(self, *labels, **options):
+        if not labels:
+            raise CommandError("Enter at least one app_label.ModelName")
+
+        querysets = []
+        for label in labels:
+            model = models.get_model(*label.split("."))
+            if model is None:
+                raise CommandError("Unknown model: %s" % label)
+            querysets.append(model._base_manager.using(options['database']).all())
+
+        stream = open(options['output'], 'w') if options['output'] else sys.stdout
+        try:
+            for queryset in querysets:
+                count = dump_jsonl(queryset, stream, chunk_size=options['chunk_size'])
+                if options['output']:
+                    self.stdout.write("Dumped %d %s objects" % (count, queryset.model._meta.object_name))
+        finally:
+            if options['output']:
+                stream.close()
@@ -0,0 +1,29 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from money.contrib.django.serializers import load_jsonl
+
+
+class Command(BaseCommand):
+    args = '<file ...>'
+    help = ("Loads JSON lines written by dump_jsonl, inserting the objects with "
+            "bulk_create in batches.")
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', dest='batch_size', type='int', default=2000,
+                    help='The number of objects inserted per query.'),
+        make_option('--database', dest='database', default=DEFAULT_DB_ALIAS,
+                    help='The database to load into.'),
+    )
+
+    def handle(self, *paths, **options):
+        if not paths:
+            raise CommandError("Enter at least one file to load")
+
+        for path in paths:
+            with open(path) as stream:
+                with transaction.atomic(using=options['database']):
+                    count = load_jsonl(stream, batch_size=options['batch_size'], using=options['database'])
+            self.stdout.write("Loaded %d objects from %s" % (count, path))
@@ -0,0 +1,38 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, models
+
+from money.contrib.django.models.totals import registered_totals
+
+
+class Command(BaseCommand):
+    args = '[app_label.ModelName[.field] ...]'
+    help = ("Recomputes the registered money totals from their tables. "
+            "Rebuilds all of them when no model is given.")
+
+    option_list = BaseCommand.option_list + (
+        make_option('--database', dest='database', default=DEFAULT_DB_ALIAS,
+                    help='The database to rebuild the totals in.'),
+    )
+
+    def handle(self, *labels, **options):
+        # Registration happens when the models modules are imported
+        models.get_models()
+
+        selected = []
+        for label in labels:
+            parts = label.split(".")
+            if len(parts) not in (2, 3):
+                raise CommandError("Expected app_label.ModelName[.field], got %s" % label)
+            model = models.get_model(parts[0], parts[1])
+            if model is None:
+                raise CommandError("Unknown model: %s" % label)
+            totals = [t for t in registered_totals(model) if len(parts) == 2 or t.field.name == parts[2]]
+            if not totals:
+                raise CommandError("No money totals registered for %s" % label)
+            selected.extend(totals)
+
+        for totals in selected or registered_totals():
+            totals.rebuild(using=options['database'])
+            self.stdout.write("Rebuilt %s.%s" % (totals.label, totals.field.name))
@@ -0,0 +1,46 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, models
+
+from money.contrib.django.models.fields import MoneyField
+from money.contrib.django.models.managers import QuerysetWithMoney
+
+
+def rated_fields(model):
+    return [f for f in model._meta.fields if isinstance(f, MoneyField) and f.base_currency]
+
+
+class Command(BaseCommand):
+    args = '[app_label.ModelName[.field] ...]'
+    help = ("Recomputes the base currency columns of money fields with the "
+            "current rates. Updates all of them when no model is given.")
+
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', dest='chunk_size', type='int', default=1000,
+                    help='The number of rows updated per query.'),
+        make_option('--database', dest='database', default=DEFAULT_DB_ALIAS,
+                    help='The database to update.'),
+    )
+
+    def handle(self, *labels, **options):
+        selected = []
+        for label in labels:
+            parts = label.split(".")
+            if len(parts) not in (2, 3):
+                raise CommandError("Expected app_label.ModelName[.field], got %s" % label)
+            model = models.get_model(parts[0], parts[1])
+            if model is None:
+                raise CommandError("Unknown model: %s" % label)
+            fields = [f for f in rated_fields(model) if len(parts) == 2 or f.name == parts[2]]
+            if not fields:
+                raise CommandError("No money field with a base currency in %s" % label)
+            selected.extend((model, f) for f in fields)
+
+        if not labels:
+            selected = [(model, f) for model in models.get_models() for f in rated_fields(model)]
+
+        for model, field in selected:
+            queryset = QuerysetWithMoney(model, using=options['database'])
+            count = queryset.rerate(field.name, chunk_size=options['chunk_size'])
+            self.stdout.write("Rerated %d %s.%s rows" % (count, model._meta.object_name, field.name))
@@ -0,0 +1,199 @@
+import json
+import time
+from decimal import Decimal
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.db.models.fields import FieldDoesNotExist
+
+from money import Money
+from money.contrib.django.models.fields import CompactMoneyField, MoneyField
+from money.contrib.django.models.managers import QuerysetWithMoney
+from money.contrib.django.models.totals import registered_totals
+from money.contrib.django.routers import database_for_currency, shard_field
+
+
+CHECKPOINT_TABLE = 'money_rewrite_checkpoint'
+
+
+class Command(BaseCommand):
+    args = '<app_label.ModelName.field>'
+    help = ("Rewrites the amounts of a money field in one currency, multiplying "
+            "them by --rate and optionally moving them to the --to currency. "
+            "Rows are updated in primary key ranges of --batch-size, one short "
+            "transaction each, so the table is never locked for long. With "
+            "--checkpoint the progress is saved in the database, in the "
+            "transaction of every batch, and an interrupted run resumes where "
+            "it stopped.")
+
+    option_list = BaseCommand.option_list + (
+        make_option('--from', dest='from_currency',
+                    help='The currency of the rows to rewrite.'),
+        make_option('--to', dest='to_currency', default=None,
+                    help='The new currency. Defaults to --from, only re-rating the amounts.'),
+        make_option('--rate', dest='rate', default='1',
+                    help='The amounts are multiplied by this rate.'),
+        make_option('--batch-size', dest='batch_size', type='int', default=1000,
+                    help='The number of primary keys per UPDATE.'),
+        make_option('--sleep', dest='sleep', type='float', default=0.0,
+                    help='Seconds to wait between batches.'),
+        make_option('--checkpoint', dest='checkpoint', default=None,
+                    help='The name under which the progress is recorded in the %s table, '
+                         'used to resume.' % CHECKPOINT_TABLE),
+        make_option('--database', dest='database', default=None,
+                    help='The database to update. Defaults to the database of the --from '
+                         'currency for currency sharded models, to the default database otherwise.'),
+    )
+
+    def handle(self, label=None, **options):
+        model, field = self.get_field(label)
+        if not options['from_currency']:
+            raise CommandError("--from is required")
+        old = Money(0, options['from_currency']).currency
+        new = Money(0, options['to_currency'] or options['from_currency']).currency
+        rate = Decimal(options['rate'])
+        if old == new and rate == 1:
+            raise CommandError("Nothing to do: the currency and amounts stay the same")
+
+        state = {
+            'label': label,
+            'from': old.code,
+            'to': new.code,
+            'rate': str(rate),
+            'last_pk': None,
+            'done': False,
+        }
+        using = options['database'] or DEFAULT_DB_ALIAS
+        if shard_field(model) == field.name:
+            using = options['database'] or database_for_currency(old)
+            if database_for_currency(new) != using:
+                raise CommandError("%s is sharded by currency and %s rows belong to the '%s' database: "
+                                   "rows are not moved between databases" % (label, new.code,
+                                                                             database_for_currency(new)))
+
+        state = self.load_checkpoint(options['checkpoint'], state, using)
+        if state['done']:
+            self.stdout.write("Already done according to the checkpoint %s" % options['checkpoint'])
+            return
+
+        sql = self.update_sql(model, field, old, new, rate, using)
+        pks = model._base_manager.using(using).order_by('pk').values_list('pk', flat=True)
+        total = 0
+        while True:
+            if state['last_pk'] is not None:
+                batch = list(pks.filter(pk__gt=state['last_pk'])[:options['batch_size']])
+            else:
+                batch = list(pks[:options['batch_size']])
+            if not batch:
+                break
+
+            with transaction.atomic(using=using):
+                sql_text, params = sql
+                cursor = connections[using].cursor()
+                cursor.execute(sql_text, params + [batch[0], batch[-1], field.get_storage_currency(old)])
+                total += cursor.rowcount
+                if field.base_currency:
+                    QuerysetWithMoney(model, using=using).filter(
+                        pk__range=(batch[0], batch[-1])).rerate(field.name, chunk_size=options['batch_size'])
+                # Committed with the batch, so a crash can not leave a batch
+                # rewritten without the checkpoint knowing
+                state['last_pk'] = batch[-1]
+                self.save_checkpoint(options['checkpoint'], state, using)
+
+            if int(options['verbosity']) >= 2:
+                self.stdout.write("Rewrote rows up to pk %s, %d so far" % (batch[-1], total))
+            if len(batch) < options['batch_size']:
+                break
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        state['done'] = True
+        with transaction.atomic(using=using):
+            self.save_checkpoint(options['checkpoint'], state, using)
+
+        for totals in registered_totals(model):
+            if totals.field is field:
+                totals.rebuild(using=using)
+        self.stdout.write("Rewrote %d %s rows from %s to %s" % (total, label, old.code, new.code))
+
+    def get_field(self, label):
+        parts = (label or '').split(".")
+        if len(parts) != 3:
+            raise CommandError("Expected app_label.ModelName.field, got %s" % label)
+        model = models.get_model(parts[0], parts[1])
+        if model is None:
+            raise CommandError("Unknown model: %s" % label)
+        try:
+            field = model._meta.get_field(parts[2])
+        except FieldDoesNotExist:
+            raise CommandError("Unknown field: %s" % label)
+        if not isinstance(field, MoneyField):
+            raise CommandError("%s is not a MoneyField" % label)
+        return model, field
+
+    def update_sql(self, model, field, old, new, rate, using):
+        """
+        The UPDATE of one batch. Its last three parameters are the first and
+        last primary key of the batch and the old currency.
+        """
+        qn = connections[using].ops.quote_name
+        opts = model._meta
+        amount_attname, currency_attname = field.get_storage_attnames()
+        amount = qn(opts.get_field(amount_attname).column)
+        currency = qn(opts.get_field(currency_attname).column)
+
+        if isinstance(field, CompactMoneyField):
+            # Minor units of the old currency into minor units of the new one
+            rate = rate.scaleb((new.decimals or 0) - (old.decimals or 0))
+            expression = "CAST(ROUND(%s * %%s) AS BIGINT)" % amount
+        else:
+            # Rounded to the decimals of the new currency, as far as the column
+            # allows
+            places = field.decimal_places if new.decimals is None else min(new.decimals, field.decimal_places)
+            expression = "ROUND(%s * %%s, %d)" % (amount, places)
+
+        sql = "UPDATE %s SET %s = %s, %s = %%s WHERE %s BETWEEN %%s AND %%s AND %s = %%s" % (
+            qn(opts.db_table), amount, expression, currency, qn(opts.pk.column), currency)
+        return sql, [rate, field.get_storage_currency(new)]
+
+    def load_checkpoint(self, name, state, using):
+        if not name:
+            return state
+        connection = connections[using]
+        if CHECKPOINT_TABLE not in connection.introspection.table_names():
+            qn = connection.ops.quote_name
+            cursor = connection.cursor()
+            cursor.execute("CREATE TABLE %s (%s VARCHAR(255) NOT NULL PRIMARY KEY, %s TEXT NOT NULL)" % (
+                qn(CHECKPOINT_TABLE), qn('name'), qn('state')))
+            return state
+
+        saved = self.read_checkpoint(name, using)
+        if saved is None:
+            return state
+        for key in ('label', 'from', 'to', 'rate'):
+            if saved.get(key) != state[key]:
+                raise CommandError("The checkpoint %s is for a different rewrite (%s=%s)" % (name, key, saved.get(key)))
+        self.stdout.write("Resuming after pk %s" % saved['last_pk'])
+        return saved
+
+    def read_checkpoint(self, name, using):
+        """ The state saved under a checkpoint name, or None """
+        qn = connections[using].ops.quote_name
+        cursor = connections[using].cursor()
+        cursor.execute("SELECT %s FROM %s WHERE %s = %%s" % (qn('state'), qn(CHECKPOINT_TABLE), qn('name')), [name])
+        row = cursor.fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_checkpoint(self, name, state, using):
+        """ Saves the state in the current transaction """
+        if not name:
+            return
+        qn = connections[using].ops.quote_name
+        cursor = connections[using].cursor()
+        params = [json.dumps(state), name]
+        cursor.execute("UPDATE %s SET %s = %%s WHERE %s = %%s" % (qn(CHECKPOINT_TABLE), qn('state'), qn('name')),
+                       params)
+        if not cursor.rowcount:
+            cursor.execute("INSERT INTO %s (%s, %s) VALUES (%%s, %%s)" % (
+                qn(CHECKPOINT_TABLE), qn('state'), qn('name')), params)
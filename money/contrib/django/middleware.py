@@ -0,0 +1,51 @@
+"""
+Reports the Money work done by each request, see money.instrumentation.
+
+    MIDDLEWARE_CLASSES = (
+        'money.contrib.django.middleware.MoneyInstrumentationMiddleware',
+        ...
+    )
+
+Put it first to include the work of the other middleware. The counts are
+logged to the 'money.instrumentation' logger at DEBUG level and, with
+MONEY_INSTRUMENTATION_HEADER = True, added to the response as an
+X-Money-Stats header. Only add the middleware where the numbers are wanted:
+while it is installed every request is instrumented.
+"""
+import logging
+
+from django.conf import settings
+
+from money import instrumentation
+
+logger = logging.getLogger('money.instrumentation')
+
+
+class MoneyInstrumentationMiddleware(object):
+
+    def process_request(self, request):
+        request._money_stats = instrumentation.start()
+
+    def process_response(self, request, response):
+        summary = self._stop(request)
+        if summary is not None and getattr(settings, 'MONEY_INSTRUMENTATION_HEADER', False):
+            response['X-Money-Stats'] = summary
+        return response
+
+    def process_exception(self, request, exception):
+        # The response middleware is skipped when the exception propagates,
+        # the collection must not go on in later requests of the thread
+        self._stop(request)
+
+    def _stop(self, request):
+        """ Stops the collection of the request, logs and returns its summary """
+        stats = getattr(request, '_money_stats', None)
+        if stats is None:
+            return None
+        del request._money_stats
+        instrumentation.stop(stats)
+
+        summary = stats.summary()
+        logger.debug("%s %s: %s", request.method, request.path, summary,
+                     extra={'money_stats': stats.as_dict()})
+        return summary
@@ -1,12 +1,16 @@
 from decimal import Decimal
 
+import six
+from django.conf import settings
 from django.db import models
+from django.utils.module_loading import import_by_path
 from django.utils.translation import ugettext_lazy
 
 from money.contrib.django import forms
-from money import Money
+from money import Money, CURRENCY
+from money import instrumentation
 
-__all__ = ('MoneyField', 'currency_field_name', 'NotSupportedLookup')
+__all__ = ('MoneyField', 'CompactMoneyField', 'currency_field_name', 'base_field_name', 'NotSupportedLookup')
 
 
 def currency_field_name(name):
@@ -17,7 +21,45 @@ def currency_field_db_column(db_column):
     return None if db_column is None else "%s_currency" % db_column
 
 
-SUPPORTED_LOOKUPS = ('exact', 'lt', 'gt', 'lte', 'gte', 'isnull')
+def minor_units_field_name(name):
+    return "%s_minor" % name
+
+
+def minor_units_field_db_column(db_column):
+    return None if db_column is None else "%s_minor" % db_column
+
+
+def base_field_name(name):
+    return "%s_base" % name
+
+
+def base_field_db_column(db_column):
+    return None if db_column is None else "%s_base" % db_column
+
+
+_CURRENCY_BY_NUMERIC = {}
+
+
+def currency_for_numeric(numeric):
+    """
+    Returns the Currency with the given ISO 4217 numeric code. The lookup
+    table is rebuilt from CURRENCY whenever a code is not found so that
+    currencies registered at runtime are picked up.
+    """
+    try:
+        return _CURRENCY_BY_NUMERIC[numeric]
+    except KeyError:
+        _CURRENCY_BY_NUMERIC.clear()
+        for currency in CURRENCY.values():
+            if currency.numeric and currency.numeric.isdigit():
+                _CURRENCY_BY_NUMERIC.setdefault(int(currency.numeric), currency)
+        try:
+            return _CURRENCY_BY_NUMERIC[numeric]
+        except KeyError:
+            raise ValueError("No currency with the numeric code %r" % numeric)
+
+
+SUPPORTED_LOOKUPS = ('exact', 'lt', 'gt', 'lte', 'gte', 'isnull', 'in', 'range')
 
 
 class NotSupportedLookup(TypeError):
@@ -89,6 +131,36 @@ class MoneyFieldProxy(object):
                     raise TypeError(msg)
 
 
+instrumentation.register(MoneyFieldProxy, '__get__', 'proxy_read')
+instrumentation.register(MoneyFieldProxy, '__set__', 'proxy_write')
+
+
+class CompactMoneyFieldProxy(MoneyFieldProxy):
+    """
+    The proxy for CompactMoneyField. The model instance only holds the stored
+    representation: the amount in minor units and the ISO numeric currency
+    code. Values are converted whenever the attribute is read or assigned.
+    """
+
+    def _get_values(self, obj):
+        # getattr() loads the columns of instances from only() or defer()
+        minor = getattr(obj, self.field.minor_units_field_name, None)
+        numeric = getattr(obj, self.field.currency_field_name, None)
+        currency = None if numeric is None else currency_for_numeric(numeric)
+        if minor is None:
+            return None, currency
+        return Decimal(minor).scaleb(-(currency.decimals or 0)), currency
+
+    def _set_values(self, obj, amount, currency):
+        if amount is None:
+            obj.__dict__[self.field.minor_units_field_name] = None
+            obj.__dict__[self.field.currency_field_name] = None
+            return
+        money = Money(amount, currency)
+        obj.__dict__[self.field.minor_units_field_name] = self.field.get_minor_units(money)
+        obj.__dict__[self.field.currency_field_name] = self.field.get_currency_numeric(money.currency)
+
+
 class InfiniteDecimalField(models.DecimalField):
     def db_type(self, connection):
         engine = connection.settings_dict['ENGINE']
@@ -130,6 +202,23 @@ class CurrencyField(models.CharField):
         return value
 
 
+class BaseAmountField(InfiniteDecimalField):
+    """
+    The column holding the amount of a MoneyField converted into its base
+    currency. The value is computed from the money field whenever the model
+    is saved.
+    """
+
+    def __init__(self, money_field, *args, **kwargs):
+        self.money_field = money_field
+        super(BaseAmountField, self).__init__(*args, **kwargs)
+
+    def pre_save(self, model_instance, add):
+        value = self.money_field.to_base(getattr(model_instance, self.money_field.name))
+        setattr(model_instance, self.attname, value)
+        return value
+
+
 class MoneyField(InfiniteDecimalField):
     description = ugettext_lazy('An amount and type of currency')
 
@@ -140,6 +229,9 @@ class MoneyField(InfiniteDecimalField):
     def __init__(self, *args, **kwargs):
         # We add the currency field except when using frozen south orm. See introspection rules below.
         default_currency = kwargs.pop("default_currency", '')
+        base_currency = kwargs.pop("base_currency", None)
+        self.base_currency = Money(0, base_currency).currency if base_currency else None
+        self.base_rates = kwargs.pop("base_rates", None)
         default = kwargs.get("default", None)
         self.add_currency_field = not kwargs.pop('no_currency_field', False)
 
@@ -194,6 +286,19 @@ class MoneyField(InfiniteDecimalField):
             c_field.creation_counter = self.creation_counter
             cls.add_to_class(self.currency_field_name, c_field)
 
+        if self.base_currency and self.add_currency_field and not cls._meta.abstract:
+            b_field = BaseAmountField(
+                self,
+                max_digits=self.max_digits,
+                decimal_places=self.decimal_places,
+                null=True,
+                editable=False,
+                db_index=True,
+                db_column=base_field_db_column(self.db_column),
+            )
+            b_field.creation_counter = self.creation_counter
+            cls.add_to_class(base_field_name(name), b_field)
+
         # Set ourselves up normally
         super(MoneyField, self).contribute_to_class(cls, name)
 
@@ -205,6 +310,73 @@ class MoneyField(InfiniteDecimalField):
             from managers import MoneyManager
             cls.add_to_class('objects', MoneyManager())
 
+    def get_base_rates(self):
+        """
+        The rates converting into the base currency, as a dict mapping
+        currency codes to the value of one unit of that currency in the base
+        currency. They come from the `base_rates` argument of the field, or
+        else from the MONEY_BASE_RATES setting, either a callable returning
+        a dict (or (code, rate) pairs) or the dotted path of one. The
+        callable is called on every save, so it should be cheap.
+        """
+        rates = self.base_rates or getattr(settings, 'MONEY_BASE_RATES', None)
+        if rates is None:
+            raise ValueError("%s has a base currency but no base_rates and MONEY_BASE_RATES is not set" % self.name)
+        if isinstance(rates, six.string_types):
+            rates = import_by_path(rates)
+        if callable(rates):
+            rates = rates()
+        rates = dict(rates.items() if hasattr(rates, 'items') else rates)
+        rates.setdefault(self.base_currency.code, 1)
+        return rates
+
+    def to_base(self, money, rates=None):
+        """
+        The amount of a Money value in the base currency, or None if it is
+        None or there is no rate for its currency
+        """
+        if money is None:
+            return None
+        if rates is None:
+            rates = self.get_base_rates()
+        rate = rates.get(money.currency.code)
+        if rate is None:
+            return None
+        return money.amount * Decimal(str(rate))
+
+    def get_storage_attnames(self):
+        """
+        The names of the model attributes holding the stored amount and
+        currency, in that order
+        """
+        return self.amount_field_name, self.currency_field_name
+
+    def get_storage_currency(self, currency):
+        """ The value stored in the currency column for a Currency """
+        return currency.code
+
+    def currency_from_storage(self, value):
+        """ The Currency for a value stored in the currency column """
+        return Money(0, value or None).currency
+
+    def to_storage(self, money):
+        """
+        Returns the (amount, currency) values stored in the columns for a
+        Money value or None
+        """
+        if money is None:
+            return None, ''
+        return money.amount, self.get_storage_currency(money.currency)
+
+    def from_storage(self, amount, currency):
+        """
+        Builds the Money value from the stored amount and currency, where
+        currency is a Currency instance
+        """
+        if amount is None:
+            return None
+        return Money(amount, currency)
+
     def get_db_prep_save(self, value, *args, **kwargs):
         """
         Called when the Field value must be saved to the database. As the
@@ -234,6 +406,8 @@ class MoneyField(InfiniteDecimalField):
 
         if isinstance(value, Money):
             value = value.amount
+        elif lookup_type in ('in', 'range'):
+            value = [v.amount if isinstance(v, Money) else v for v in value]
         return super(MoneyField, self).get_prep_lookup(lookup_type, value)
 
     def get_default(self):
@@ -257,6 +431,186 @@ class MoneyField(InfiniteDecimalField):
         return super(MoneyField, self).formfield(**defaults)
 
 
+class CompactMoneyField(MoneyField):
+    """
+    A MoneyField stored in two integer columns instead of a `numeric` and a
+    `varchar(3)` column:
+
+        price_minor    | bigint    # the amount in minor units (cents)
+        price_currency | smallint  # the ISO 4217 numeric code
+
+    The amount is scaled by `Currency.decimals`, so amounts with more
+    precision than their currency allows can not be stored and raise a
+    ValueError when assigned. Lookups must use Money values since a plain
+    number has no scale.
+    """
+    description = ugettext_lazy('An amount and type of currency stored as integers')
+
+    def __init__(self, *args, **kwargs):
+        # The precision depends on the currency. These only satisfy the
+        # DecimalField validation
+        kwargs.setdefault('max_digits', 19)
+        kwargs.setdefault('decimal_places', 0)
+        if kwargs.get('base_currency'):
+            raise TypeError("CompactMoneyField does not support base_currency")
+        super(CompactMoneyField, self).__init__(*args, **kwargs)
+
+    def get_attname_column(self):
+        # The field itself has no column. Its value is held by the two
+        # columns added in contribute_to_class
+        return self.get_attname(), None
+
+    def db_type(self, connection):
+        return None
+
+    def contribute_to_class(self, cls, name):
+        if getattr(self, 'model', None) is not None and not self.model._meta.abstract:
+            # A copy of the field of a concrete model, inherited through
+            # virtual_fields by its proxies, its child models and the classes
+            # built for deferred loading. The storage columns stay with the
+            # model, only the attribute is set up again
+            cls._meta.add_virtual_field(self)
+            setattr(cls, self.name, CompactMoneyFieldProxy(self))
+            return
+
+        self.name = name
+        self.amount_field_name = name
+        self.currency_field_name = currency_field_name(name)
+        self.minor_units_field_name = minor_units_field_name(name)
+        # Remember the real flag before MoneyField.contribute_to_class sees it
+        add_storage_fields = self.add_currency_field
+        self.add_currency_field = False
+
+        if add_storage_fields and not cls._meta.abstract:
+            if self.has_default():
+                default = Money(self.default, self.default_currency)
+                minor_default = self.get_minor_units(default)
+                currency_default = self.get_currency_numeric(default.currency)
+            else:
+                minor_default = models.NOT_PROVIDED
+                currency_default = self.get_currency_numeric(Money(0, self.default_currency).currency)
+
+            a_field = models.BigIntegerField(
+                default=minor_default,
+                editable=False,
+                null=self.null,
+                blank=self.blankable,
+                serialize=False,
+                db_column=minor_units_field_db_column(self.db_column),
+            )
+            c_field = models.SmallIntegerField(
+                default=currency_default,
+                editable=False,
+                null=self.null,
+                blank=self.blankable,
+                serialize=False,
+                db_column=currency_field_db_column(self.db_column),
+            )
+            # Keep the columns next to the field, just before it. The
+            # counters must differ from the field's: Django compares and
+            # hashes fields by creation counter, e.g. when working out which
+            # columns only() and defer() load
+            a_field.creation_counter = self.creation_counter - 0.5
+            c_field.creation_counter = self.creation_counter - 0.25
+            cls.add_to_class(self.minor_units_field_name, a_field)
+            cls.add_to_class(self.currency_field_name, c_field)
+
+        super(CompactMoneyField, self).contribute_to_class(cls, name)
+        self.add_currency_field = add_storage_fields
+
+        setattr(cls, self.name, CompactMoneyFieldProxy(self))
+        if not cls._meta.abstract:
+            # Without a column the field is not concrete. ModelForms, and so
+            # the admin, still include it when it is a virtual field
+            cls._meta.add_virtual_field(self)
+
+    def get_minor_units(self, money):
+        """
+        Returns the amount of the Money value as an integer number of minor
+        units of its currency
+        """
+        minor = money.amount.scaleb(money.currency.decimals or 0)
+        if minor != minor.to_integral_value():
+            raise ValueError("%s can not be stored in minor units of %s" % (money, money.currency))
+        return int(minor)
+
+    def get_storage_attnames(self):
+        return self.minor_units_field_name, self.currency_field_name
+
+    def get_storage_currency(self, currency):
+        return self.get_currency_numeric(currency)
+
+    def currency_from_storage(self, value):
+        return currency_for_numeric(value)
+
+    def to_storage(self, money):
+        if money is None:
+            return None, None
+        return self.get_minor_units(money), self.get_currency_numeric(money.currency)
+
+    def from_storage(self, amount, currency):
+        if amount is None:
+            return None
+        return Money(Decimal(amount).scaleb(-(currency.decimals or 0)), currency)
+
+    def get_currency_numeric(self, currency):
+        if not (currency.numeric and currency.numeric.isdigit()):
+            raise ValueError("Currency %s has no numeric code and can not be stored" % currency)
+        return int(currency.numeric)
+
+    def get_storage_lookups(self, lookup_type, value):
+        """
+        Translates a lookup on this field into lookups on the two storage
+        columns. The currency of the Money value(s) becomes a constraint on
+        the currency column.
+        """
+        if lookup_type not in SUPPORTED_LOOKUPS:
+            raise NotSupportedLookup(lookup_type)
+
+        minor_lookup = "%s__%s" % (self.minor_units_field_name, lookup_type)
+        if lookup_type == 'isnull' or value is None:
+            return {minor_lookup: value}
+
+        if lookup_type in ('in', 'range'):
+            moneys = list(value)
+        else:
+            moneys = [value]
+        if not all(isinstance(m, Money) for m in moneys):
+            raise ValueError("Lookups on %s require Money values" % self.name)
+
+        lookups = {self.currency_field_name: None}
+        for m in moneys:
+            numeric = self.get_currency_numeric(m.currency)
+            if lookups[self.currency_field_name] not in (None, numeric):
+                raise ValueError("Lookups on %s require Money values in one currency" % self.name)
+            lookups[self.currency_field_name] = numeric
+
+        minor = [self.get_minor_units(m) for m in moneys]
+        lookups[minor_lookup] = minor if lookup_type in ('in', 'range') else minor[0]
+        return lookups
+
+    def to_python(self, value):
+        if isinstance(value, six.string_types):
+            try:
+                return Money.from_string(value)
+            except Exception:
+                pass
+        return super(CompactMoneyField, self).to_python(value)
+
+    def value_to_string(self, obj):
+        """
+        The storage columns are not serialized. The value is output as a
+        single 'USD 123.45' string instead which to_python can parse back.
+        """
+        value = self._get_val_from_obj(obj)
+        return None if value is None else six.text_type(value)
+
+    def formfield(self, **kwargs):
+        defaults = {'max_digits': None, 'decimal_places': None}
+        defaults.update(kwargs)
+        return super(CompactMoneyField, self).formfield(**defaults)
+
+
 # South introspection rules
 # (see http://south.aeracode.org/docs/customfields.html#extending-introspection)
 try:
@@ -282,6 +636,16 @@ try:
         patterns=[r"^money\.contrib\.django.\models\.fields\.CurrencyField"],
         rules=[]
     )
+    add_introspection_rules(
+        patterns=[r"^money\.contrib\.django.\models\.fields\.CompactMoneyField"],
+        rules=[
+            (
+                (CompactMoneyField,),
+                [],
+                {'no_currency_field': ('add_currency_field', {})}
+            )
+        ]
+    )
 except ImportError:
     # South isn't installed
     pass
@@ -1,28 +1,637 @@
-from django.db import models
-from django.db.models.query import QuerySet
+import copy
+import functools
+import itertools
+from decimal import Decimal
+
+import six
+
+from django.db import connections, models, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.expressions import ExpressionNode
+from django.db.models.fields import FieldDoesNotExist
+from django.db.models.query import QuerySet, ValuesQuerySet, ValuesListQuerySet
 from django.utils.encoding import smart_unicode
-from fields import currency_field_name
+from fields import base_field_name, currency_field_name, MoneyField, CompactMoneyField, NotSupportedLookup
+from money import Money, CurrencyMismatchException
+from money.contrib.django.routers import connect_shard_check, database_for_currency, shard_databases
+
+__all__ = ('QuerysetWithMoney', 'MoneyManager', 'CurrencyShardedQuerySet', 'CurrencyShardedManager')
+
+
+def _is_money_list(value):
+    """
+    True when the value is a non-empty list of Money, as used by the `in` and
+    `range` lookups. Mixing Money and plain values is not allowed as the
+    currency constraint would silently apply to the plain values as well.
+    """
+    if not isinstance(value, (list, tuple)) or not value:
+        return False
+    moneys = [isinstance(v, Money) for v in value]
+    if any(moneys) and not all(moneys):
+        raise ValueError("Can not mix Money and non-Money values in a lookup")
+    return all(moneys)
+
+
+def keyset_chunks(queryset, chunk_size, get_pk):
+    """
+    Yields the results of a queryset ordered by primary key in lists of at
+    most `chunk_size`, using one `WHERE pk > last LIMIT n` query per chunk.
+    `get_pk` returns the primary key of a result.
+    """
+    last_pk = None
+    while True:
+        if last_pk is None:
+            chunk = list(queryset[:chunk_size])
+        else:
+            chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last_pk = get_pk(chunk[-1])
+
+
+_MONEY_LOOKUPS = {}
 
-__all__ = ('QuerysetWithMoney', 'MoneyManager',)
+
+def _resolve_money_lookup(model, name):
+    """
+    Finds the money field a lookup such as `price__gte` or `order__price`
+    refers to, following relations. Returns `(prefix, field, lookup_type)`
+    where prefix is the relation path up to the field, e.g. `order__`, or
+    None when the lookup is not on a money field. Results are cached.
+    """
+    key = (model, name)
+    try:
+        return _MONEY_LOOKUPS[key]
+    except KeyError:
+        pass
+
+    result = None
+    path = name.split(LOOKUP_SEP)
+    opts = model._meta
+    for i, part in enumerate(path):
+        try:
+            field, _, direct, _ = opts.get_field_by_name(part)
+        except FieldDoesNotExist:
+            break
+        if isinstance(field, MoneyField):
+            lookups = path[i + 1:]
+            if len(lookups) <= 1:
+                result = (LOOKUP_SEP.join(path[:i] + ['']), field, lookups[0] if lookups else 'exact')
+            break
+        if not direct:
+            # A reverse relation
+            opts = field.model._meta
+        elif getattr(field, 'rel', None) is not None:
+            opts = field.rel.to._meta
+        else:
+            break
+
+    _MONEY_LOOKUPS[key] = result
+    return result
+
+
+def _money_converter(field):
+    """
+    Returns a function building Money values from the stored amount and
+    currency of the field. Currency lookups are cached across calls.
+    """
+    currencies = {}
+
+    def convert(amount, currency):
+        if amount is None:
+            return None
+        try:
+            currency = currencies[currency]
+        except KeyError:
+            currencies[currency] = field.currency_from_storage(currency)
+            currency = currencies[currency]
+        return field.from_storage(amount, currency)
+
+    return convert
 
 
 class QuerysetWithMoney(QuerySet):
 
+    def _get_money_field(self, name):
+        try:
+            field = self.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        return field if isinstance(field, MoneyField) else None
+
+    def _lookup_params(self, name, value):
+        """
+        The lookups replacing a single `name=value` lookup: a Money value adds
+        a constraint on the currency column next to the amount, and lookups
+        on a CompactMoneyField go to its storage columns.
+        """
+        resolved = _resolve_money_lookup(self.model, name)
+        if resolved is None:
+            return {name: value}
+        prefix, field, lookup_type = resolved
+
+        if isinstance(field, CompactMoneyField):
+            lookups = field.get_storage_lookups(lookup_type, value)
+            return dict((prefix + lookup, v) for lookup, v in lookups.items())
+
+        params = {name: value}
+        currency_lookup = prefix + field.currency_field_name
+        if isinstance(value, Money):
+            params[currency_lookup] = smart_unicode(value.currency)
+        elif lookup_type in ('in', 'range') and _is_money_list(value):
+            currencies = set(smart_unicode(m.currency) for m in value)
+            if len(currencies) == 1:
+                params[currency_lookup] = currencies.pop()
+            elif lookup_type == 'range':
+                raise CurrencyMismatchException(
+                    u"Currency mismatch in range lookup: %s" % u", ".join(sorted(currencies)))
+            # Multiple currencies in an `__in` lookup are split into
+            # separate clauses by _update_in_lookups
+        return params
+
     def _update_params(self, kwargs):
-        from django.db.models.constants import LOOKUP_SEP
-        from money import Money
-        to_append = {}
+        updated = {}
         for name, value in kwargs.items():
-            if isinstance(value, Money):
-                path = name.split(LOOKUP_SEP)
-                if len(path) > 1:
-                    field_name = currency_field_name(path[0])
-                else:
-                    field_name = currency_field_name(name)
-                to_append[field_name] = smart_unicode(value.currency)
-        kwargs.update(to_append)
+            updated.update(self._lookup_params(name, value))
+        kwargs.clear()
+        kwargs.update(updated)
         return kwargs
 
+    def _split_in_lookup(self, name, value):
+        """
+        An `__in` lookup with Money values in several currencies can not be
+        expressed as a single currency constraint. Returns a Q with one
+        `(currency, amount IN (...))` clause per currency, OR'd together, or
+        None if the lookup needs no splitting.
+        """
+        if not name.endswith(LOOKUP_SEP + 'in') or not _is_money_list(value):
+            return None
+        by_currency = {}
+        for m in value:
+            by_currency.setdefault(smart_unicode(m.currency), []).append(m)
+        if len(by_currency) < 2:
+            return None
+
+        q = Q()
+        for currency, moneys in sorted(by_currency.items()):
+            q |= Q(**self._lookup_params(name, moneys))
+        return q
+
+    def _update_in_lookups(self, args, kwargs):
+        extra_args = []
+        for name, value in kwargs.items():
+            q = self._split_in_lookup(name, value)
+            if q is not None:
+                extra_args.append(q)
+                del kwargs[name]
+        return args + tuple(extra_args), kwargs
+
+    def _update_q(self, q):
+        """
+        Returns a copy of a Q object with each lookup in its tree updated as
+        by _update_params. A lookup that becomes several lookups is replaced
+        by a nested Q, so they stay together under OR and negation.
+        """
+        updated = Q()
+        updated.connector = q.connector
+        updated.negated = q.negated
+        for child in q.children:
+            if isinstance(child, Q):
+                updated.children.append(self._update_q(child))
+                continue
+
+            name, value = child
+            split = self._split_in_lookup(name, value)
+            if split is not None:
+                updated.children.append(split)
+                continue
+            params = self._lookup_params(name, value)
+            if len(params) == 1 and name in params:
+                updated.children.append(child)
+            else:
+                updated.children.append(Q(**params))
+        return updated
+
+    def _update_args(self, args):
+        return tuple(self._update_q(arg) if isinstance(arg, Q) else arg for arg in args)
+
+    def _update_ordering(self, field_names):
+        """
+        A CompactMoneyField has no column of its own. Ordering by it orders by
+        the minor units column instead.
+        """
+        ordering = []
+        for name in field_names:
+            prefix = '-' if name.startswith('-') else ''
+            field = self._get_money_field(name.lstrip('-'))
+            if isinstance(field, CompactMoneyField):
+                name = prefix + field.minor_units_field_name
+            ordering.append(name)
+        return ordering
+
+    def _update_expression(self, field, node):
+        """
+        Returns a copy of an F() expression on a money field with the Money
+        values replaced by their stored amounts, the currency of those Money
+        values and the other money fields the expression refers to.
+        References to a CompactMoneyField are pointed at its minor units
+        column.
+        """
+        if isinstance(field, CompactMoneyField):
+            self._check_compact_expression(field, node)
+        node = copy.deepcopy(node)
+        currencies = set()
+        referenced_fields = []
+
+        def walk(node):
+            if isinstance(node, F):
+                referenced = self._get_money_field(node.name)
+                if referenced is not None:
+                    if isinstance(referenced, CompactMoneyField) != isinstance(field, CompactMoneyField):
+                        raise ValueError("%s and %s store their amounts in different units" % (
+                            field.name, referenced.name))
+                    if referenced is not field and referenced not in referenced_fields:
+                        referenced_fields.append(referenced)
+                    node.name = referenced.get_storage_attnames()[0]
+            for i, child in enumerate(node.children):
+                if isinstance(child, Money):
+                    currencies.add(child.currency.code)
+                    node.children[i] = field.to_storage(child)[0]
+                elif isinstance(child, ExpressionNode):
+                    walk(child)
+
+        walk(node)
+        if len(currencies) > 1:
+            raise CurrencyMismatchException(
+                u"Currency mismatch in update of %s: %s" % (field.name, u", ".join(sorted(currencies))))
+        return node, (currencies.pop() if currencies else None), referenced_fields
+
+    def _check_compact_expression(self, field, node):
+        """
+        Raises ValueError unless an expression updating a CompactMoneyField
+        gives a whole number of minor units: Money values and money fields
+        can only be added, subtracted and multiplied by integers.
+        """
+        def kind(node):
+            if isinstance(node, Money):
+                return 'money'
+            if isinstance(node, F):
+                try:
+                    referenced = self.model._meta.get_field(node.name)
+                except FieldDoesNotExist:
+                    return 'number'
+                if isinstance(referenced, MoneyField):
+                    return 'money'
+                return 'integer' if isinstance(referenced, (models.IntegerField, models.AutoField)) else 'number'
+            if not isinstance(node, ExpressionNode):
+                if isinstance(node, six.integer_types) or (
+                        isinstance(node, Decimal) and node == node.to_integral_value()):
+                    return 'integer'
+                return 'number'
+
+            kinds = [kind(child) for child in node.children]
+            if 'money' not in kinds:
+                if node.connector in (node.ADD, node.SUB, node.MUL):
+                    return 'integer' if set(kinds) == set(['integer']) else 'number'
+                return 'number'
+            if node.connector in (node.ADD, node.SUB) and set(kinds) == set(['money']):
+                return 'money'
+            if node.connector == node.MUL and kinds.count('money') == 1 and set(kinds) <= set(['money', 'integer']):
+                return 'money'
+            raise ValueError("Updates of %s must give whole minor units: Money values can only be added, "
+                             "subtracted and multiplied by integers" % field.name)
+
+        if kind(node) != 'money':
+            raise ValueError("Updates of %s require Money values" % field.name)
+
+    def update(self, **kwargs):
+        """
+        Updates money fields in the database. Assigning a Money value sets
+        both the amount and the currency column. An F() expression containing
+        Money values is evaluated by the database in a single UPDATE:
+
+            Wallet.objects.filter(pk=1).update(balance=F('balance') + Money(10, 'USD'))
+
+        Only rows whose currency column matches the Money values, and the
+        currencies of other money fields the expression refers to, are
+        updated, so currencies are never mixed. By default a
+        CurrencyMismatchException is raised, and nothing is updated, if the
+        queryset contains rows in another currency. With
+        `_check_currency=False` the mismatched rows are skipped and the
+        returned row count tells how many matched.
+
+        A CompactMoneyField can only be updated to Money values, or
+        expressions giving a whole number of minor units.
+
+        Registered money totals (see money.contrib.django.models.totals) of
+        the updated fields and base currency columns are kept up to date.
+        """
+        check_currency = kwargs.pop('_check_currency', True)
+        totals = [t for t in getattr(self.model, '_money_totals', ()) if t.affected_by(kwargs)]
+        rerated = self._rerated_fields(kwargs)
+        if not (totals or rerated):
+            return self._update(check_currency, kwargs)
+
+        do_update = functools.partial(self._update, check_currency, kwargs)
+        if rerated:
+            do_update = functools.partial(self._update_rerated, rerated, do_update)
+        for t in totals:
+            do_update = functools.partial(t.update, self, do_update)
+        with transaction.atomic(using=self.db):
+            return do_update()
+    update.alters_data = True
+
+    def _rerated_fields(self, kwargs):
+        """
+        The names of the fields with a base currency whose base amounts an
+        update changes without giving a Money value. Expressions, plain
+        amounts and currencies on their own are only converted once the
+        database has applied them.
+        """
+        names = []
+        for field in self.model._meta.fields:
+            if not (isinstance(field, MoneyField) and field.base_currency):
+                continue
+            value = kwargs.get(field.name)
+            if (field.name in kwargs and not (value is None or isinstance(value, Money))
+                    or field.currency_field_name in kwargs):
+                names.append(field.name)
+        return names
+
+    def _update(self, check_currency, kwargs):
+        values = {}
+        constraints = Q()
+        mismatched = Q()
+        currencies = []
+        for name, value in kwargs.items():
+            field = self._get_money_field(name)
+            if field is None:
+                values[name] = value
+                continue
+
+            amount_attname, currency_attname = field.get_storage_attnames()
+            # NULL amounts stay NULL whatever their currency
+            not_null = Q(**{"%s__isnull" % amount_attname: False})
+            if value is None or isinstance(value, Money):
+                values[amount_attname], values[currency_attname] = field.to_storage(value)
+                if field.base_currency:
+                    values[base_field_name(field.name)] = field.to_base(value)
+            elif isinstance(value, ExpressionNode):
+                values[amount_attname], currency, referenced_fields = self._update_expression(field, value)
+                if currency is not None:
+                    currency = field.get_storage_currency(Money(0, currency).currency)
+                    constraints &= Q(**{currency_attname: currency})
+                    mismatched |= ~Q(**{currency_attname: currency}) & not_null
+                    currencies.append(smart_unicode(currency))
+                for referenced in referenced_fields:
+                    same_currency = Q(**{currency_attname: F(referenced.get_storage_attnames()[1])})
+                    constraints &= same_currency
+                    mismatched |= ~same_currency & not_null
+                    currencies.append(u"the currency of %s" % referenced.name)
+            elif isinstance(field, CompactMoneyField):
+                raise ValueError("Updates of %s require Money values" % field.name)
+            else:
+                values[amount_attname] = value
+
+        if not constraints:
+            return super(QuerysetWithMoney, self).update(**values)
+
+        queryset = self.filter(constraints)
+        if not check_currency:
+            return super(QuerysetWithMoney, queryset).update(**values)
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            if not self.filter(mismatched).exists():
+                return super(QuerysetWithMoney, queryset).update(**values)
+        raise CurrencyMismatchException(
+            u"Can not update rows in other currencies than %s" % u", ".join(sorted(currencies)))
+    _update.alters_data = True
+
+    def _update_rerated(self, field_names, do_update):
+        """ Runs do_update() and recomputes the base amounts of the updated rows """
+        pks = list(self.values_list('pk', flat=True))
+        rows = do_update()
+        queryset = QuerysetWithMoney(self.model, using=self.db)
+        for name in field_names:
+            field = self._get_money_field(name)
+            rates = field.get_base_rates()
+            for start in range(0, len(pks), 500):
+                queryset._rerate_rows(field, rates, pks[start:start + 500])
+        return rows
+
+    def _rerate_rows(self, field, rates, pks):
+        sql, params = self._converted_sql(field.name, field.base_currency, rates)
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+        sql = "UPDATE %s SET %s = %s WHERE %s IN (%s)" % (
+            qn(opts.db_table),
+            qn(opts.get_field(base_field_name(field.name)).column),
+            sql,
+            qn(opts.pk.column),
+            ", ".join(["%s"] * len(pks)),
+        )
+        with transaction.atomic(using=self.db, savepoint=False):
+            cursor = connection.cursor()
+            cursor.execute(sql, params + list(pks))
+            return cursor.rowcount
+
+    def rerate(self, field_name, rates=None, chunk_size=1000):
+        """
+        Recomputes the base currency column of a money field for the rows of
+        the queryset, e.g. after the rates changed. Rows are updated by the
+        database in chunks of `chunk_size` primary keys, one UPDATE each.
+        `rates` defaults to the rates of the field. Returns the number of
+        rows updated.
+        """
+        field = self._get_money_field(field_name)
+        if field is None or not field.base_currency:
+            raise ValueError("'%s' is not a money field with a base currency" % field_name)
+        if rates is None:
+            rates = field.get_base_rates()
+
+        count = 0
+        queryset = self.order_by('pk').values_list('pk', flat=True)
+        for pks in keyset_chunks(queryset, chunk_size, lambda pk: pk):
+            count += self._rerate_rows(field, rates, pks)
+        return count
+    rerate.alters_data = True
+
+    def bulk_create(self, objs, batch_size=None):
+        totals = getattr(self.model, '_money_totals', ())
+        if not totals:
+            return super(QuerysetWithMoney, self).bulk_create(objs, batch_size=batch_size)
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super(QuerysetWithMoney, self).bulk_create(objs, batch_size=batch_size)
+            for t in totals:
+                t.objects_created(objs, self.db)
+        return objs
+
+    def _converted_sql(self, field_name, to, rates):
+        """
+        Builds a SQL expression converting the amount of a money field into
+        the `to` currency:
+
+            CASE "app_order"."price_currency"
+                WHEN 'USD' THEN "app_order"."price" * 0.92
+                ...
+                ELSE NULL
+            END
+
+        `rates` maps currency codes to the value of one unit of that currency
+        in the `to` currency. It can be a dict or any iterable of (code, rate)
+        pairs such as `Rate.objects.values_list('currency', 'rate')`. Rows in
+        currencies without a rate convert to NULL.
+        """
+        field = self._get_money_field(field_name)
+        if field is None:
+            raise ValueError("'%s' is not a money field of %s" % (field_name, self.model.__name__))
+        to = Money(0, to).currency
+        rates = dict(rates.items() if hasattr(rates, 'items') else rates)
+        rates.setdefault(to.code, 1)
+
+        qn = connections[self.db].ops.quote_name
+        table = qn(self.model._meta.db_table)
+        amount_attname, currency_attname = field.get_storage_attnames()
+        amount_column = "%s.%s" % (table, qn(self.model._meta.get_field(amount_attname).column))
+        currency_column = "%s.%s" % (table, qn(self.model._meta.get_field(currency_attname).column))
+
+        sql = ["CASE %s" % currency_column]
+        params = []
+        for code, rate in sorted(rates.items()):
+            currency = Money(0, code).currency
+            rate = Decimal(str(rate))
+            if isinstance(field, CompactMoneyField):
+                rate = rate.scaleb(-(currency.decimals or 0))
+            sql.append("WHEN %%s THEN %s * %%s" % amount_column)
+            params.extend([field.get_storage_currency(currency), rate])
+        sql.append("ELSE NULL END")
+        return " ".join(sql), params
+
+    def annotate_converted(self, field_name, to, rates, alias=None):
+        """
+        Adds the amount of a money field converted into the `to` currency as
+        an extra column computed by the database. The column is named
+        `<field>_<currency>` unless an alias is given and can be used for
+        ordering:
+
+            Order.objects.annotate_converted('price', to='EUR', rates=rates).order_by('-price_eur')
+
+        The annotated value is the number returned by the database, not a
+        Money instance. See _converted_sql for the format of `rates`.
+        """
+        alias = alias or "%s_%s" % (field_name, Money(0, to).currency.code.lower())
+        sql, params = self._converted_sql(field_name, to, rates)
+        return self.extra(select={alias: sql}, select_params=params)
+
+    def filter_converted(self, field_name, to, rates, **lookups):
+        """
+        Filters on the amount of a money field converted into the `to`
+        currency. Supports the exact, lt, gt, lte and gte lookups with Money
+        values in the `to` currency or plain numbers:
+
+            Order.objects.filter_converted('price', to='EUR', rates=rates, gte=Money(100, 'EUR'))
+        """
+        operators = {'exact': '=', 'lt': '<', 'gt': '>', 'lte': '<=', 'gte': '>='}
+        sql, params = self._converted_sql(field_name, to, rates)
+        queryset = self
+        for lookup, value in lookups.items():
+            if lookup not in operators:
+                raise NotSupportedLookup(lookup)
+            if isinstance(value, Money):
+                if value.currency != Money(0, to).currency:
+                    raise CurrencyMismatchException(u"Currency mismatch: %s != %s" % (value.currency, to))
+                value = value.amount
+            # SQLite binds Decimals as text, which never compares equal to a
+            # number without the cast
+            queryset = queryset.extra(where=["(%s) %s CAST(%%s AS NUMERIC)" % (sql, operators[lookup])],
+                                      params=params + [value])
+        return queryset
+
+    def aggregate_converted(self, field_name, to, rates):
+        """
+        Returns the sum of a money field over this queryset converted into the
+        `to` currency. The database sums the amounts of each currency; they
+        are converted exactly with Decimals, as some databases compute with
+        floats. Rows in currencies without a rate are left out.
+        """
+        field = self._get_money_field(field_name)
+        if field is None:
+            raise ValueError("'%s' is not a money field of %s" % (field_name, self.model.__name__))
+        to = Money(0, to).currency
+        rates = dict(rates.items() if hasattr(rates, 'items') else rates)
+        rates.setdefault(to.code, 1)
+
+        amount_attname, currency_attname = field.get_storage_attnames()
+        convert = _money_converter(field)
+        total = Decimal(0)
+        sums = self.order_by().values_list(currency_attname).annotate(Sum(amount_attname))
+        for currency, amount in sums:
+            money = convert(amount, currency)
+            if money is not None and money.currency.code in rates:
+                total += money.amount * Decimal(str(rates[money.currency.code]))
+        return Money(total, to)
+
+    def chunked(self, chunk_size=1000):
+        """
+        Yields the instances of this queryset in lists of at most `chunk_size`.
+
+        Each chunk is fetched with its own query using keyset pagination on
+        the primary key (`WHERE pk > last ORDER BY pk LIMIT n`), so memory
+        use does not grow with the size of the table and no database cursor
+        is held open between chunks. Any other ordering is replaced by the
+        primary key.
+        """
+        return keyset_chunks(self.order_by('pk'), chunk_size, lambda instance: instance.pk)
+
+    def stream(self, chunk_size=1000):
+        """
+        Iterates over the instances one at a time, fetching them in chunks.
+        See chunked()
+        """
+        for chunk in self.chunked(chunk_size):
+            for instance in chunk:
+                yield instance
+
+    def chunked_values(self, *field_names, **kwargs):
+        """
+        Like chunked() but yields lists of tuples of the given field values
+        instead of model instances. Money fields are read from their amount
+        and currency columns and each chunk is converted to Money values in
+        one pass, without building model instances:
+
+            for chunk in Order.objects.chunked_values('pk', 'price', chunk_size=5000):
+                for pk, price in chunk:
+                    ...
+        """
+        chunk_size = kwargs.pop('chunk_size', 1000)
+        if kwargs:
+            raise TypeError("Unexpected keyword arguments: %s" % ", ".join(kwargs))
+
+        columns = ['pk']
+        converters = []
+        for name in field_names:
+            field = self._get_money_field(name)
+            if field is None:
+                converters.append((len(columns), None))
+                columns.append(name)
+            else:
+                converters.append((len(columns), _money_converter(field)))
+                columns.extend(field.get_storage_attnames())
+
+        queryset = self.order_by('pk').values_list(*columns)
+        for rows in keyset_chunks(queryset, chunk_size, lambda row: row[0]):
+            yield [
+                tuple(row[i] if convert is None else convert(row[i], row[i + 1])
+                      for i, convert in converters)
+                for row in rows
+            ]
+
     def dates(self, *args, **kwargs):
         kwargs = self._update_params(kwargs)
         return super(QuerysetWithMoney, self).dates(*args, **kwargs)
@@ -36,6 +645,7 @@ class QuerysetWithMoney(QuerySet):
         return super(QuerysetWithMoney, self).extra(*args, **kwargs)
 
     def get(self, *args, **kwargs):
+        args, kwargs = self._update_in_lookups(self._update_args(args), kwargs)
         kwargs = self._update_params(kwargs)
         return super(QuerysetWithMoney, self).get(*args, **kwargs)
 
@@ -44,14 +654,20 @@ class QuerysetWithMoney(QuerySet):
         return super(QuerysetWithMoney, self).get_or_create(**kwargs)
 
     def filter(self, *args, **kwargs):
+        args, kwargs = self._update_in_lookups(self._update_args(args), kwargs)
         kwargs = self._update_params(kwargs)
         return super(QuerysetWithMoney, self).filter(*args, **kwargs)
 
-    def complex_filter(self, *args, **kwargs):
-        kwargs = self._update_params(kwargs)
-        return super(QuerysetWithMoney, self).complex_filter(*args, **kwargs)
+    def complex_filter(self, filter_obj):
+        if isinstance(filter_obj, Q):
+            filter_obj = self._update_q(filter_obj)
+        elif isinstance(filter_obj, dict):
+            args, kwargs = self._update_in_lookups((), dict(filter_obj))
+            filter_obj = Q(*args, **self._update_params(kwargs))
+        return super(QuerysetWithMoney, self).complex_filter(filter_obj)
 
     def exclude(self, *args, **kwargs):
+        args, kwargs = self._update_in_lookups(self._update_args(args), kwargs)
         kwargs = self._update_params(kwargs)
         return super(QuerysetWithMoney, self).exclude(*args, **kwargs)
 
@@ -68,6 +684,7 @@ class QuerysetWithMoney(QuerySet):
         return super(QuerysetWithMoney, self).latest(*args, **kwargs)
 
     def order_by(self, *args, **kwargs):
+        args = self._update_ordering(args)
         kwargs = self._update_params(kwargs)
         return super(QuerysetWithMoney, self).order_by(*args, **kwargs)
 
@@ -77,9 +694,392 @@ class QuerysetWithMoney(QuerySet):
 
     def values(self, *args, **kwargs):
         kwargs = self._update_params(kwargs)
-        return super(QuerysetWithMoney, self).values(*args, **kwargs)
+        columns, converters = self._values_columns(args)
+        if columns == list(args):
+            return super(QuerysetWithMoney, self).values(*args, **kwargs)
+        return self._clone(klass=MoneyValuesQuerySet, setup=True, _fields=columns,
+                           _money_values=(args, converters, False))
+
+    def values_list(self, *fields, **kwargs):
+        columns, converters = self._values_columns(fields)
+        if columns == list(fields):
+            return super(QuerysetWithMoney, self).values_list(*fields, **kwargs)
+        flat = kwargs.pop('flat', False)
+        if kwargs:
+            raise TypeError('Unexpected keyword arguments to values_list: %s' % (list(kwargs),))
+        if flat and len(fields) > 1:
+            raise TypeError("'flat' is not valid when values_list is called with more than one field.")
+        return self._clone(klass=MoneyValuesListQuerySet, setup=True, flat=False, _fields=columns,
+                           _money_values=(fields, converters, flat))
+
+    def _values_columns(self, fields):
+        """
+        The columns values() and values_list() select for the given field
+        names: a CompactMoneyField is read from its two storage columns.
+        Also returns the position of each name among the columns, with the
+        function building its Money values or None.
+        """
+        columns = []
+        converters = []
+        for name in fields:
+            field = self._get_money_field(name)
+            if isinstance(field, CompactMoneyField):
+                converters.append((len(columns), _money_converter(field)))
+                columns.extend(field.get_storage_attnames())
+            else:
+                converters.append((len(columns), None))
+                columns.append(name)
+        return columns, converters
+
+    def _deferred_names(self, fields):
+        """ only() and defer() of a CompactMoneyField apply to its storage columns """
+        names = []
+        for name in fields:
+            field = self._get_money_field(name)
+            if isinstance(field, CompactMoneyField):
+                names.extend(field.get_storage_attnames())
+            else:
+                names.append(name)
+        return names
+
+    def only(self, *fields):
+        return super(QuerysetWithMoney, self).only(*self._deferred_names(fields))
+
+    def defer(self, *fields):
+        if fields == (None,):
+            return super(QuerysetWithMoney, self).defer(None)
+        return super(QuerysetWithMoney, self).defer(*self._deferred_names(fields))
+
+
+class MoneyValuesQuerySet(QuerysetWithMoney, ValuesQuerySet):
+    """
+    The values() of a QuerysetWithMoney selecting CompactMoneyFields. Their
+    storage columns are selected instead and combined into Money values
+    again for each row.
+    """
+
+    def _clone(self, klass=None, setup=False, **kwargs):
+        kwargs.setdefault('_money_values', self._money_values)
+        return super(MoneyValuesQuerySet, self)._clone(klass, setup, **kwargs)
+
+    def _money_row(self, row):
+        converters = self._money_values[1]
+        values = [row[i] if convert is None else convert(row[i], row[i + 1])
+                  for i, convert in converters]
+        # Annotations follow the fields
+        return values + list(row[len(self._fields):])
+
+    def iterator(self):
+        fields, converters, _ = self._money_values
+        storage = [column for column in self._fields if column not in fields]
+        for row in super(MoneyValuesQuerySet, self).iterator():
+            values = self._money_row([row[column] for column in self._fields])
+            for column in storage:
+                del row[column]
+            row.update(zip(fields, values))
+            yield row
+
+
+class MoneyValuesListQuerySet(MoneyValuesQuerySet, ValuesListQuerySet):
+    """ The values_list() counterpart of MoneyValuesQuerySet """
+
+    def iterator(self):
+        flat = self._money_values[2]
+        for row in ValuesListQuerySet.iterator(self):
+            row = self._money_row(row)
+            yield row[0] if flat else tuple(row)
 
 
 class MoneyManager(models.Manager):
     def get_query_set(self):
         return QuerysetWithMoney(self.model)
+
+    def annotate_converted(self, *args, **kwargs):
+        return self.get_query_set().annotate_converted(*args, **kwargs)
+
+    def filter_converted(self, *args, **kwargs):
+        return self.get_query_set().filter_converted(*args, **kwargs)
+
+    def aggregate_converted(self, *args, **kwargs):
+        return self.get_query_set().aggregate_converted(*args, **kwargs)
+
+    def chunked(self, *args, **kwargs):
+        return self.get_query_set().chunked(*args, **kwargs)
+
+    def stream(self, *args, **kwargs):
+        return self.get_query_set().stream(*args, **kwargs)
+
+    def chunked_values(self, *args, **kwargs):
+        return self.get_query_set().chunked_values(*args, **kwargs)
+
+    def rerate(self, *args, **kwargs):
+        return self.get_query_set().rerate(*args, **kwargs)
+
+
+_SHARDED_CLASSES = {}
+
+
+def _sharded_class(klass):
+    """ A subclass of klass, e.g. ValuesQuerySet, that also fans out """
+    try:
+        return _SHARDED_CLASSES[klass]
+    except KeyError:
+        sharded = type('CurrencySharded%s' % klass.__name__, (CurrencyShardedQuerySet, klass), {})
+        return _SHARDED_CLASSES.setdefault(klass, sharded)
+
+
+class CurrencyShardedQuerySet(QuerysetWithMoney):
+    """
+    A queryset of a model whose rows are spread over several databases by
+    the currency of one money field, see money.contrib.django.routers.
+
+    A filter on that field with Money values in one currency, or on its
+    currency column, routes the queryset to the database of the currency.
+    Otherwise, unless using() picks a database, the query runs on every
+    shard and the results are merged: rows ordered by plain fields of the
+    model are sorted again after merging, counts are added up and the Sum,
+    Count, Max and Min aggregates are combined. Results that can not be
+    merged raise an error instead: ordering by anything else, distinct
+    counts, aggregates of slices and lookups on the primary key, which is
+    only unique within a database.
+    """
+
+    def __init__(self, model=None, query=None, using=None, shard_field=None):
+        super(CurrencyShardedQuerySet, self).__init__(model=model, query=query, using=using)
+        self.shard_field = shard_field
+
+    def _clone(self, klass=None, setup=False, **kwargs):
+        if klass is not None and not issubclass(klass, CurrencyShardedQuerySet):
+            klass = _sharded_class(klass)
+        kwargs.setdefault('shard_field', self.shard_field)
+        return super(CurrencyShardedQuerySet, self)._clone(klass, setup, **kwargs)
+
+    def _shard_currency(self, kwargs):
+        """ The single currency the lookups require of the shard field, or None """
+        currency_lookups = (currency_field_name(self.shard_field),
+                            currency_field_name(self.shard_field) + LOOKUP_SEP + 'exact')
+        for name, value in kwargs.items():
+            if name in currency_lookups:
+                return value
+            resolved = _resolve_money_lookup(self.model, name)
+            if resolved is None or resolved[0] or resolved[1].name != self.shard_field:
+                continue
+            if isinstance(value, Money):
+                return value.currency
+            if resolved[2] in ('in', 'range') and _is_money_list(value):
+                currencies = set(m.currency for m in value)
+                if len(currencies) == 1:
+                    return currencies.pop()
+        return None
+
+    def _fans_out(self):
+        return self._db is None and self.shard_field is not None
+
+    def _shards(self):
+        return [self.using(alias) for alias in shard_databases()]
+
+    def _check_pk_lookups(self, args, kwargs):
+        """
+        Refuses lookups on the primary key running on every shard. Each
+        database allocates its own keys, so they match a row in several.
+        """
+        pk = self.model._meta.pk
+        names = list(kwargs)
+        children = [child for q in args if isinstance(q, Q) for child in q.children]
+        while children:
+            child = children.pop()
+            if isinstance(child, Q):
+                children.extend(child.children)
+            else:
+                names.append(child[0])
+        for name in names:
+            if name.split(LOOKUP_SEP)[0] in ('pk', pk.name, pk.attname):
+                raise ValueError("Primary keys of %s are only unique within a database: look them up "
+                                 "with using() or a filter on the currency of %s" % (
+                                     self.model._meta.object_name, self.shard_field))
+
+    def filter(self, *args, **kwargs):
+        currency = self._shard_currency(kwargs) if self._fans_out() else None
+        if currency is None and self._fans_out():
+            self._check_pk_lookups(args, kwargs)
+        clone = super(CurrencyShardedQuerySet, self).filter(*args, **kwargs)
+        if currency is not None:
+            clone._db = database_for_currency(currency)
+        return clone
+
+    def exclude(self, *args, **kwargs):
+        if self._fans_out():
+            self._check_pk_lookups(args, kwargs)
+        return super(CurrencyShardedQuerySet, self).exclude(*args, **kwargs)
+
+    def _result_key(self, field):
+        """ A function returning the value of a field from a result, or None """
+        attname = field.attname
+        if not isinstance(self, ValuesQuerySet):
+            # The stored value, so money fields sort by amount like the
+            # database does instead of comparing Money across currencies
+            return lambda obj: obj.__dict__[attname] if attname in obj.__dict__ else getattr(obj, attname)
+        names = [field.name, attname] + (['pk'] if field.primary_key else [])
+        if not isinstance(self, ValuesListQuerySet):
+            name = next((name for name in names if name in self.field_names), None)
+            return None if name is None else (lambda row: row[name])
+        fields = list(self._fields)
+        if self.query.extra_select or self.query.aggregate_select:
+            return None
+        index = next((fields.index(name) for name in names if name in fields), None)
+        if index is None:
+            return None
+        if self.flat:
+            return lambda row: row
+        return lambda row: row[index]
+
+    def _merge_keys(self):
+        """
+        The (key function, descending) pairs to sort merged results by, or
+        None when they are not ordered. Raises ValueError when the ordering
+        is not on plain fields selected by the results.
+        """
+        query = self.query
+        ordering = query.order_by or (query.default_ordering and self.model._meta.ordering) or []
+        if not ordering:
+            return None
+        keys = []
+        for name in ordering:
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            try:
+                field = self.model._meta.pk if name == 'pk' else self.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                field = None
+            key = None if field is None else self._result_key(field)
+            if key is None:
+                raise ValueError("Results of %s from several databases can not be merged in the order "
+                                 "of '%s': order by fields of the model that are selected, or pick a "
+                                 "database with using()" % (self.model._meta.object_name, name))
+            keys.append((key, descending))
+        return keys
+
+    def iterator(self):
+        if not self._fans_out():
+            for result in super(CurrencyShardedQuerySet, self).iterator():
+                yield result
+            return
+
+        low, high = self.query.low_mark, self.query.high_mark
+        shards = []
+        for shard in self._shards():
+            shard.query.clear_limits()
+            if high is not None:
+                # Each shard returns enough rows to fill the slice
+                shard.query.set_limits(0, high)
+            shards.append(shard)
+
+        keys = self._merge_keys()
+        if keys is None:
+            results = itertools.chain.from_iterable(shard.iterator() for shard in shards)
+        else:
+            results = list(itertools.chain.from_iterable(shard.iterator() for shard in shards))
+            # Stable sorts, least significant key first
+            for key, descending in reversed(keys):
+                results.sort(key=key, reverse=descending)
+        for result in itertools.islice(results, low, high):
+            yield result
+
+    def count(self):
+        if not self._fans_out() or self._result_cache is not None:
+            return super(CurrencyShardedQuerySet, self).count()
+        if self.query.low_mark or self.query.high_mark is not None:
+            return len(list(self.iterator()))
+        return sum(shard.count() for shard in self._shards())
+
+    def exists(self):
+        if not self._fans_out() or self._result_cache is not None:
+            return super(CurrencyShardedQuerySet, self).exists()
+        return any(shard.exists() for shard in self._shards())
+
+    def aggregate(self, *args, **kwargs):
+        if not self._fans_out():
+            return super(CurrencyShardedQuerySet, self).aggregate(*args, **kwargs)
+
+        for arg in args:
+            kwargs[arg.default_alias] = arg
+        if self.query.low_mark or self.query.high_mark is not None:
+            raise TypeError("Aggregates of a slice can not be combined across shards")
+        combine = {Sum: sum, Count: sum, Max: max, Min: min}
+        for alias, aggregate in kwargs.items():
+            if type(aggregate) not in combine:
+                raise TypeError(
+                    "%s can not be combined across shards" % type(aggregate).__name__)
+            if aggregate.extra.get('distinct'):
+                # A value may occur in several shards
+                raise TypeError(
+                    "Distinct %s can not be combined across shards" % type(aggregate).__name__)
+
+        results = [shard.aggregate(**kwargs) for shard in self._shards()]
+        combined = {}
+        for alias, aggregate in kwargs.items():
+            values = [r[alias] for r in results if r[alias] is not None]
+            combined[alias] = combine[type(aggregate)](values) if values else None
+        return combined
+
+    def update(self, *args, **kwargs):
+        currency = None
+        if self.shard_field is not None:
+            currency = self._shard_currency(dict((name + LOOKUP_SEP + 'exact', value)
+                                                 for name, value in kwargs.items()))
+        if currency is not None:
+            alias = database_for_currency(currency)
+            if [alias] != ([self._db] if self._db else shard_databases()):
+                raise ValueError("Rows are not moved between databases: %s rows can not be updated "
+                                 "to %s, which belongs to the '%s' database" % (
+                                     self.model._meta.object_name, currency, alias))
+        if not self._fans_out():
+            return super(CurrencyShardedQuerySet, self).update(*args, **kwargs)
+        return sum(shard.update(*args, **kwargs) for shard in self._shards())
+    update.alters_data = True
+
+    def delete(self):
+        if not self._fans_out():
+            return super(CurrencyShardedQuerySet, self).delete()
+        for shard in self._shards():
+            shard.delete()
+        self._result_cache = None
+    delete.alters_data = True
+
+    def create(self, **kwargs):
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True, using=self._db)
+        return obj
+
+    def bulk_create(self, objs, batch_size=None):
+        if not self._fans_out():
+            return super(CurrencyShardedQuerySet, self).bulk_create(objs, batch_size=batch_size)
+
+        by_database = {}
+        for obj in objs:
+            money = getattr(obj, self.shard_field)
+            alias = database_for_currency(money.currency if money is not None else None)
+            by_database.setdefault(alias, []).append(obj)
+        for alias, shard_objs in sorted(by_database.items()):
+            self.using(alias).bulk_create(shard_objs, batch_size=batch_size)
+        return objs
+
+
+class CurrencyShardedManager(MoneyManager):
+    """
+    The manager of a model sharded by the currency of `shard_field`, see
+    money.contrib.django.routers
+    """
+
+    def __init__(self, shard_field):
+        super(CurrencyShardedManager, self).__init__()
+        self.shard_field = shard_field
+
+    def contribute_to_class(self, model, name):
+        super(CurrencyShardedManager, self).contribute_to_class(model, name)
+        if not model._meta.abstract:
+            connect_shard_check(model)
+
+    def get_query_set(self):
+        return CurrencyShardedQuerySet(self.model, using=self._db, shard_field=self.shard_field)
@@ -0,0 +1,312 @@
+"""
+Per-currency running totals of money fields.
+
+Summing a money field over a large table is a full scan. Registering the
+field keeps one row per (model, field, group, currency) in a totals table
+instead, updated as rows are saved, deleted, bulk created or updated through
+QuerysetWithMoney, so reading the totals costs one small query:
+
+    class MoneyTotal(MoneyTotalBase):
+        pass
+
+    invoice_totals = register_totals(Invoice, 'outstanding', MoneyTotal, group_by='customer')
+
+    invoice_totals.totals()                 # [Money('1520.00', 'EUR'), Money('310.50', 'USD')]
+    invoice_totals.totals(group=customer)   # totals of one customer
+
+Changes made behind the ORM's back (raw SQL, QuerySet.update() of a plain
+manager) are not seen; rebuild() recomputes the totals from the table.
+"""
+from collections import OrderedDict, defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.signals import (class_prepared, post_delete, post_init, post_save,
+                                      pre_delete, pre_save)
+from django.utils.encoding import smart_unicode
+from fields import MoneyField, currency_field_name
+from money import Money
+
+__all__ = ('MoneyTotalBase', 'MoneyTotals', 'register_totals', 'registered_totals')
+
+# {(model, field name, totals model): MoneyTotals}
+_registry = OrderedDict()
+
+# The state of an instance loaded with the money field deferred
+_UNKNOWN = object()
+
+
+class MoneyTotalBase(models.Model):
+    """
+    Abstract model for the totals table. Subclass it once in your project,
+    the same table can hold the totals of any number of fields. A Meta of
+    the subclass should extend MoneyTotalBase.Meta to keep the unique
+    constraint.
+    """
+    model_label = models.CharField(max_length=100)
+    field_name = models.CharField(max_length=100)
+    group_key = models.CharField(max_length=255, blank=True, default='')
+    currency = models.CharField(max_length=3)
+    amount = models.DecimalField(max_digits=30, decimal_places=10, default=Decimal(0))
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+        unique_together = (('model_label', 'field_name', 'group_key', 'currency'),)
+
+    def __unicode__(self):
+        return u"%s.%s[%s] %s %s" % (self.model_label, self.field_name, self.group_key,
+                                      self.currency, self.amount)
+
+
+class MoneyTotals(object):
+    """
+    Keeps the totals of one money field. Use register_totals() to create one.
+    """
+
+    def __init__(self, model, field_name, totals_model, group_by=None):
+        self.model = model
+        self.field = model._meta.get_field(field_name)
+        if not isinstance(self.field, MoneyField):
+            raise ValueError("%s.%s is not a MoneyField" % (model._meta.object_name, field_name))
+        self.totals_model = totals_model
+        self.group_by = model._meta.get_field(group_by).attname if group_by else None
+        self.label = "%s.%s" % (model._meta.app_label, model._meta.object_name.lower())
+        self.uid = "money_totals:%s.%s:%s" % (self.label, field_name, totals_model._meta.db_table)
+        self.state_key = "_money_totals_%s" % field_name
+
+        self.watched = set([field_name, currency_field_name(field_name)])
+        self.watched.update(self.field.get_storage_attnames())
+        if group_by:
+            self.watched.update([group_by, self.group_by])
+
+    def connect(self, sender):
+        """ Connects the signal handlers for the model or one of its proxies """
+        uid = self.uid
+        post_init.connect(self._post_init, sender=sender, weak=False, dispatch_uid=uid)
+        pre_save.connect(self._load_state, sender=sender, weak=False, dispatch_uid=uid)
+        post_save.connect(self._post_save, sender=sender, weak=False, dispatch_uid=uid)
+        pre_delete.connect(self._load_state, sender=sender, weak=False, dispatch_uid=uid)
+        post_delete.connect(self._post_delete, sender=sender, weak=False, dispatch_uid=uid)
+
+    def _class_prepared(self, sender, **kwargs):
+        if sender._meta.proxy and sender._meta.concrete_model is self.model:
+            self.connect(sender)
+
+    def __repr__(self):
+        return "<MoneyTotals: %s.%s>" % (self.label, self.field.name)
+
+    def _rows(self):
+        return self.totals_model._default_manager.filter(model_label=self.label, field_name=self.field.name)
+
+    def _key(self, instance):
+        if self.group_by is None:
+            return ''
+        return self._key_from_value(getattr(instance, self.group_by))
+
+    def _state(self, instance):
+        """ The (group, currency, amount) an instance contributes, or None """
+        money = getattr(instance, self.field.name)
+        if money is None:
+            return None
+        return self._key(instance), money.currency.code, money.amount
+
+    def _aggregate(self, queryset, deltas, sign):
+        """ Adds the grouped sums of the queryset to deltas, times sign """
+        amount_attname, currency_attname = self.field.get_storage_attnames()
+        group_by = [self.group_by] if self.group_by else []
+        rows = (queryset.values(currency_attname, *group_by)
+                .order_by()
+                .annotate(money_total=Sum(amount_attname), money_count=Count(amount_attname)))
+        for row in rows:
+            if not row['money_count']:
+                continue
+            currency = self.field.currency_from_storage(row[currency_attname])
+            money = self.field.from_storage(row['money_total'], currency)
+            key = self._key_from_value(row[self.group_by]) if self.group_by else ''
+            delta = deltas[key, currency.code]
+            delta[0] += sign * money.amount
+            delta[1] += sign * row['money_count']
+
+    def _key_from_value(self, value):
+        if isinstance(value, models.Model):
+            value = value.pk
+        return u'' if value is None else smart_unicode(value)
+
+    def _apply(self, deltas, using):
+        with transaction.atomic(using=using, savepoint=False):
+            for (key, currency), (amount, count) in sorted(deltas.items()):
+                if not (amount or count):
+                    continue
+                if self._update_row(key, currency, amount, count, using):
+                    continue
+                try:
+                    with transaction.atomic(using=using):
+                        self.totals_model._default_manager.using(using).create(
+                            model_label=self.label, field_name=self.field.name,
+                            group_key=key, currency=currency, amount=amount, count=count)
+                except IntegrityError:
+                    # Another transaction created the row since the update
+                    if not self._update_row(key, currency, amount, count, using):
+                        raise
+
+    def _update_row(self, key, currency, amount, count, using):
+        rows = self._rows().using(using).filter(group_key=key, currency=currency)
+        return rows.update(amount=F('amount') + amount, count=F('count') + count)
+
+    def _add_state(self, deltas, state, sign):
+        if state is not None:
+            key, currency, amount = state
+            delta = deltas[key, currency]
+            delta[0] += sign * amount
+            delta[1] += sign
+
+    def _post_init(self, instance, **kwargs):
+        if instance._deferred:
+            # Reading a deferred field would cost a query per instance, the
+            # state is loaded on save or delete instead
+            instance.__dict__[self.state_key] = _UNKNOWN
+        else:
+            instance.__dict__[self.state_key] = self._state(instance)
+
+    def _load_state(self, instance, using=None, **kwargs):
+        state = instance.__dict__.get(self.state_key, _UNKNOWN)
+        if instance._state.adding:
+            # Not loaded from the database, e.g. deserialized by loaddata: the
+            # snapshot holds the new values, while a row with the primary
+            # key may exist already
+            state = None if instance.pk is None else _UNKNOWN
+        if state is _UNKNOWN:
+            try:
+                stored = self.model._base_manager.using(using).get(pk=instance.pk)
+            except self.model.DoesNotExist:
+                state = None
+            else:
+                state = stored.__dict__[self.state_key]
+        instance.__dict__[self.state_key] = state
+
+    def _post_save(self, instance, created, raw=False, using=None, **kwargs):
+        deltas = defaultdict(lambda: [Decimal(0), 0])
+        if not created:
+            self._add_state(deltas, instance.__dict__.get(self.state_key), -1)
+        state = self._state(instance)
+        self._add_state(deltas, state, 1)
+        self._apply(deltas, using)
+        instance.__dict__[self.state_key] = state
+
+    def _post_delete(self, instance, using=None, **kwargs):
+        deltas = defaultdict(lambda: [Decimal(0), 0])
+        self._add_state(deltas, instance.__dict__.get(self.state_key), -1)
+        self._apply(deltas, using)
+
+    def objects_created(self, objs, using):
+        """ Counts objects inserted without save(), e.g. by bulk_create() """
+        deltas = defaultdict(lambda: [Decimal(0), 0])
+        for obj in objs:
+            state = self._state(obj)
+            self._add_state(deltas, state, 1)
+            obj.__dict__[self.state_key] = state
+        self._apply(deltas, using)
+
+    def affected_by(self, names):
+        """ Whether an update() of the given field names changes the totals """
+        return not self.watched.isdisjoint(names)
+
+    def update(self, queryset, do_update):
+        """
+        Runs do_update(), an UPDATE of the queryset, and moves the totals of
+        the updated rows from their old to their new values. The primary keys
+        of the rows are read first, as the update may change which rows the
+        queryset matches.
+        """
+        using = queryset.db
+        pks = list(queryset.values_list('pk', flat=True))
+        deltas = defaultdict(lambda: [Decimal(0), 0])
+        for chunk in self._pk_chunks(pks):
+            self._aggregate(self.model._base_manager.using(using).filter(pk__in=chunk), deltas, -1)
+        rows = do_update()
+        for chunk in self._pk_chunks(pks):
+            self._aggregate(self.model._base_manager.using(using).filter(pk__in=chunk), deltas, 1)
+        self._apply(deltas, using)
+        return rows
+
+    def _pk_chunks(self, pks, size=500):
+        for start in range(0, len(pks), size):
+            yield pks[start:start + size]
+
+    def rebuild(self, using=None):
+        """ Recomputes the totals from the whole table """
+        using = using or self.model._base_manager.db
+        deltas = defaultdict(lambda: [Decimal(0), 0])
+        self._aggregate(self.model._base_manager.using(using).all(), deltas, 1)
+        with transaction.atomic(using=using):
+            self._rows().using(using).delete()
+            self.totals_model._default_manager.using(using).bulk_create([
+                self.totals_model(model_label=self.label, field_name=self.field.name,
+                                  group_key=key, currency=currency, amount=amount, count=count)
+                for (key, currency), (amount, count) in sorted(deltas.items())
+                if count
+            ])
+
+    def totals(self, group=None, using=None):
+        """
+        The totals as a list of Money, one per currency, sorted by currency.
+        With group_by, `group` selects the totals of one group, otherwise the
+        groups are added up.
+        """
+        rows = self._rows()
+        if using:
+            rows = rows.using(using)
+        if group is not None:
+            rows = rows.filter(group_key=self._key_from_value(group))
+        amounts = defaultdict(Decimal)
+        for currency, amount in rows.filter(count__gt=0).values_list('currency', 'amount'):
+            amounts[currency] += amount
+        return [Money(amounts[currency], currency) for currency in sorted(amounts)]
+
+    def counts(self, group=None, using=None):
+        """ The number of non-null values per currency code """
+        rows = self._rows()
+        if using:
+            rows = rows.using(using)
+        if group is not None:
+            rows = rows.filter(group_key=self._key_from_value(group))
+        counts = defaultdict(int)
+        for currency, count in rows.filter(count__gt=0).values_list('currency', 'count'):
+            counts[currency] += count
+        return dict(counts)
+
+
+def register_totals(model, field_name, totals_model, group_by=None):
+    """
+    Starts keeping the totals of `model.field_name` in `totals_model`, a
+    subclass of MoneyTotalBase, optionally per value of the `group_by`
+    field. Returns the MoneyTotals. Existing rows are not counted until
+    rebuild() is called.
+
+    Registering the same field and totals model again, e.g. when the module
+    doing it is imported under two names, returns the first registration.
+    """
+    key = model, field_name, totals_model
+    if key in _registry:
+        totals = _registry[key]
+        registered_group_by = model._meta.get_field(group_by).attname if group_by else None
+        if totals.group_by != registered_group_by:
+            raise ValueError("%r is already registered with another group_by" % totals)
+        return totals
+
+    totals = MoneyTotals(model, field_name, totals_model, group_by=group_by)
+    totals.connect(model)
+    # Signals of proxy models, including the classes Django creates for
+    # deferred loading, are sent with the proxy as sender
+    class_prepared.connect(totals._class_prepared, weak=False, dispatch_uid=totals.uid)
+
+    model._money_totals = getattr(model, '_money_totals', ()) + (totals,)
+    _registry[key] = totals
+    return totals
+
+
+def registered_totals(model=None):
+    """ The registered MoneyTotals, optionally only those of one model """
+    return [totals for totals in _registry.values() if model is None or totals.model is model]
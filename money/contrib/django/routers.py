@@ -0,0 +1,102 @@
+"""
+Routes the rows of currency sharded models to a database chosen by their
+currency. A model is sharded by giving it a CurrencyShardedManager naming
+the money field whose currency decides:
+
+    class LedgerEntry(models.Model):
+        amount = MoneyField(max_digits=12, decimal_places=2)
+
+        objects = CurrencyShardedManager('amount')
+
+and the settings map currencies to database aliases:
+
+    DATABASE_ROUTERS = ['money.contrib.django.routers.CurrencyRouter']
+    MONEY_CURRENCY_DATABASES = {'USD': 'us', 'CAD': 'us', 'EUR': 'eu'}
+    MONEY_CURRENCY_DEFAULT_DATABASE = 'default'   # all other currencies
+
+Saving and deleting instances goes through the router. Queries are routed
+by CurrencyShardedQuerySet: see there. Rows are not moved between
+databases: saving an instance whose new currency belongs to another
+database than the one it was loaded from raises ValueError.
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import pre_save
+
+from money import Money
+
+__all__ = ('CurrencyRouter', 'connect_shard_check', 'database_for_currency', 'shard_databases', 'shard_field')
+
+
+def database_for_currency(currency):
+    """ The database alias of a Currency or currency code """
+    code = getattr(currency, 'code', currency)
+    mapping = getattr(settings, 'MONEY_CURRENCY_DATABASES', {})
+    return mapping.get(code) or getattr(settings, 'MONEY_CURRENCY_DEFAULT_DATABASE', DEFAULT_DB_ALIAS)
+
+
+def shard_databases():
+    """ All the database aliases holding rows of sharded models, sorted """
+    aliases = set(getattr(settings, 'MONEY_CURRENCY_DATABASES', {}).values())
+    aliases.add(getattr(settings, 'MONEY_CURRENCY_DEFAULT_DATABASE', DEFAULT_DB_ALIAS))
+    return sorted(aliases)
+
+
+def shard_field(model):
+    """ The name of the money field a model is sharded by, or None """
+    manager = getattr(model, '_default_manager', None)
+    return getattr(manager, 'shard_field', None)
+
+
+def _instance_database(model, instance):
+    name = shard_field(model)
+    if name is None or not isinstance(instance, model):
+        return None
+    money = getattr(instance, name)
+    currency = money.currency if isinstance(money, Money) else None
+    if currency is None:
+        currency = getattr(instance._meta.get_field(name), 'default_currency', None)
+    return database_for_currency(currency)
+
+
+def _check_shard(sender, instance, raw=False, **kwargs):
+    """ Refuses saves that would leave a copy of the row in its old database """
+    stored = instance._state.db
+    if raw or stored is None or shard_field(sender) is None:
+        return
+    alias = _instance_database(sender, instance)
+    if alias != stored:
+        raise ValueError("The new currency of %s belongs to the '%s' database instead of '%s'. Rows are "
+                         "not moved between databases: delete it and create a new one" % (
+                             sender._meta.object_name, alias, stored))
+
+
+def connect_shard_check(model):
+    """
+    Checks the saves of a sharded model with _check_shard. Called by
+    CurrencyShardedManager for the models it is added to, including their
+    proxies.
+    """
+    pre_save.connect(_check_shard, sender=model, dispatch_uid='money_currency_shards')
+
+
+class CurrencyRouter(object):
+
+    def db_for_read(self, model, **hints):
+        return _instance_database(model, hints.get('instance'))
+
+    def db_for_write(self, model, **hints):
+        return _instance_database(model, hints.get('instance'))
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return None
+
+    def allow_syncdb(self, db, model):
+        if db not in shard_databases():
+            return None
+        if shard_field(model) is not None:
+            return True
+        # The shards only hold sharded models, except the default one
+        if db != getattr(settings, 'MONEY_CURRENCY_DEFAULT_DATABASE', DEFAULT_DB_ALIAS):
+            return False
+        return None
@@ -0,0 +1,89 @@
+"""
+Streaming dump and load of model tables in JSON lines.
+
+Each line holds one object in the same layout as a Django fixture:
+
+    {"model": "shop.order", "pk": 1, "fields": {"price": "123.45", "price_currency": "USD"}}
+
+The dump reads the columns with values_list() in primary key order, one
+chunk at a time, and writes the amount and currency columns of money fields
+as stored. No model instances are built and memory use stays flat. The load
+reads the lines back and inserts them with bulk_create() in batches.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, models
+
+from money.contrib.django.models.managers import keyset_chunks
+
+__all__ = ('dump_jsonl', 'load_jsonl')
+
+
+def dump_jsonl(queryset, stream, chunk_size=2000):
+    """
+    Writes the objects of the queryset to the stream, one JSON object per
+    line. Returns the number of objects written.
+    """
+    opts = queryset.model._meta.concrete_model._meta
+    label = "%s.%s" % (opts.app_label, opts.object_name.lower())
+    fields = [f for f in opts.concrete_fields if not f.primary_key]
+    attnames = [f.attname for f in fields]
+
+    encoder = DjangoJSONEncoder(sort_keys=True)
+    count = 0
+    queryset = queryset.order_by('pk').values_list('pk', *attnames)
+    for rows in keyset_chunks(queryset, chunk_size, lambda row: row[0]):
+        lines = []
+        for row in rows:
+            lines.append(encoder.encode({
+                "model": label,
+                "pk": row[0],
+                "fields": dict(zip(attnames, row[1:])),
+            }))
+        stream.write("\n".join(lines) + "\n")
+        count += len(rows)
+    return count
+
+
+def load_jsonl(stream, batch_size=2000, using=DEFAULT_DB_ALIAS):
+    """
+    Reads objects written by dump_jsonl() and inserts them with bulk_create()
+    in batches of `batch_size`. Objects are not saved one by one, so no
+    save() methods are called and no signals are sent. Returns the number of
+    objects loaded.
+    """
+    count = 0
+    model = None
+    batch = []
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        data = json.loads(line)
+
+        obj_model = models.get_model(*data["model"].split("."))
+        if obj_model is None:
+            raise ValueError("Unknown model '%s'" % data["model"])
+        if batch and (obj_model is not model or len(batch) >= batch_size):
+            model._base_manager.db_manager(using).bulk_create(batch)
+            count += len(batch)
+            batch = []
+        model = obj_model
+
+        values = data["fields"]
+        row = []
+        for field in model._meta.concrete_fields:
+            if field.primary_key:
+                value = data["pk"]
+            elif field.attname in values:
+                value = values[field.attname]
+            else:
+                value = field.get_default()
+            row.append(field.to_python(value))
+        batch.append(model(*row))
+
+    if batch:
+        model._base_manager.db_manager(using).bulk_create(batch)
+        count += len(batch)
+    return count
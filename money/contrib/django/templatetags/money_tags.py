@@ -0,0 +1,63 @@
+"""
+Template filters for displaying Money values. Add 'money.contrib.django' to
+INSTALLED_APPS and load the library:
+
+    {% load money_tags %}
+
+    {{ order.price|money_format }}          $1,234.50
+    {{ order.price|money_format:"code" }}   USD 1,234.50
+    {{ order.price|money_amount }}          1,234.50
+    {{ order.price|money_symbol }}          $
+
+    {% for price in prices|money_format_list %}<td>{{ price }}</td>{% endfor %}
+
+The decimal and thousand separators follow Django's number localization
+settings for the active language. Pass "grouped" to always group thousands.
+Amounts are rounded to the number of decimals of their currency.
+"""
+from django import template
+from django.conf import settings
+from django.utils import formats
+
+from money import Money
+from money.formatting import get_format, format_money_list
+
+register = template.Library()
+
+
+def _options(arg):
+    """ The formatting options for the current language and filter argument """
+    options = set(o.strip() for o in (arg or '').split(','))
+    grouped = 'grouped' in options or (settings.USE_L10N and settings.USE_THOUSAND_SEPARATOR)
+    return {
+        'decimal_sep': formats.get_format('DECIMAL_SEPARATOR'),
+        'thousand_sep': formats.get_format('THOUSAND_SEPARATOR'),
+        'grouping': (formats.get_format('NUMBER_GROUPING') or 3) if grouped else 0,
+        'symbol': 'code' not in options,
+    }
+
+
+@register.filter
+def money_format(value, arg=''):
+    if not isinstance(value, Money):
+        return value
+    return get_format(value.currency, **_options(arg)).format(value.amount)
+
+
+@register.filter
+def money_amount(value, arg=''):
+    if not isinstance(value, Money):
+        return value
+    return get_format(value.currency, **_options(arg)).format_amount(value.amount)
+
+
+@register.filter
+def money_symbol(value):
+    if not isinstance(value, Money):
+        return value
+    return value.currency.symbol or value.currency.code
+
+
+@register.filter
+def money_format_list(values, arg=''):
+    return format_money_list(values, **_options(arg))
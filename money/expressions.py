@@ -0,0 +1,246 @@
+"""
+Lazy Money expressions, compiled once and evaluated for many rows.
+
+Every operator of Money creates a new Money, going through __init__ and a
+currency check. Operators on expressions build a tree instead, checked
+for currency errors as it is built, and compiled into a single function
+computing with Decimals in one decimal context, rounded once at the end:
+
+    from money import Money, expr, var
+
+    price = var('price', 'USD')
+    total = (price * var('qty') - var('discount', 'USD')) * (1 + var('tax')) / var('n')
+
+    formula = total.compile()
+    formula(price=Money('9.99', 'USD'), qty=3, discount=Decimal('1.50'), tax='0.2', n=2)
+    for value in formula.map(rows):       # rows of dicts
+        ...
+
+    expr(Money('10', 'USD')) / 3          # a constant leaf
+
+The operators follow the rules of Money: amounts in different currencies
+can not be added, and Money can not be multiplied or divided by Money.
+"""
+from decimal import Decimal
+
+import six
+
+from money import Money, Currency, CURRENCY, CurrencyMismatchException, InvalidOperationException
+from context import get_money_context
+
+__all__ = ('Expression', 'Formula', 'expr', 'var')
+
+
+def _currency(currency):
+    if currency is None or isinstance(currency, Currency):
+        return currency
+    return CURRENCY[str(currency).upper()]
+
+
+class Expression(object):
+    """
+    A node of an expression tree. `currency` is the Currency of a monetary
+    expression and None for plain numbers.
+    """
+    currency = None
+
+    def compile(self, context=None):
+        """ A Formula evaluating the expression, in the given or current MoneyContext """
+        return Formula(self, context)
+
+    def evaluate(self, **values):
+        return self.compile()(values)
+
+    def variables(self):
+        """ The names of the variables of the expression """
+        return set()
+
+    def __add__(self, other):
+        return BinaryOperation('+', self, _wrap(other))
+
+    def __radd__(self, other):
+        return BinaryOperation('+', _wrap(other), self)
+
+    def __sub__(self, other):
+        return BinaryOperation('-', self, _wrap(other))
+
+    def __rsub__(self, other):
+        return BinaryOperation('-', _wrap(other), self)
+
+    def __mul__(self, other):
+        return BinaryOperation('*', self, _wrap(other))
+
+    def __rmul__(self, other):
+        return BinaryOperation('*', _wrap(other), self)
+
+    def __truediv__(self, other):
+        return BinaryOperation('/', self, _wrap(other))
+
+    def __rtruediv__(self, other):
+        return BinaryOperation('/', _wrap(other), self)
+
+    __div__ = __truediv__
+    __rdiv__ = __rtruediv__
+
+    def __neg__(self):
+        return Negation(self)
+
+    def __pos__(self):
+        return self
+
+
+class Constant(Expression):
+
+    def __init__(self, value, currency=None):
+        self.value = value
+        self.currency = currency
+
+    def __repr__(self):
+        return "%s %s" % (self.currency, self.value) if self.currency else str(self.value)
+
+    def _compile(self, context):
+        value = self.value
+        return lambda values: value
+
+
+class Variable(Expression):
+    """
+    A value looked up by name when evaluating: Money in `currency` or a
+    number in that currency for monetary variables, a number otherwise.
+    """
+
+    def __init__(self, name, currency=None):
+        self.name = name
+        self.currency = _currency(currency)
+
+    def __repr__(self):
+        return self.name
+
+    def variables(self):
+        return set([self.name])
+
+    def _compile(self, context):
+        name = self.name
+        currency = self.currency
+
+        def variable(values):
+            value = values[name]
+            if isinstance(value, Money):
+                if currency is None:
+                    raise InvalidOperationException(u"%s is a number, got %s" % (name, value))
+                if value.currency != currency:
+                    raise CurrencyMismatchException(u"Currency mismatch: %s != %s" % (currency, value.currency))
+                return value.amount
+            if isinstance(value, Decimal):
+                return value
+            return Decimal(str(value))
+        return variable
+
+
+class Negation(Expression):
+
+    def __init__(self, operand):
+        self.operand = operand
+        self.currency = operand.currency
+
+    def __repr__(self):
+        return "-%r" % (self.operand,)
+
+    def variables(self):
+        return self.operand.variables()
+
+    def _compile(self, context):
+        operand = self.operand._compile(context)
+        minus = context.minus
+        return lambda values: minus(operand(values))
+
+
+class BinaryOperation(Expression):
+
+    def __init__(self, operator, left, right):
+        self.operator = operator
+        self.left = left
+        self.right = right
+        self.currency = self._check(operator, left.currency, right.currency)
+
+    def _check(self, operator, left, right):
+        """ The currency of the result, raising when Money does not allow the operation """
+        if operator in '+-':
+            if left is not None and right is not None and left != right:
+                raise CurrencyMismatchException(u"Currency mismatch: %s != %s" % (left, right))
+            if operator == '-' and left is None and right is not None:
+                raise TypeError("Can not subtract Money from a number")
+            return left or right
+        if operator == '*':
+            if left is not None and right is not None:
+                raise InvalidOperationException(u'Cannot multiply monetary quantities')
+            return left or right
+        if right is not None:
+            raise InvalidOperationException(u'Cannot divide by monetary quantities')
+        return left
+
+    def __repr__(self):
+        return "(%r %s %r)" % (self.left, self.operator, self.right)
+
+    def variables(self):
+        return self.left.variables() | self.right.variables()
+
+    def _compile(self, context):
+        left = self.left._compile(context)
+        right = self.right._compile(context)
+        operation = {
+            '+': context.add,
+            '-': context.subtract,
+            '*': context.multiply,
+            '/': context.divide,
+        }[self.operator]
+        return lambda values: operation(left(values), right(values))
+
+
+def _wrap(value):
+    if isinstance(value, Expression):
+        return value
+    if isinstance(value, Money):
+        return Constant(value.amount, value.currency)
+    if isinstance(value, six.string_types):
+        raise TypeError("Expected a number or Money, got %r" % value)
+    return Constant(value if isinstance(value, Decimal) else Decimal(str(value)))
+
+
+class Formula(object):
+    """
+    A compiled Expression. Call it with a dict of values, keyword arguments
+    or both; monetary results are Money rounded once by the MoneyContext.
+    """
+
+    def __init__(self, expression, context=None):
+        self.expression = expression
+        self.currency = expression.currency
+        self.money_context = context or get_money_context()
+        self._function = expression._compile(self.money_context.decimal_context)
+
+    def __repr__(self):
+        return "<Formula: %r>" % (self.expression,)
+
+    def __call__(self, values=None, **kwargs):
+        if kwargs:
+            values = dict(values or {}, **kwargs)
+        amount = self._function(values or {})
+        if self.currency is None:
+            return amount
+        return Money(self.money_context.round(amount, self.currency), self.currency)
+
+    def map(self, rows):
+        """ Evaluates the formula for each dict of values """
+        for row in rows:
+            yield self(row)
+
+
+def expr(value):
+    """ An expression of a Money value or number, to build formulas from """
+    return _wrap(value)
+
+
+def var(name, currency=None):
+    """ A variable of a formula, monetary when `currency` is given """
+    return Variable(name, currency)
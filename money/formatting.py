@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Display formatting of Money values.
+
+Formatting a value means looking up the symbol and number of decimals of its
+currency, rounding, grouping the digits and assembling the parts. A
+MoneyFormat does the lookups once for a currency and a set of number
+conventions, and the formats are cached, so formatting many values only does
+the per-value work.
+"""
+import re
+from decimal import Decimal, ROUND_HALF_UP
+
+import six
+
+
+class MoneyFormat(object):
+    """
+    A precompiled format for amounts of a single currency:
+
+        fmt = MoneyFormat(CURRENCY['USD'])
+        fmt.format(Decimal('-1234.5'))    # u'-$1,234.50'
+
+    With `symbol=False`, or when the currency has no symbol, the currency
+    code is used instead: u'USD 1,234.50'. Amounts are rounded half up to the
+    number of decimals of the currency unless `decimals` is given.
+    """
+
+    def __init__(self, currency, decimal_sep=u'.', thousand_sep=u',', grouping=3, symbol=True, decimals=None):
+        self.currency = currency
+        self.decimal_sep = decimal_sep
+        self.thousand_sep = thousand_sep
+        self.grouping = grouping
+
+        if decimals is None:
+            decimals = currency.decimals or 0
+        self.decimals = decimals
+        self.quantum = Decimal(1).scaleb(-decimals)
+
+        if symbol and currency.symbol:
+            self.prefix = currency.symbol
+        else:
+            self.prefix = u"%s " % currency.code
+
+    def format_amount(self, amount):
+        """ Formats the number only, without the currency """
+        amount = Decimal(amount).quantize(self.quantum, rounding=ROUND_HALF_UP)
+        sign, digits, exponent = amount.as_tuple()
+        digits = u''.join(six.text_type(d) for d in digits)
+        if self.decimals:
+            digits = digits.rjust(self.decimals + 1, u'0')
+            integer, fraction = digits[:-self.decimals], digits[-self.decimals:]
+        else:
+            integer, fraction = digits, u''
+
+        if self.grouping and self.thousand_sep and len(integer) > self.grouping:
+            groups = []
+            while len(integer) > self.grouping:
+                groups.insert(0, integer[-self.grouping:])
+                integer = integer[:-self.grouping]
+            groups.insert(0, integer)
+            integer = self.thousand_sep.join(groups)
+
+        if fraction:
+            integer = integer + self.decimal_sep + fraction
+        return (u'-' + integer) if sign and amount else integer
+
+    def format(self, amount):
+        """ Formats the number with the currency symbol or code """
+        formatted = self.format_amount(amount)
+        if formatted.startswith(u'-'):
+            return u'-' + self.prefix + formatted[1:]
+        return self.prefix + formatted
+
+
+_FORMATS = {}
+
+
+def get_format(currency, decimal_sep=u'.', thousand_sep=u',', grouping=3, symbol=True, decimals=None):
+    """
+    Returns the cached MoneyFormat for a currency and set of conventions
+    """
+    key = (currency.code, currency.symbol, currency.decimals, decimal_sep, thousand_sep, grouping, symbol, decimals)
+    try:
+        return _FORMATS[key]
+    except KeyError:
+        fmt = MoneyFormat(currency, decimal_sep, thousand_sep, grouping, symbol, decimals)
+        _FORMATS[key] = fmt
+        return fmt
+
+
+def format_money(money, **kwargs):
+    """
+    Formats a Money value for display. See MoneyFormat for the options.
+
+        format_money(Money('1234.5', 'EUR'))                     # u'€1,234.50'
+        format_money(Money('1234.5', 'EUR'), symbol=False,
+                     decimal_sep=u',', thousand_sep=u'.')        # u'EUR 1.234,50'
+    """
+    return get_format(money.currency, **kwargs).format(money.amount)
+
+
+def format_money_list(moneys, **kwargs):
+    """
+    Formats a sequence of Money values, e.g. a column of a table. None values
+    are formatted as an empty string. The format of each currency is looked
+    up once for the whole sequence.
+    """
+    formats = {}
+    output = []
+    for money in moneys:
+        if money is None:
+            output.append(u'')
+            continue
+        try:
+            fmt = formats[money.currency.code]
+        except KeyError:
+            fmt = formats[money.currency.code] = get_format(money.currency, **kwargs)
+        output.append(fmt.format(money.amount))
+    return output
+
+
+_SPEC = re.compile(r"""
+    ^(?P<currency>[$cn])?
+    (?:(?P<fill>.)?(?P<align>[<>^]))?
+    (?P<sign>[-+ ])?
+    (?P<width>[1-9]\d*)?
+    (?P<thousands>,)?
+    (?:\.(?P<precision>\d+))?
+    [fF]?$
+""", re.VERBOSE | re.DOTALL)
+
+_SPECS = {}
+
+
+def parse_spec(spec):
+    """
+    Parses a format spec of Money values, as used by format() and
+    str.format(). The spec is a number spec like those of Decimal, without
+    zero padding or exponent types, optionally preceded by the way the
+    currency is shown: `$` for the symbol, `c` for the code (the default) or
+    `n` for none. Without a precision the decimals of the currency are used:
+
+        format(Money('1234.5', 'USD'), ',')        # 'USD 1,234.50'
+        format(Money('1234.5', 'USD'), '$,.0f')    # '$1,235'
+        format(Money('-5', 'EUR'), 'n>10')         # '     -5.00'
+
+    The parsed specs are cached.
+    """
+    try:
+        return _SPECS[spec]
+    except KeyError:
+        pass
+    match = _SPEC.match(spec)
+    if match is None:
+        raise ValueError("Invalid format specifier for Money: %r" % spec)
+    parts = match.groupdict()
+    parsed = (
+        parts['currency'] or 'c',
+        parts['fill'] or u' ',
+        parts['align'] or '>',
+        parts['sign'] or '-',
+        int(parts['width'] or 0),
+        bool(parts['thousands']),
+        None if parts['precision'] is None else int(parts['precision']),
+    )
+    _SPECS[spec] = parsed
+    return parsed
+
+
+def format_spec(money, spec):
+    """ Formats a Money value by a format spec, see parse_spec() """
+    currency, fill, align, sign, width, thousands, precision = parse_spec(spec)
+    fmt = get_format(money.currency, thousand_sep=u',' if thousands else u'',
+                     symbol=currency == '$', decimals=precision)
+    number = fmt.format_amount(money.amount)
+    if number.startswith(u'-'):
+        number = number[1:]
+        sign = u'-'
+    else:
+        sign = u'' if sign == '-' else six.text_type(sign)
+    formatted = sign + (u'' if currency == 'n' else fmt.prefix) + number
+
+    padding = width - len(formatted)
+    if padding > 0:
+        if align == '<':
+            formatted = formatted + fill * padding
+        elif align == '^':
+            formatted = fill * (padding // 2) + formatted + fill * (padding - padding // 2)
+        else:
+            formatted = fill * padding + formatted
+    return formatted
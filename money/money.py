@@ -4,7 +4,11 @@ import six
 
 import exceptions
 
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
+
+import formatting
+from backends import DECIMAL
+from context import MoneyContext, money_context, get_money_context, set_default_money_context
 
 
 class Currency(object):
@@ -38,7 +42,49 @@ class Currency(object):
         return not self.__eq__(other)
 
 
-CURRENCY = {}
+class CurrencyRegistry(dict):
+    """
+    The dict of known currencies by code. The version is incremented on every
+    modification so that values derived from the registry can be cached.
+    """
+    version = 0
+
+    def _modified(self):
+        self.version += 1
+
+    def __setitem__(self, key, value):
+        super(CurrencyRegistry, self).__setitem__(key, value)
+        self._modified()
+
+    def __delitem__(self, key):
+        super(CurrencyRegistry, self).__delitem__(key)
+        self._modified()
+
+    def clear(self):
+        super(CurrencyRegistry, self).clear()
+        self._modified()
+
+    def pop(self, *args):
+        value = super(CurrencyRegistry, self).pop(*args)
+        self._modified()
+        return value
+
+    def popitem(self):
+        item = super(CurrencyRegistry, self).popitem()
+        self._modified()
+        return item
+
+    def setdefault(self, key, default=None):
+        value = super(CurrencyRegistry, self).setdefault(key, default)
+        self._modified()
+        return value
+
+    def update(self, *args, **kwargs):
+        super(CurrencyRegistry, self).update(*args, **kwargs)
+        self._modified()
+
+
+CURRENCY = CurrencyRegistry()
 CURRENCY['XXX'] = Currency(code="XXX", numeric="999")
 DEFAULT_CURRENCY = CURRENCY['XXX']
 
@@ -60,7 +106,8 @@ class Money(object):
     An amount of money with an optional currency
 
     Pass in the amount and currency during initialization. Amounts will be
-    represented as Decimals internally.
+    represented as Decimals internally, or as defined by the `backend` of
+    the type (see money.backends).
 
     The following are supported:
 
@@ -106,13 +153,16 @@ class Money(object):
         Parses a properly formatted string. The string should be formatted as
         given by the repr function: 'USD 123.45'
         """
-        return Money(*cls._from_string(value))
+        return cls(*cls._from_string(value))
 
     def _currency_check(self, other):
         """ Compare the currencies matches and raise if not """
         if self._currency != other.currency:
             raise CurrencyMismatchException(u"Currency mismatch: %s != %s" % (self._currency, other.currency,))
 
+    # The representation of the amounts, see money.backends
+    backend = DECIMAL
+
     def __init__(self, amount=None, currency=None):
         if isinstance(amount, Decimal):
             self._amount = amount
@@ -142,49 +192,97 @@ class Money(object):
         self._currency = currency
         assert isinstance(self._amount, Decimal)
         assert isinstance(self._currency, Currency)
+        if self.backend is not DECIMAL:
+            self._amount = self.backend.from_decimal(self._amount, currency)
+
+    @classmethod
+    def _from_value(cls, value, currency):
+        """ A new instance from a value of the backend and a Currency """
+        money = cls.__new__(cls)
+        money._amount = value
+        money._currency = currency
+        return money
+
+    def _new(self, value):
+        return self._from_value(value, self._currency)
+
+    def _value_of(self, other):
+        """ The value of another Money in the backend of this one """
+        if other.backend is self.backend:
+            return other._amount
+        return self.backend.from_decimal(other.amount, self._currency)
 
     @property
     def amount(self):
+        return self.backend.to_decimal(self._amount, self._currency)
+
+    @property
+    def value(self):
+        """ The amount in the representation of the backend """
         return self._amount
 
     @property
     def currency(self):
         return self._currency
 
+    def round(self, rounding=ROUND_HALF_UP):
+        """ The value rounded to the decimals of its currency """
+        return self._new(self.backend.round(self._amount, self._currency, rounding))
+
     def __str__(self):
-        return "{} {}".format(self._currency, self._amount)
+        # Money is immutable, so the string is built once. Logging and
+        # reports convert the same values over and over
+        try:
+            return self._str
+        except AttributeError:
+            self._str = "{} {}".format(self._currency, self.backend.to_string(self._amount, self._currency))
+            return self._str
 
     def __unicode__(self):
-        return u"{} {}".format(self._currency, self._amount)
+        return six.text_type(str(self))
 
     def __repr__(self):
         return str(self)
 
+    def __format__(self, spec):
+        """
+        Supports format specs like those of Decimal, see
+        money.formatting.parse_spec(). An empty spec gives str(money).
+        """
+        if not spec:
+            return six.text_type(self) if isinstance(spec, six.text_type) else str(self)
+        formatted = formatting.format_spec(self, spec)
+        if not isinstance(spec, six.text_type):
+            formatted = formatted.encode('utf-8')
+        return formatted
+
     def __float__(self):
-        return float(self._amount)
+        return float(self.amount)
 
     def __int__(self):
-        return int(self._amount)
+        return int(self.amount)
 
     def __pos__(self):
-        return Money(amount=self._amount, currency=self._currency)
+        return self._new(self._amount)
 
     def __neg__(self):
-        return Money(amount=-self._amount, currency=self._currency)
+        return self._new(self.backend.negate(self._amount))
 
     def __add__(self, other):
         if isinstance(other, Money):
             self._currency_check(other)
-            return Money(amount=self._amount + other.amount, currency=self._currency)
+            return self._new(self.backend.add(self._amount, self._value_of(other)))
         else:
-            return Money(amount=self._amount + Decimal(str(other)), currency=self._currency)
+            other = self.backend.from_decimal(Decimal(str(other)), self._currency)
+            return self._new(self.backend.add(self._amount, other))
 
     def __sub__(self, other):
         if isinstance(other, Money):
             self._currency_check(other)
-            return Money(amount=self._amount - other.amount, currency=self._currency)
+            return self._new(self.backend.subtract(self._amount, self._value_of(other)))
         else:
-            return Money(amount=self._amount - Decimal(str(other)), currency=self._currency)
+            other = self.backend.from_decimal(Decimal(str(other)), self._currency)
+            return self._new(self.backend.subtract(self._amount, other))
 
     def __rsub__(self, other):
         # In the case where both values are Money, the left hand one will be
@@ -195,7 +293,7 @@ class Money(object):
     def __mul__(self, other):
         if isinstance(other, Money):
             raise InvalidOperationException(u'Cannot multiply monetary quantities')
-        return Money(amount=self._amount*Decimal(str(other)), currency=self._currency)
+        return self._new(self.backend.multiply(self._amount, Decimal(str(other)), self._currency))
 
     def __truediv__(self, other):
         """
@@ -204,7 +302,7 @@ class Money(object):
         """
         if isinstance(other, Money):
             raise InvalidOperationException(u'Cannot divide two monetary quantities')
-        return Money(amount=self._amount / other, currency=self._currency)
+        return self._new(self.backend.divide(self._amount, other, self._currency))
 
     __div__ = __truediv__
 
@@ -222,19 +320,23 @@ class Money(object):
 
     # Boolean
     def __bool__(self):
-        if self._amount != 0:
-            return True
-        else:
-            return False
+        return not self.backend.is_zero(self._amount)
 
     __nonzero__ = __bool__
 
     # Comparison operators
+    def _compare(self, other):
+        if other.backend is self.backend:
+            return self.backend.compare(self._amount, other._amount)
+        # Compared exactly, as converting to this backend could round
+        amount, other = self.amount, other.amount
+        return (amount > other) - (amount < other)
+
     def __eq__(self, other):
         if isinstance(other, Money):
-            return (self._amount == other.amount) and (self._currency == other.currency)
+            return (self._currency == other.currency) and self._compare(other) == 0
         # Allow comparison to 0
-        if (other == 0) and (self._amount == 0):
+        if (other == 0) and self.backend.is_zero(self._amount):
             return True
         return False
 
@@ -244,16 +346,16 @@ class Money(object):
     def __lt__(self, other):
         if isinstance(other, Money):
             self._currency_check(other)
-            return (self._amount < other.amount)
+            return self._compare(other) < 0
         else:
-            return (self._amount < Decimal(str(other)))
+            return (self.amount < Decimal(str(other)))
 
     def __gt__(self, other):
         if isinstance(other, Money):
             self._currency_check(other)
-            return (self._amount > other.amount)
+            return self._compare(other) > 0
         else:
-            return (self._amount > Decimal(str(other)))
+            return (self.amount > Decimal(str(other)))
 
     def __le__(self, other):
         return self < other or self == other
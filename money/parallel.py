@@ -0,0 +1,156 @@
+"""
+Exact per-currency sums of large numbers of Money values, spread over
+processes.
+
+    from money.parallel import parallel_sum
+
+    parallel_sum(values, workers=8)                 # {'EUR': EUR 1520.00, 'USD': USD 310.50}
+    parallel_sum(['day1.txt', 'day2.txt'])          # files of 'USD 123.45' lines
+
+Values are sent to the worker processes as text chunks of 'USD 123.45'
+lines rather than pickled Money objects, and files are split into byte
+ranges read by the workers themselves. Each worker sums the integer
+coefficients of the amounts per currency and exponent, so no rounding
+happens anywhere: the totals are the same as those of sum_by_currency(),
+whatever the chunking and the order the partial sums arrive in.
+"""
+import multiprocessing
+import os
+from collections import deque
+from decimal import Decimal
+
+import six
+
+from money import Money
+
+__all__ = ('parallel_sum', 'sum_by_currency')
+
+# Bytes of a file read by one task
+FILE_CHUNK_BYTES = 32 * 1024 * 1024
+
+
+def _add(totals, code, amount):
+    sign, digits, exponent = amount.as_tuple()
+    coefficient = int(''.join(map(str, digits)) or 0)
+    by_exponent = totals.setdefault(code, {})
+    by_exponent[exponent] = by_exponent.get(exponent, 0) + (-coefficient if sign else coefficient)
+
+
+def _add_line(totals, line):
+    line = line.strip()
+    if line:
+        code, amount = line.split(None, 1)
+        _add(totals, code, Decimal(amount))
+
+
+def _merge(totals, partial):
+    for code, by_exponent in partial.items():
+        merged = totals.setdefault(code, {})
+        for exponent, coefficient in by_exponent.items():
+            merged[exponent] = merged.get(exponent, 0) + coefficient
+
+
+def _result(totals):
+    """ The partial sums as {code: Money} """
+    result = {}
+    for code, by_exponent in totals.items():
+        exponent = min(by_exponent)
+        total = sum(coefficient * 10 ** (e - exponent) for e, coefficient in by_exponent.items())
+        # Built from a tuple so that the current context cannot round it
+        amount = Decimal((1 if total < 0 else 0, tuple(int(d) for d in str(abs(total))), exponent))
+        result[code] = Money(amount, code)
+    return result
+
+
+def _sum_lines(text):
+    totals = {}
+    for line in text.splitlines():
+        _add_line(totals, line)
+    return totals
+
+
+def _sum_file_range(task):
+    """ Sums the lines of a file starting in the byte range [start, end) """
+    path, start, end = task
+    totals = {}
+    with open(path, 'rb') as stream:
+        if start:
+            # The line containing byte start - 1 belongs to the previous range
+            stream.seek(start - 1)
+            stream.readline()
+        while stream.tell() < end:
+            line = stream.readline()
+            if not line:
+                break
+            _add_line(totals, line)
+    return totals
+
+
+def _file_tasks(paths, chunk_bytes):
+    for path in paths:
+        size = os.path.getsize(path)
+        for start in range(0, max(size, 1), chunk_bytes):
+            yield _sum_file_range, (path, start, min(start + chunk_bytes, size))
+
+
+def _value_tasks(values, chunk_size):
+    chunk = []
+    for money in values:
+        if money is None:
+            continue
+        # str() of Money is cached and is the wire format
+        chunk.append(str(money))
+        if len(chunk) == chunk_size:
+            yield _sum_lines, "\n".join(chunk)
+            chunk = []
+    if chunk:
+        yield _sum_lines, "\n".join(chunk)
+
+
+def sum_by_currency(values):
+    """ The exact totals of Money values as {currency code: Money}, serially """
+    totals = {}
+    for money in values:
+        if money is not None:
+            _add(totals, money.currency.code, money.amount)
+    return _result(totals)
+
+
+def parallel_sum(source, workers=None, chunk_size=100000, chunk_bytes=FILE_CHUNK_BYTES):
+    """
+    The exact totals of Money values as {currency code: Money}.
+
+    `source` is an iterable of Money, None values being skipped, or a file
+    path or list of file paths of 'USD 123.45' lines. Values are sent to
+    the workers in chunks of `chunk_size` and files are read in ranges of
+    `chunk_bytes`. `workers` defaults to the number of CPUs; with a single
+    worker everything runs in this process. At most two tasks per worker
+    are queued at a time, so iterators are consumed as they are summed.
+    """
+    if isinstance(source, six.string_types):
+        source = [source]
+    if isinstance(source, (list, tuple)) and source and isinstance(source[0], six.string_types):
+        tasks = _file_tasks(source, chunk_bytes)
+    else:
+        tasks = _value_tasks(source, chunk_size)
+
+    workers = workers or multiprocessing.cpu_count()
+    totals = {}
+    if workers == 1:
+        for function, argument in tasks:
+            _merge(totals, function(argument))
+        return _result(totals)
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        pending = deque()
+        for function, argument in tasks:
+            if len(pending) >= 2 * workers:
+                _merge(totals, pending.popleft().get())
+            pending.append(pool.apply_async(function, (argument,)))
+        while pending:
+            _merge(totals, pending.popleft().get())
+    finally:
+        pool.terminate()
+        pool.join()
+    return _result(totals)
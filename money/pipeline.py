@@ -0,0 +1,234 @@
+"""
+Streaming aggregation of records carrying Money values.
+
+A Pipeline reads records from a source, an iterable or a queue fed by
+another thread, and passes them through stages each running in its own
+thread. Stages are connected by bounded queues, so a slow stage holds back
+the ones before it instead of buffering without limit:
+
+    from money.pipeline import Pipeline
+
+    pipeline = (Pipeline.from_queue(events, maxsize=1000)
+                .filter(lambda event: event.status == 'paid')
+                .map(to_money, workers=4)
+                .window(size=10000)
+                .sums())
+
+    for window_totals in pipeline:              # {'EUR': EUR 1520.00, 'USD': USD 310.50}
+        publish(window_totals)
+
+Stages with CPU heavy functions can run them in a pool of `workers`
+threads, or processes with `processes=True`, keeping the order of the
+records. An exception raised in a stage stops the pipeline and is raised
+again where the pipeline is iterated.
+"""
+import threading
+from collections import deque
+from multiprocessing.pool import Pool, ThreadPool
+
+from six.moves import queue
+
+from money import Money
+
+__all__ = ('Pipeline',)
+
+_END = object()
+# Yielded by sources waiting for records, so their thread can see a stop
+_IDLE = object()
+
+
+class _Failure(object):
+    def __init__(self, exception):
+        self.exception = exception
+
+
+def _sum(totals, money, currency=None):
+    if money is None:
+        return
+    if currency is not None:
+        # Money addition raises CurrencyMismatchException on a wrong currency
+        money = Money(0, currency) + money
+    code = money.currency.code
+    totals[code] = totals[code] + money if code in totals else money
+
+
+class Pipeline(object):
+    """
+    A chain of stages over a source of records. Stage methods return a new
+    Pipeline; iterating it runs all the stages. A Pipeline can be iterated
+    once.
+
+    Once iterating, `threads` holds the threads running the stages. When the
+    loop is left early they stop shortly after; join them to wait for it.
+    """
+
+    def __init__(self, source, maxsize=100):
+        self.source = source
+        self.maxsize = maxsize
+        self.stages = []
+        self.threads = []
+
+    @classmethod
+    def from_queue(cls, source_queue, sentinel=None, maxsize=100):
+        """ Reads records from a queue until `sentinel` is received """
+        def records():
+            while True:
+                try:
+                    record = source_queue.get(timeout=0.1)
+                except queue.Empty:
+                    yield _IDLE
+                    continue
+                if record is sentinel:
+                    return
+                yield record
+        return cls(records(), maxsize=maxsize)
+
+    def _chain(self, stage):
+        pipeline = Pipeline(self.source, self.maxsize)
+        pipeline.stages = self.stages + [stage]
+        return pipeline
+
+    def filter(self, predicate):
+        """ Keeps the records for which predicate(record) is true """
+        def stage(records):
+            for record in records:
+                if predicate(record):
+                    yield record
+        return self._chain(stage)
+
+    def map(self, function, workers=1, processes=False):
+        """
+        Replaces the records by function(record). With several `workers`
+        the calls run in a thread pool, or a process pool with `processes`
+        (the function and records must then be picklable). The order of the
+        records is kept.
+        """
+        if workers == 1 and not processes:
+            def stage(records):
+                for record in records:
+                    yield function(record)
+            return self._chain(stage)
+
+        def parallel_stage(records):
+            pool = (Pool if processes else ThreadPool)(workers)
+            try:
+                pending = deque()
+                for record in records:
+                    if len(pending) >= 2 * workers:
+                        yield pending.popleft().get()
+                    pending.append(pool.apply_async(function, (record,)))
+                while pending:
+                    yield pending.popleft().get()
+            finally:
+                pool.terminate()
+                pool.join()
+        return self._chain(parallel_stage)
+
+    def window(self, size=None, key=None):
+        """
+        Groups the records into lists: of `size` records, or of consecutive
+        records with the same key(record), e.g. the minute of a timestamp.
+        """
+        if (size is None) == (key is None):
+            raise ValueError("Pass either size or key")
+
+        def stage(records):
+            window = []
+            current = None
+            for record in records:
+                if key is not None:
+                    value = key(record)
+                    if window and value != current:
+                        yield window
+                        window = []
+                    current = value
+                window.append(record)
+                if size is not None and len(window) == size:
+                    yield window
+                    window = []
+            if window:
+                yield window
+        return self._chain(stage)
+
+    def sums(self, amount=None, currency=None):
+        """
+        Replaces each window by the totals of its Money values per currency
+        code. `amount` extracts the Money of a record, records are Money
+        otherwise. With `currency`, values in any other currency raise
+        CurrencyMismatchException.
+        """
+        def stage(windows):
+            for window in windows:
+                totals = {}
+                for record in window:
+                    _sum(totals, amount(record) if amount else record, currency)
+                yield totals
+        return self._chain(stage)
+
+    def totals(self, amount=None, currency=None):
+        """ Runs the pipeline and returns the totals of all its records, see sums() """
+        totals = {}
+        for record in self:
+            _sum(totals, amount(record) if amount else record, currency)
+        return totals
+
+    def __iter__(self):
+        stop = threading.Event()
+        records = iter(self.source)
+        self.threads = []
+        for stage in [lambda records: records] + self.stages:
+            output = queue.Queue(self.maxsize)
+            thread = threading.Thread(target=self._run, args=(stage, records, output, stop))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+            records = self._drain(output, stop)
+        try:
+            for record in records:
+                yield record
+        finally:
+            stop.set()
+
+    def _put(self, output, item, stop):
+        while not stop.is_set():
+            try:
+                output.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _run(self, stage, records, output, stop):
+        results = stage(records)
+        try:
+            for record in results:
+                if record is _IDLE:
+                    if stop.is_set():
+                        return
+                    continue
+                if not self._put(output, record, stop):
+                    return
+        except Exception as e:
+            self._put(output, _Failure(e), stop)
+        else:
+            self._put(output, _END, stop)
+        finally:
+            # Runs the cleanup of the stage, e.g. terminating its pool, now
+            # rather than when the generator is garbage collected
+            close = getattr(results, 'close', None)
+            if close is not None:
+                close()
+
+    def _drain(self, output, stop):
+        while True:
+            try:
+                item = output.get(timeout=0.1)
+            except queue.Empty:
+                if stop.is_set():
+                    return
+                continue
+            if item is _END:
+                return
+            if isinstance(item, _Failure):
+                raise item.exception
+            yield item
@@ -1,5 +1,7 @@
 from django.db import models
 from money.contrib.django.models import fields
+from money.contrib.django.models.managers import CurrencyShardedManager
+from money.contrib.django.models.totals import MoneyTotalBase, register_totals
 from money import Money
 
 
@@ -53,6 +55,87 @@ class NullableMoneyModel(models.Model):
         app_label = 'tests'
 
 
+class CompactMoneyModel(models.Model):
+    name = models.CharField(max_length=100)
+
+    price = fields.CompactMoneyField(default=Money("0", "USD"))
+    discount = fields.CompactMoneyField(null=True)
+
+    def __unicode__(self):
+        return self.name + u" " + unicode(self.price)
+
+    class Meta:
+        app_label = 'tests'
+
+
+class RelatedMoneyModel(models.Model):
+    item = models.ForeignKey(SimpleMoneyModel, related_name='related')
+
+    fee = fields.MoneyField(max_digits=12, decimal_places=3)
+    compact_item = models.ForeignKey(CompactMoneyModel, null=True)
+
+    class Meta:
+        app_label = 'tests'
+
+
+class ShardedMoneyModel(models.Model):
+    name = models.CharField(max_length=100)
+
+    amount = fields.MoneyField(max_digits=12, decimal_places=3)
+
+    objects = CurrencyShardedManager('amount')
+
+    def __unicode__(self):
+        return self.name + u" " + unicode(self.amount)
+
+    class Meta:
+        app_label = 'tests'
+        ordering = ('name',)
+
+
+# Rates into EUR, changed by the tests
+BASE_RATES = {}
+
+
+def base_rates():
+    return BASE_RATES
+
+
+class RatedMoneyModel(models.Model):
+    name = models.CharField(max_length=100)
+
+    price = fields.MoneyField(max_digits=12, decimal_places=3, null=True,
+                              base_currency='EUR', base_rates=base_rates)
+
+    def __unicode__(self):
+        return self.name + u" " + unicode(self.price)
+
+    class Meta:
+        app_label = 'tests'
+
+
+class MoneyTotal(MoneyTotalBase):
+
+    class Meta(MoneyTotalBase.Meta):
+        app_label = 'tests'
+
+
+class LedgerEntry(models.Model):
+    account = models.CharField(max_length=100)
+
+    amount = fields.MoneyField(max_digits=12, decimal_places=3, null=True)
+    fee = fields.CompactMoneyField(null=True)
+
+    def __unicode__(self):
+        return self.account + u" " + unicode(self.amount)
+
+    class Meta:
+        app_label = 'tests'
+
+amount_totals = register_totals(LedgerEntry, 'amount', MoneyTotal, group_by='account')
+fee_totals = register_totals(LedgerEntry, 'fee', MoneyTotal)
+
+
 # A parametrized way of testing the model defaults. The following are all
 # accetpable ways the field can be defined on a model
 class ParametrizedModel(models.Model):
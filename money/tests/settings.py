@@ -13,6 +13,15 @@ DATABASES = {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': ':memory:',
     },
+    # Shards of the currency sharded test models
+    'us': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
+    'eu': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
     # 'default': {
     #     'ENGINE': 'django.db.backends.postgresql_psycopg2',
     #     'NAME': 'money',
@@ -21,11 +30,20 @@ DATABASES = {
 
 INSTALLED_APPS = (
     'money',
+    'money.contrib.django',
     'money.tests',
 )
 
 SECRET_KEY = 'abcde12345'
 
+DATABASE_ROUTERS = ['money.contrib.django.routers.CurrencyRouter']
+
+MONEY_CURRENCY_DATABASES = {
+    'USD': 'us',
+    'CAD': 'us',
+    'EUR': 'eu',
+}
+
 ROOT_URLCONF = 'money.tests.urls'
 
 CACHES = {
@@ -0,0 +1,90 @@
+import pytest
+
+from money import Money
+from money.amortization import amortization, schedule, schedules
+
+
+def test_annuity():
+    loan = schedule(Money('10000', 'USD'), rate='0.05', periods=12)
+    assert len(loan) == 12
+    assert loan.payment[:11] == [85607] * 11
+    assert loan.interest[0] == 4167
+    assert loan.balance[-1] == 0
+    assert sum(loan.principal) == 1000000
+    # The last period pays the exact remaining balance
+    assert loan.payment[-1] == loan.interest[-1] + loan.balance[-2]
+    assert loan.total_payment() == loan.total_interest() + Money('10000', 'USD')
+
+    period, payment, interest, principal, balance = list(loan)[0]
+    assert period == 1
+    assert payment == Money('856.07', 'USD')
+    assert interest == Money('41.67', 'USD')
+    assert principal == Money('814.40', 'USD')
+    assert balance == Money('9185.60', 'USD')
+
+
+def test_linear():
+    loan = schedule(Money('1000', 'EUR'), rate='0.12', periods=3, plan='linear')
+    assert loan.principal == [33333, 33333, 33334]
+    assert loan.interest == [1000, 667, 333]
+    assert loan.balance == [66667, 33334, 0]
+    assert loan.payment == [34333, 34000, 33667]
+
+
+def test_interest_only_and_zero_rate():
+    loan = schedule(Money('1200', 'JPY'), rate='0.06', periods=3, plan='interest_only')
+    assert loan.payment == [6, 6, 1206]
+    assert loan.principal == [0, 0, 1200]
+
+    loan = schedule(Money('100', 'USD'), rate='0', periods=3)
+    assert loan.payment == [3333, 3333, 3334]
+    assert loan.interest == [0, 0, 0]
+
+
+def test_many_periods():
+    loan = schedule(Money('250000', 'USD'), rate='0.045', periods=360)
+    assert loan.payment[0] == 126671
+    assert loan.balance[-1] == 0
+    assert sum(loan.principal) == 25000000
+    # The rounding of the payment accumulates into the last one
+    assert 0 < loan.payment[-1] - loan.payment[0] < 360
+
+
+def test_tiny_principals():
+    loan = schedule(Money('0.07', 'USD'), rate='0', periods=12)
+    assert min(loan.balance) == 0 and min(loan.payment) == 0
+    assert sum(loan.principal) == 7
+
+    loan = schedule(Money('1.55', 'USD'), rate='0', periods=200, plan='linear')
+    assert loan.principal[:199] == [0] * 199
+    assert loan.payment[-1] == 155
+
+    loan = schedule(Money('0.05', 'USD'), rate='0.1', periods=24)
+    assert min(loan.balance) == 0 and min(loan.principal) >= 0
+    assert sum(loan.principal) == 5
+
+
+def test_thousands_of_periods():
+    for plan in ('annuity', 'linear', 'interest_only'):
+        for principal in ('1', '12.34', '99999.99'):
+            loan = schedule(Money(principal, 'USD'), rate='0.03', periods=5000, plan=plan, periods_per_year=365)
+            assert len(loan) == 5000
+            assert min(loan.balance) == 0 and loan.balance[-1] == 0
+            assert min(loan.principal) >= 0 and min(loan.payment) >= 0
+            assert sum(loan.principal) == int(Money(principal, 'USD').amount * 100)
+
+
+def test_batch_and_generator():
+    principals = [Money('1000', 'USD'), Money('500', 'EUR'), Money('100000', 'JPY')]
+    batch = list(schedules(principals, rate='0.08', periods=24))
+    assert [loan.currency.code for loan in batch] == ['USD', 'EUR', 'JPY']
+    for principal, loan in zip(principals, batch):
+        assert list(amortization(principal, rate='0.08', periods=24)) == list(loan)
+        assert list(loan) == list(schedule(principal, rate='0.08', periods=24))
+
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        schedule(Money('1', 'USD'), rate='0.1', periods=12, plan='balloon')
+    with pytest.raises(ValueError):
+        schedule(Money('1', 'USD'), rate='0.1', periods=0)
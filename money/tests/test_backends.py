@@ -0,0 +1,136 @@
+from __future__ import division
+
+import pickle
+from decimal import Decimal, DivisionByZero, ROUND_05UP, ROUND_FLOOR, ROUND_HALF_UP, ROUND_UP
+from fractions import Fraction
+
+import pytest
+
+from money import Money, CurrencyMismatchException
+from money.backends import DECIMAL, FRACTION, MINOR_UNITS, MinorUnitsBackend, get_backend, register_backend
+from money.instrumentation import collect
+
+
+class LedgerMoney(Money):
+    backend = MINOR_UNITS
+
+
+class ExactMoney(Money):
+    backend = FRACTION
+
+
+def test_default_backend():
+    money = Money('12.345', 'USD')
+    assert Money.backend is DECIMAL
+    assert money.value is money.amount
+    assert money.round() == Money('12.35', 'USD')
+
+
+def test_minor_units():
+    money = LedgerMoney('12.34', 'USD')
+    assert money.value == 1234
+    assert money.amount == Decimal('12.34')
+    assert str(money) == 'USD 12.34'
+    assert LedgerMoney('1000', 'JPY').value == 1000
+    assert LedgerMoney('1.2345', 'BHD').value == 1234
+    # Rounded half even to cents
+    assert LedgerMoney('0.125', 'USD').value == 12
+    assert LedgerMoney('0.135', 'USD').value == 14
+
+    total = money + LedgerMoney('0.66', 'USD') - 1
+    assert isinstance(total, LedgerMoney)
+    assert total.value == 1200
+    assert (-total).value == -1200
+    assert (money * 3).value == 3702
+    assert (money * Decimal('0.5')).value == 617
+    assert (LedgerMoney('10', 'USD') / 3).value == 333
+    assert (LedgerMoney('0.05', 'USD') / 2).value == 2
+    assert (LedgerMoney('0.07', 'USD') / 2).value == 4
+    with pytest.raises(DivisionByZero):
+        money / 0
+    with pytest.raises(TypeError):
+        money / 1.5
+
+
+def test_minor_units_rounding():
+    assert LedgerMoney('-0.125', 'USD').value == -12
+    assert LedgerMoney('-0.135', 'USD').value == -14
+    # Values are whole minor units, round() has nothing left to do
+    assert LedgerMoney('0.125', 'USD').round(ROUND_UP).value == 12
+
+    class HalfUpMoney(Money):
+        backend = MinorUnitsBackend(ROUND_HALF_UP)
+    assert HalfUpMoney('0.125', 'USD').value == 13
+    assert HalfUpMoney('-0.125', 'USD').value == -13
+    assert (HalfUpMoney('0.05', 'USD') / 2).value == 3
+
+    class FloorMoney(Money):
+        backend = MinorUnitsBackend(ROUND_FLOOR)
+    assert FloorMoney('0.129', 'USD').value == 12
+    assert FloorMoney('-0.121', 'USD').value == -13
+    assert (FloorMoney('-0.10', 'USD') / 3).value == -4
+
+    with pytest.raises(ValueError):
+        MinorUnitsBackend(ROUND_05UP)
+
+
+def test_fraction():
+    third = ExactMoney('10', 'USD') / 3
+    assert third.value == Fraction(10, 3)
+    assert (third * 3).value == 10
+    assert (third * 3) == ExactMoney('10', 'USD')
+    assert third.round().value == Fraction(333, 100)
+    assert str(ExactMoney('1.5', 'EUR')) == 'EUR 1.5'
+    assert third.amount == Decimal('3.333333333333333333333333333')
+
+
+def test_comparisons():
+    assert LedgerMoney('1.00', 'USD') == LedgerMoney('1', 'USD')
+    assert LedgerMoney('1.00', 'USD') < LedgerMoney('1.01', 'USD')
+    assert LedgerMoney('1.01', 'USD') >= LedgerMoney('1.01', 'USD')
+    assert LedgerMoney('1.00', 'USD') > 0.5
+    assert LedgerMoney('0', 'USD') == 0
+    assert not LedgerMoney('0', 'USD')
+    assert LedgerMoney('0.01', 'USD')
+    assert LedgerMoney('1', 'USD') != LedgerMoney('1', 'EUR')
+    with pytest.raises(CurrencyMismatchException):
+        LedgerMoney('1', 'USD') < LedgerMoney('1', 'EUR')
+
+
+def test_mixed_backends():
+    assert LedgerMoney('1.25', 'USD') == Money('1.25', 'USD')
+    assert Money('1.255', 'USD') > LedgerMoney('1.25', 'USD')
+    assert Money('1.255', 'USD') != LedgerMoney('1.26', 'USD')
+    # The left operand decides the backend of the result
+    total = LedgerMoney('1', 'USD') + Money('0.255', 'USD')
+    assert isinstance(total, LedgerMoney) and total.value == 126
+    total = Money('1', 'USD') + LedgerMoney('0.25', 'USD')
+    assert type(total) is Money and total.amount == Decimal('1.25')
+    with pytest.raises(CurrencyMismatchException):
+        LedgerMoney('1', 'USD') + Money('1', 'EUR')
+
+
+def test_serialization():
+    for backend, value in [(DECIMAL, Decimal('1.50')), (MINOR_UNITS, 150), (FRACTION, Fraction(1, 3))]:
+        currency = Money(0, 'USD').currency
+        assert backend.deserialize(backend.serialize(value, currency), currency) == value
+    money = pickle.loads(pickle.dumps(LedgerMoney('2.50', 'USD')))
+    assert isinstance(money, LedgerMoney) and money.value == 250
+    assert LedgerMoney.from_string('USD 2.50').value == 250
+
+
+def test_registry():
+    assert get_backend('minor_units') is MINOR_UNITS
+    with pytest.raises(ValueError):
+        get_backend('float')
+
+    class FloatBackend(DECIMAL.__class__):
+        name = 'test_float'
+    backend = register_backend(FloatBackend())
+    assert get_backend('test_float') is backend
+
+
+def test_constructions_are_counted():
+    with collect() as stats:
+        LedgerMoney('1', 'USD') + LedgerMoney('2', 'USD')
+    assert stats.counts['construct'] == 3
@@ -0,0 +1,46 @@
+import pytest
+
+# The benchmarks live next to the package in a checkout and are not installed
+bench_core = pytest.importorskip('benchmarks.bench_core')
+bench_memory = pytest.importorskip('benchmarks.bench_memory')
+
+
+def test_core_benchmarks_run():
+    results = bench_core.run(repeat=1, number=10, verbose=False)
+    names = [result['name'] for result in results]
+    assert 'construct_str' in names
+    assert 'backend_minor_units_sum' in names
+    assert 'backend_fraction_div' in names
+    assert all(result['ns_per_op'] > 0 for result in results)
+
+    results = bench_core.run(repeat=1, number=10, names=['add', 'str'], verbose=False)
+    assert [result['name'] for result in results] == ['add', 'str']
+
+
+def test_compare_flags_regressions():
+    baseline = {'results': [{'name': 'add', 'ns_per_op': 100.0},
+                            {'name': 'sub', 'ns_per_op': 100.0}]}
+    results = [{'name': 'add', 'ns_per_op': 109.0},
+               {'name': 'sub', 'ns_per_op': 125.0},
+               {'name': 'mul', 'ns_per_op': 500.0}]
+    assert bench_core.compare(results, baseline) == [('sub', 1.25)]
+    assert bench_core.compare(results, baseline, threshold=0.05) == [('add', 1.09), ('sub', 1.25)]
+
+
+def test_memory_benchmarks():
+    results = dict((result['name'], result) for result in bench_memory.measure(count=200))
+    assert sorted(results) == ['currency', 'decimal_column', 'minor_units_column', 'money', 'money_str_cached']
+    assert results['money']['count'] == 200
+    assert results['money']['bytes_per_item'] > results['decimal_column']['bytes_per_item']
+    assert results['money_str_cached']['bytes_per_item'] > results['money']['bytes_per_item']
+    assert results['minor_units_column']['bytes_per_item'] < results['decimal_column']['bytes_per_item']
+
+    baseline = {'results': [{'name': 'money', 'bytes_per_item': results['money']['bytes_per_item'] / 2}]}
+    assert [name for name, _ in bench_core.compare(results.values(), baseline, key='bytes_per_item')] == ['money']
+
+
+def test_memory_population():
+    population = bench_memory.make_population(100, bench_memory.parse_currencies('USD:1,JPY:1'), 3)
+    assert set(money.currency.code for money in population) == set(['USD', 'JPY'])
+    assert all(money.amount.as_tuple().exponent == -3 for money in population)
+    assert bench_memory.parse_currencies('usd,eur:2') == [('USD', 1.0), ('EUR', 2.0)]
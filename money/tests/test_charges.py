@@ -0,0 +1,98 @@
+from decimal import Decimal, ROUND_HALF_EVEN
+
+import pytest
+
+from money import Money, CurrencyMismatchException
+from money.charges import Schedule, fixed, percent
+
+
+def test_example():
+    schedule = Schedule([
+        percent('vat', '0.20', inclusive=True),
+        percent('card', '0.029', minimum=Money('0.30', 'USD')),
+        fixed('handling', Money('0.50', 'USD')),
+    ])
+    result = schedule.apply([Money('10', 'USD'), Money('99.99', 'USD')])
+    assert len(result) == 2
+    assert result.line(0) == {
+        'net': Money('8.33', 'USD'),
+        'vat': Money('1.67', 'USD'),
+        'card': Money('0.30', 'USD'),
+        'handling': Money('0.50', 'USD'),
+        'total': Money('10.80', 'USD'),
+    }
+    # 99.99 / 1.2 = 83.325, card 2.9% of 83.32 = 2.41628
+    assert result.line(1) == {
+        'net': Money('83.32', 'USD'),
+        'vat': Money('16.67', 'USD'),
+        'card': Money('2.42', 'USD'),
+        'handling': Money('0.50', 'USD'),
+        'total': Money('102.91', 'USD'),
+    }
+    assert result.totals()['total'] == Money('113.71', 'USD')
+    assert result.charges['vat'] == [167, 1667]
+
+
+def test_compound_and_caps():
+    schedule = Schedule([
+        percent('gst', '0.05'),
+        percent('qst', '0.09975', compound=True),
+        percent('service', '0.10', maximum=Money('5', 'CAD')),
+    ])
+    line = schedule.apply([Money('100', 'CAD')]).line(0)
+    assert line['gst'] == Money('5.00', 'CAD')
+    # 9.975% of 105.00
+    assert line['qst'] == Money('10.47', 'CAD')
+    assert line['service'] == Money('5.00', 'CAD')
+    assert line['total'] == Money('120.47', 'CAD')
+
+
+def test_currency_decimals_and_rounding():
+    schedule = Schedule([percent('tax', '0.125')])
+    assert schedule.apply([Money('100', 'JPY')]).line(0)['tax'] == Money('13', 'JPY')
+    assert schedule.apply([Money('1', 'BHD')]).line(0)['tax'] == Money('0.125', 'BHD')
+    assert schedule.apply([Decimal('0.20')], currency='USD').line(0)['tax'] == Money('0.03', 'USD')
+
+    half_even = Schedule([percent('tax', '0.125')], rounding=ROUND_HALF_EVEN)
+    assert half_even.apply([Money('0.20', 'USD')]).line(0)['tax'] == Money('0.02', 'USD')
+    assert half_even.apply([Money('0.60', 'USD')]).line(0)['tax'] == Money('0.08', 'USD')
+
+
+def test_refunds_keep_their_sign():
+    schedule = Schedule([percent('fee', '0.03', minimum=Money('1', 'EUR'))])
+    result = schedule.apply([Money('-10', 'EUR'), Money('-100', 'EUR')])
+    assert result.charges['fee'] == [-100, -300]
+
+
+def test_minor_units():
+    schedule = Schedule([percent('tax', '0.2')])
+    result = schedule.apply_minor_units([100, 250, 5], 'USD')
+    assert result.charges['tax'] == [20, 50, 1]
+    assert result.total == [120, 300, 6]
+    assert result.totals()['net'] == Money('3.55', 'USD')
+
+
+def test_compiled_once_per_currency():
+    schedule = Schedule([percent('tax', '0.2')])
+    assert schedule.compile('USD') is schedule.compile('USD')
+    assert schedule.compile('USD') is not schedule.compile('EUR')
+
+
+def test_currency_mismatch():
+    schedule = Schedule([fixed('fee', [Money('1', 'USD'), Money('1', 'EUR')])])
+    assert schedule.apply([Money('1', 'EUR')]).line(0)['fee'] == Money('1.00', 'EUR')
+    with pytest.raises(CurrencyMismatchException):
+        schedule.apply([Money('1', 'GBP')])
+    with pytest.raises(CurrencyMismatchException):
+        schedule.apply([Money('1', 'USD'), Money('1', 'EUR')])
+    with pytest.raises(CurrencyMismatchException):
+        Schedule([percent('tax', '0.1', maximum=Money('1', 'USD'))]).apply([Money(1, 'EUR')])
+
+
+def test_invalid_schedules():
+    with pytest.raises(ValueError):
+        percent('tax', '0.1', compound=True, inclusive=True)
+    with pytest.raises(ValueError):
+        Schedule([percent('total', '0.1')])
+    with pytest.raises(ValueError):
+        Schedule([percent('tax', '0.1'), percent('tax', '0.2')])
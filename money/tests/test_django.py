@@ -1,15 +1,38 @@
+import json
+import os
 import pytest
+import tempfile
 
-from django.test import TestCase
+from decimal import Decimal
+from StringIO import StringIO
+
+from django.contrib.admin import AdminSite, ModelAdmin
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import RequestFactory, TestCase
 from django.db import IntegrityError
-from money import Money, CURRENCY
+from django.db.models import Avg, Count, F, Max, Q
+from django.forms.models import modelform_factory
+from money import Money, CURRENCY, CurrencyMismatchException
 from money.contrib.django.models.fields import NotSupportedLookup
+from money.contrib.django.serializers import dump_jsonl, load_jsonl
 from money.tests.models import (
     SimpleMoneyModel,
     MoneyModelDefaultMoneyUSD,
     MoneyModelDefaults,
     NullableMoneyModel,
+    CompactMoneyModel,
+    LedgerEntry,
+    ShardedMoneyModel,
+    RelatedMoneyModel,
+    RatedMoneyModel,
+    BASE_RATES,
+    MoneyTotal,
+    amount_totals,
+    fee_totals,
 )
+from money.contrib.django.models.totals import register_totals
+from money.contrib.django.management.commands.rewrite_money_currency import Command as RewriteCommand
 
 
 @pytest.mark.django_db
@@ -188,6 +211,47 @@ class MoneyFieldTestCase(TestCase):
         self.assertEqual(qset.count(), 2)
         self.assertSameCurrency([ent.price for ent in qset], "UAH")
 
+    def test_range_lookup(self):
+        SimpleMoneyModel.objects.create(name="ninety nine dollars", price=Money(99, "USD"))
+        SimpleMoneyModel.objects.create(name="one hundred dollars", price=Money(100, "USD"))
+        SimpleMoneyModel.objects.create(name="one hundred and one dollars", price=Money(101, "USD"))
+        SimpleMoneyModel.objects.create(name="one hundred euros", price=Money(100, "EUR"))
+
+        qset = SimpleMoneyModel.objects.filter(price__range=(Money(100, "USD"), Money(101, "USD")))
+        self.assertEqual(qset.count(), 2)
+        self.assertSameCurrency([ent.price for ent in qset], "USD")
+
+        qset = SimpleMoneyModel.objects.exclude(price__range=(Money(100, "USD"), Money(101, "USD")))
+        self.assertEqual(qset.count(), 2)
+
+        with pytest.raises(CurrencyMismatchException):
+            SimpleMoneyModel.objects.filter(price__range=(Money(100, "USD"), Money(101, "EUR")))
+
+    def test_in_lookup(self):
+        SimpleMoneyModel.objects.create(name="one hundred dollars", price=Money(100, "USD"))
+        SimpleMoneyModel.objects.create(name="two hundred dollars", price=Money(200, "USD"))
+        SimpleMoneyModel.objects.create(name="one hundred euros", price=Money(100, "EUR"))
+        SimpleMoneyModel.objects.create(name="two hundred euros", price=Money(200, "EUR"))
+        SimpleMoneyModel.objects.create(name="one hundred yen", price=Money(100, "JPY"))
+
+        # Single currency
+        qset = SimpleMoneyModel.objects.filter(price__in=[Money(100, "USD"), Money(200, "USD")])
+        self.assertEqual(qset.count(), 2)
+        self.assertSameCurrency([ent.price for ent in qset], "USD")
+
+        # Mixed currencies are grouped per currency
+        qset = SimpleMoneyModel.objects.filter(price__in=[Money(100, "USD"), Money(200, "EUR")])
+        self.assertEqual(set(ent.name for ent in qset), set(["one hundred dollars", "two hundred euros"]))
+
+        qset = SimpleMoneyModel.objects.exclude(price__in=[Money(100, "USD"), Money(200, "EUR")])
+        self.assertEqual(qset.count(), 3)
+
+        entry = SimpleMoneyModel.objects.get(price__in=[Money(100, "JPY"), Money(300, "EUR")])
+        self.assertEqual(entry.price, Money(100, "JPY"))
+
+        with pytest.raises(ValueError):
+            SimpleMoneyModel.objects.filter(price__in=[Money(100, "USD"), 200])
+
     def test_price_attribute(self):
         e = SimpleMoneyModel()
         e.price = Money(3, "BGN")
@@ -332,3 +396,830 @@ class TestMoneyFieldFixtureLoading(TestCase):
         self.assertEqual(model1.price, Money("123.45", "USD"))
         model2 = SimpleMoneyModel.objects.get(pk=1002)
         self.assertEqual(model2.price, Money("12345", "JPY"))
+
+
+@pytest.mark.django_db
+class TestCompactMoneyField(TestCase):
+
+    def test_storage_columns(self):
+        field_names = [f.column for f in CompactMoneyModel._meta.concrete_fields]
+        self.assertIn('price_minor', field_names)
+        self.assertIn('price_currency', field_names)
+        self.assertNotIn('price', field_names)
+
+    def test_round_trip(self):
+        instance = CompactMoneyModel.objects.create(name="test", price=Money("123.45", "USD"))
+        self.assertEqual(instance.price_minor, 12345)
+        self.assertEqual(instance.price_currency, 840)
+
+        instance = CompactMoneyModel.objects.get(pk=instance.pk)
+        self.assertEqual(instance.price, Money("123.45", "USD"))
+        self.assertEqual(instance.discount, None)
+
+        instance.price = Money("500", "JPY")
+        instance.save()
+        instance = CompactMoneyModel.objects.get(pk=instance.pk)
+        self.assertEqual(instance.price, Money("500", "JPY"))
+        self.assertEqual(instance.price_minor, 500)
+
+    def test_default(self):
+        instance = CompactMoneyModel()
+        self.assertEqual(instance.price, Money("0", "USD"))
+
+    def test_assign_decimal_keeps_currency(self):
+        instance = CompactMoneyModel(price=Money("1", "BHD"))
+        instance.price = Decimal("2.125")
+        self.assertEqual(instance.price, Money("2.125", "BHD"))
+        self.assertEqual(instance.price_minor, 2125)
+
+    def test_excess_precision(self):
+        with pytest.raises(ValueError):
+            CompactMoneyModel(price=Money("1.005", "USD"))
+
+    def test_lookups(self):
+        CompactMoneyModel.objects.create(name="ten dollars", price=Money("10", "USD"))
+        CompactMoneyModel.objects.create(name="twenty dollars", price=Money("20", "USD"))
+        CompactMoneyModel.objects.create(name="ten euros", price=Money("10", "EUR"))
+        CompactMoneyModel.objects.create(name="thousand yen", price=Money("1000", "JPY"))
+
+        self.assertEqual(CompactMoneyModel.objects.get(price=Money("10", "USD")).name, "ten dollars")
+        self.assertEqual(CompactMoneyModel.objects.filter(price__gt=Money("10", "USD")).count(), 1)
+        self.assertEqual(CompactMoneyModel.objects.filter(price__gte=Money("10", "EUR")).count(), 1)
+        self.assertEqual(CompactMoneyModel.objects.filter(
+            price__range=(Money("5", "USD"), Money("15", "USD"))).count(), 1)
+        self.assertEqual(CompactMoneyModel.objects.filter(
+            price__in=[Money("20", "USD"), Money("1000", "JPY")]).count(), 2)
+        self.assertEqual(CompactMoneyModel.objects.filter(discount__isnull=True).count(), 4)
+
+        names = [m.name for m in CompactMoneyModel.objects.filter(price_currency=840).order_by('-price')]
+        self.assertEqual(names, ["twenty dollars", "ten dollars"])
+
+        with pytest.raises(ValueError):
+            CompactMoneyModel.objects.filter(price=10)
+
+    def test_serialization(self):
+        from django.core import serializers
+        CompactMoneyModel.objects.create(name="test", price=Money("123.45", "USD"), discount=Money("1", "EUR"))
+        data = serializers.serialize('json', CompactMoneyModel.objects.all())
+        self.assertIn('"price": "USD 123.45"', data)
+        self.assertNotIn('price_minor', data)
+
+        CompactMoneyModel.objects.all().delete()
+        for obj in serializers.deserialize('json', data):
+            obj.save()
+        instance = CompactMoneyModel.objects.get()
+        self.assertEqual(instance.price, Money("123.45", "USD"))
+        self.assertEqual(instance.discount, Money("1.00", "EUR"))
+
+    def test_values(self):
+        CompactMoneyModel.objects.create(name="test", price=Money("1.25", "EUR"))
+        self.assertEqual(list(CompactMoneyModel.objects.values('name', 'price', 'discount')),
+                         [{'name': "test", 'price': Money("1.25", "EUR"), 'discount': None}])
+        self.assertEqual(list(CompactMoneyModel.objects.values('price', 'price_minor')),
+                         [{'price': Money("1.25", "EUR"), 'price_minor': 125}])
+        self.assertEqual(list(CompactMoneyModel.objects.values('price').annotate(count=Count('pk'))),
+                         [{'price': Money("1.25", "EUR"), 'count': 1}])
+
+    def test_values_list(self):
+        CompactMoneyModel.objects.create(name="test", price=Money("1.25", "EUR"))
+        self.assertEqual(list(CompactMoneyModel.objects.values_list('price', 'name')),
+                         [(Money("1.25", "EUR"), "test")])
+        self.assertEqual(list(CompactMoneyModel.objects.values_list('price', flat=True)),
+                         [Money("1.25", "EUR")])
+        self.assertEqual(list(CompactMoneyModel.objects.values_list('name', flat=True)), ["test"])
+        self.assertEqual(list(CompactMoneyModel.objects.values_list('price').annotate(Count('pk'))),
+                         [(Money("1.25", "EUR"), 1)])
+
+    def test_only(self):
+        pk = CompactMoneyModel.objects.create(name="test", price=Money("1.25", "EUR")).pk
+        instance = CompactMoneyModel.objects.only('name').get()
+        self.assertEqual(instance.price, Money("1.25", "EUR"))
+        instance.name = "renamed"
+        instance.save()
+        instance = CompactMoneyModel.objects.only('price').get()
+        self.assertEqual(instance.price, Money("1.25", "EUR"))
+        instance.price = Money("2", "USD")
+        instance.save()
+        instance = CompactMoneyModel.objects.get(pk=pk)
+        self.assertEqual((instance.name, instance.price), ("renamed", Money("2", "USD")))
+
+    def test_defer(self):
+        pk = CompactMoneyModel.objects.create(name="test", price=Money("1.25", "EUR")).pk
+        instance = CompactMoneyModel.objects.defer('price').get()
+        self.assertEqual(instance.price, Money("1.25", "EUR"))
+        instance.name = "renamed"
+        instance.save()
+        instance = CompactMoneyModel.objects.defer('name').get()
+        self.assertEqual(instance.price, Money("1.25", "EUR"))
+        instance.price = Money("2", "USD")
+        instance.save()
+        instance = CompactMoneyModel.objects.get(pk=pk)
+        self.assertEqual((instance.name, instance.price), ("renamed", Money("2", "USD")))
+
+    def test_model_form(self):
+        form_class = modelform_factory(CompactMoneyModel)
+        self.assertEqual(list(form_class.base_fields), ['name', 'price', 'discount'])
+        form = form_class({'name': "test", 'price_0': "5.5", 'price_1': "EUR",
+                           'discount_0': "1", 'discount_1': "JPY"})
+        self.assertTrue(form.is_valid(), form.errors)
+        instance = CompactMoneyModel.objects.get(pk=form.save().pk)
+        self.assertEqual(instance.price, Money("5.50", "EUR"))
+        self.assertEqual(instance.discount, Money("1", "JPY"))
+
+        form = form_class(instance=instance)
+        self.assertEqual(form.initial['price'], Money("5.50", "EUR"))
+
+    def test_admin(self):
+        model_admin = ModelAdmin(CompactMoneyModel, AdminSite())
+        form_class = model_admin.get_form(RequestFactory().get('/'))
+        self.assertIn('price', form_class.base_fields)
+
+
+@pytest.mark.django_db
+class TestChunkedIteration(TestCase):
+
+    def setUp(self):
+        for i in range(10):
+            SimpleMoneyModel.objects.create(name="item %s" % i, price=Money(i, "USD" if i % 2 else "EUR"))
+            CompactMoneyModel.objects.create(name="item %s" % i, price=Money(i, "JPY"))
+
+    def test_chunked(self):
+        with self.assertNumQueries(3):
+            chunks = list(SimpleMoneyModel.objects.chunked(chunk_size=4))
+        self.assertEqual([len(chunk) for chunk in chunks], [4, 4, 2])
+
+        names = [instance.name for chunk in chunks for instance in chunk]
+        self.assertEqual(names, ["item %s" % i for i in range(10)])
+
+    def test_chunked_exact_multiple(self):
+        chunks = list(SimpleMoneyModel.objects.chunked(chunk_size=5))
+        self.assertEqual([len(chunk) for chunk in chunks], [5, 5])
+
+    def test_stream_filtered(self):
+        prices = [instance.price for instance in
+                  SimpleMoneyModel.objects.filter(price__gte=Money(4, "USD")).stream(chunk_size=2)]
+        self.assertEqual(prices, [Money(5, "USD"), Money(7, "USD"), Money(9, "USD")])
+
+    def test_chunked_values(self):
+        chunks = list(SimpleMoneyModel.objects.chunked_values('name', 'price', chunk_size=3))
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 3, 1])
+
+        rows = [row for chunk in chunks for row in chunk]
+        self.assertEqual(rows[0], ("item 0", Money(0, "EUR")))
+        self.assertEqual(rows[9], ("item 9", Money(9, "USD")))
+
+    def test_chunked_values_compact(self):
+        rows = [row for chunk in CompactMoneyModel.objects.chunked_values('price', 'discount', chunk_size=4)
+                for row in chunk]
+        self.assertEqual(rows[3], (Money(3, "JPY"), None))
+
+
+@pytest.mark.django_db
+class TestConvertedAmounts(TestCase):
+
+    rates = {'USD': Decimal('0.5'), 'JPY': Decimal('0.25')}
+
+    def setUp(self):
+        for name, price in [("a", Money(100, "EUR")), ("b", Money(300, "USD")), ("c", Money(40, "JPY")),
+                            ("d", Money(1, "GBP"))]:
+            SimpleMoneyModel.objects.create(name=name, price=price)
+            CompactMoneyModel.objects.create(name=name, price=price)
+
+    def test_annotate_and_order(self):
+        for model in (SimpleMoneyModel, CompactMoneyModel):
+            qset = model.objects.annotate_converted('price', to='EUR', rates=self.rates)
+            ordered = [(m.name, Decimal(str(m.price_eur))) for m in qset.order_by('-price_eur') if m.price_eur is not None]
+            self.assertEqual(ordered, [("b", Decimal("150")), ("a", Decimal("100")), ("c", Decimal("10"))])
+
+    def test_filter(self):
+        for model in (SimpleMoneyModel, CompactMoneyModel):
+            qset = model.objects.filter_converted('price', to='EUR', rates=self.rates, gte=Money(100, 'EUR'))
+            self.assertEqual(sorted(m.name for m in qset), ["a", "b"])
+
+            qset = model.objects.filter_converted('price', to='EUR', rates=self.rates.items(), gt=10, lt=150)
+            self.assertEqual([m.name for m in qset], ["a"])
+
+            with pytest.raises(CurrencyMismatchException):
+                model.objects.filter_converted('price', to='EUR', rates=self.rates, gt=Money(1, 'USD'))
+
+    def test_aggregate(self):
+        for model in (SimpleMoneyModel, CompactMoneyModel):
+            total = model.objects.aggregate_converted('price', to='EUR', rates=self.rates)
+            self.assertEqual(total, Money(260, 'EUR'))
+
+            total = model.objects.filter(name="z").aggregate_converted('price', to='EUR', rates=self.rates)
+            self.assertEqual(total, Money(0, 'EUR'))
+
+    def test_aggregate_is_exact(self):
+        for model in (SimpleMoneyModel, CompactMoneyModel):
+            for i in range(10):
+                model.objects.create(name="x", price=Money("0.10", "USD"))
+            total = model.objects.filter(name="x").aggregate_converted(
+                'price', to='EUR', rates={'USD': Decimal('0.1234567890123456789')})
+            self.assertEqual(total.amount, Decimal('0.1234567890123456789'))
+
+
+@pytest.mark.django_db
+class TestExpressionUpdates(TestCase):
+
+    def test_assign_money(self):
+        instance = SimpleMoneyModel.objects.create(name="test", price=Money(1, "USD"))
+        SimpleMoneyModel.objects.filter(pk=instance.pk).update(price=Money(2, "EUR"))
+        self.assertEqual(SimpleMoneyModel.objects.get(pk=instance.pk).price, Money(2, "EUR"))
+
+    def test_increment(self):
+        instance = SimpleMoneyModel.objects.create(name="test", price=Money(10, "USD"))
+        with self.assertNumQueries(2):
+            rows = SimpleMoneyModel.objects.filter(pk=instance.pk).update(price=F('price') + Money(5, "USD"))
+        self.assertEqual(rows, 1)
+        self.assertEqual(SimpleMoneyModel.objects.get(pk=instance.pk).price, Money(15, "USD"))
+
+        SimpleMoneyModel.objects.filter(pk=instance.pk).update(price=(F('price') - Money(3, "USD")) * 2)
+        self.assertEqual(SimpleMoneyModel.objects.get(pk=instance.pk).price, Money(24, "USD"))
+
+    def test_currency_mismatch(self):
+        usd = SimpleMoneyModel.objects.create(name="usd", price=Money(10, "USD"))
+        eur = SimpleMoneyModel.objects.create(name="eur", price=Money(10, "EUR"))
+
+        with pytest.raises(CurrencyMismatchException):
+            SimpleMoneyModel.objects.all().update(price=F('price') + Money(5, "USD"))
+        self.assertEqual(SimpleMoneyModel.objects.get(pk=usd.pk).price, Money(10, "USD"))
+
+        with pytest.raises(CurrencyMismatchException):
+            SimpleMoneyModel.objects.update(price=F('price') + Money(5, "USD") - Money(1, "EUR"))
+
+        with self.assertNumQueries(1):
+            rows = SimpleMoneyModel.objects.all().update(price=F('price') + Money(5, "USD"), _check_currency=False)
+        self.assertEqual(rows, 1)
+        self.assertEqual(SimpleMoneyModel.objects.get(pk=usd.pk).price, Money(15, "USD"))
+        self.assertEqual(SimpleMoneyModel.objects.get(pk=eur.pk).price, Money(10, "EUR"))
+
+    def test_compact_increment(self):
+        instance = CompactMoneyModel.objects.create(name="test", price=Money("10.50", "USD"))
+        CompactMoneyModel.objects.filter(pk=instance.pk).update(price=F('price') + Money("0.25", "USD"))
+        self.assertEqual(CompactMoneyModel.objects.get(pk=instance.pk).price, Money("10.75", "USD"))
+
+        CompactMoneyModel.objects.filter(pk=instance.pk).update(price=Money("3", "JPY"), discount=Money("1", "JPY"))
+        instance = CompactMoneyModel.objects.get(pk=instance.pk)
+        self.assertEqual(instance.price, Money("3", "JPY"))
+        self.assertEqual(instance.discount, Money("1", "JPY"))
+
+    def test_compact_whole_minor_units(self):
+        instance = CompactMoneyModel.objects.create(name="test", price=Money("10.25", "USD"))
+        queryset = CompactMoneyModel.objects.filter(pk=instance.pk)
+        for value in [F('price') * Decimal('1.5'), F('price') / 2, F('price') + 1, F('id') * 2, 10,
+                      (F('price') + Money("1", "USD")) * 0.5]:
+            with pytest.raises(ValueError):
+                queryset.update(price=value)
+        self.assertEqual(CompactMoneyModel.objects.get(pk=instance.pk).price, Money("10.25", "USD"))
+
+        queryset.update(price=(F('price') - Money("0.05", "USD")) * 3 + F('id') * Money("0.01", "USD"))
+        self.assertEqual(CompactMoneyModel.objects.get(pk=instance.pk).price,
+                         Money("30.60", "USD") + Money("0.01", "USD") * instance.pk)
+
+    def test_update_from_other_field(self):
+        usd = CompactMoneyModel.objects.create(name="usd", price=Money("10", "USD"), discount=Money("1", "USD"))
+        eur = CompactMoneyModel.objects.create(name="eur", price=Money("10", "USD"), discount=Money("2", "EUR"))
+
+        with pytest.raises(CurrencyMismatchException):
+            CompactMoneyModel.objects.update(price=F('price') - F('discount'))
+        self.assertEqual(CompactMoneyModel.objects.get(pk=usd.pk).price, Money("10", "USD"))
+
+        rows = CompactMoneyModel.objects.update(price=F('price') - F('discount'), _check_currency=False)
+        self.assertEqual(rows, 1)
+        self.assertEqual(CompactMoneyModel.objects.get(pk=usd.pk).price, Money("9", "USD"))
+        self.assertEqual(CompactMoneyModel.objects.get(pk=eur.pk).price, Money("10", "USD"))
+
+        with pytest.raises(ValueError):
+            LedgerEntry.objects.update(amount=F('fee'))
+
+
+@pytest.mark.django_db
+class TestJsonLines(TestCase):
+
+    def setUp(self):
+        for i in range(5):
+            SimpleMoneyModel.objects.create(name="item %s" % i, price=Money("%s.25" % i, "USD" if i % 2 else "EUR"))
+            CompactMoneyModel.objects.create(name="item %s" % i, price=Money(i, "JPY"),
+                                             discount=Money("0.5", "USD") if i % 2 else None)
+
+    def dump(self):
+        stream = StringIO()
+        with self.assertNumQueries(3):
+            self.assertEqual(dump_jsonl(SimpleMoneyModel.objects.all(), stream, chunk_size=2), 5)
+        self.assertEqual(dump_jsonl(CompactMoneyModel.objects.all(), stream), 5)
+        stream.seek(0)
+        return stream
+
+    def test_dump(self):
+        lines = self.dump().getvalue().splitlines()
+        self.assertEqual(len(lines), 10)
+
+        data = json.loads(lines[1])
+        self.assertEqual(data["model"], "tests.simplemoneymodel")
+        self.assertEqual(data["fields"]["price"], "1.25")
+        self.assertEqual(data["fields"]["price_currency"], "USD")
+
+        data = json.loads(lines[6])
+        self.assertEqual(data["model"], "tests.compactmoneymodel")
+        self.assertEqual(data["fields"]["discount_minor"], 50)
+        self.assertEqual(data["fields"]["discount_currency"], 840)
+
+    def test_round_trip(self):
+        stream = self.dump()
+        expected = [(o.pk, o.name, o.price) for o in SimpleMoneyModel.objects.order_by('pk')]
+        expected_compact = [(o.pk, o.price, o.discount) for o in CompactMoneyModel.objects.order_by('pk')]
+        SimpleMoneyModel.objects.all().delete()
+        CompactMoneyModel.objects.all().delete()
+
+        # Two batches of SimpleMoneyModel, then the model changes and two more
+        with self.assertNumQueries(4):
+            self.assertEqual(load_jsonl(stream, batch_size=3), 10)
+
+        self.assertEqual([(o.pk, o.name, o.price) for o in SimpleMoneyModel.objects.order_by('pk')], expected)
+        self.assertEqual([(o.pk, o.price, o.discount) for o in CompactMoneyModel.objects.order_by('pk')],
+                         expected_compact)
+
+    def test_unknown_model(self):
+        with pytest.raises(ValueError):
+            load_jsonl(StringIO('{"model": "tests.nosuchmodel", "pk": 1, "fields": {}}\n'))
+
+    def test_commands(self):
+        path = os.path.join(tempfile.mkdtemp(), "dump.jsonl")
+        call_command('dump_jsonl', 'tests.SimpleMoneyModel', output=path, chunk_size=2, stdout=StringIO())
+        SimpleMoneyModel.objects.all().delete()
+
+        call_command('load_jsonl', path, batch_size=2, stdout=StringIO())
+        self.assertEqual(SimpleMoneyModel.objects.count(), 5)
+        self.assertEqual(SimpleMoneyModel.objects.get(name="item 3").price, Money("3.25", "USD"))
+
+
+@pytest.mark.django_db
+class TestMoneyTotals(TestCase):
+
+    def setUp(self):
+        self.a = LedgerEntry.objects.create(account="a", amount=Money("10.5", "USD"), fee=Money("1", "USD"))
+        self.b = LedgerEntry.objects.create(account="b", amount=Money("4", "USD"))
+        self.c = LedgerEntry.objects.create(account="a", amount=Money("7", "EUR"), fee=Money("0.25", "USD"))
+
+    def assertRebuildAgrees(self):
+        totals = [(t.totals(), t.counts(), t.totals(group="a")) for t in (amount_totals, fee_totals)]
+        call_command('rebuild_money_totals', stdout=StringIO())
+        self.assertEqual([(t.totals(), t.counts(), t.totals(group="a")) for t in (amount_totals, fee_totals)],
+                         totals)
+
+    def test_save(self):
+        self.assertEqual(amount_totals.totals(), [Money(7, "EUR"), Money("14.5", "USD")])
+        self.assertEqual(amount_totals.totals(group="a"), [Money(7, "EUR"), Money("10.5", "USD")])
+        self.assertEqual(amount_totals.counts(), {"EUR": 1, "USD": 2})
+        self.assertEqual(fee_totals.totals(), [Money("1.25", "USD")])
+
+        self.a.amount = Money("2", "EUR")
+        self.a.account = "b"
+        self.a.save()
+        self.assertEqual(amount_totals.totals(group="a"), [Money(7, "EUR")])
+        self.assertEqual(amount_totals.totals(group="b"), [Money(2, "EUR"), Money(4, "USD")])
+
+        self.b.amount = None
+        self.b.save()
+        self.assertEqual(amount_totals.totals(), [Money(9, "EUR")])
+        self.assertRebuildAgrees()
+
+    def test_delete(self):
+        self.c.delete()
+        LedgerEntry.objects.filter(account="b").delete()
+        self.assertEqual(amount_totals.totals(), [Money("10.5", "USD")])
+        self.assertEqual(fee_totals.totals(), [Money(1, "USD")])
+        self.assertRebuildAgrees()
+
+    def test_deferred(self):
+        entry = LedgerEntry.objects.only('account').get(pk=self.a.pk)
+        entry.delete()
+        self.assertEqual(amount_totals.totals(group="a"), [Money(7, "EUR")])
+        self.assertEqual(fee_totals.totals(), [Money("0.25", "USD")])
+        self.assertRebuildAgrees()
+
+    def test_save_existing_pk(self):
+        LedgerEntry(pk=self.a.pk, account="a", amount=Money("3", "USD")).save()
+        self.assertEqual(amount_totals.totals(group="a"), [Money(7, "EUR"), Money(3, "USD")])
+        self.assertEqual(amount_totals.counts(), {"EUR": 1, "USD": 2})
+        self.assertEqual(fee_totals.totals(), [Money("0.25", "USD")])
+
+        # A raw save, like loaddata does
+        from django.core.serializers.base import DeserializedObject
+        DeserializedObject(LedgerEntry(pk=self.b.pk, account="b", amount=Money("1", "EUR"))).save()
+        self.assertEqual(amount_totals.totals(group="b"), [Money(1, "EUR")])
+        self.assertEqual(amount_totals.counts(), {"EUR": 2, "USD": 1})
+        self.assertRebuildAgrees()
+
+    def test_bulk_create(self):
+        LedgerEntry.objects.bulk_create([
+            LedgerEntry(account="d", amount=Money(i, "JPY"), fee=Money("0.1", "USD")) for i in range(4)
+        ])
+        self.assertEqual(amount_totals.totals(group="d"), [Money(6, "JPY")])
+        self.assertEqual(fee_totals.totals(), [Money("1.65", "USD")])
+        self.assertRebuildAgrees()
+
+    def test_update(self):
+        LedgerEntry.objects.filter(amount__gt=Money(5, "USD")).update(amount=F('amount') + Money(1, "USD"))
+        self.assertEqual(amount_totals.totals(), [Money(7, "EUR"), Money("15.5", "USD")])
+
+        LedgerEntry.objects.filter(account="a").update(account="b")
+        self.assertEqual(amount_totals.totals(group="a"), [])
+        self.assertEqual(amount_totals.totals(group="b"), [Money(7, "EUR"), Money("15.5", "USD")])
+
+        LedgerEntry.objects.update(fee=Money(2, "EUR"))
+        self.assertEqual(fee_totals.totals(), [Money(6, "EUR")])
+        self.assertRebuildAgrees()
+
+    def test_update_mismatch(self):
+        with pytest.raises(CurrencyMismatchException):
+            LedgerEntry.objects.update(amount=F('amount') + Money(1, "USD"))
+        self.assertEqual(amount_totals.totals(), [Money(7, "EUR"), Money("14.5", "USD")])
+
+    def test_unaffected_update(self):
+        entry = LedgerEntry.objects.create(account="x")
+        with self.assertNumQueries(1):
+            LedgerEntry.objects.filter(pk=entry.pk).update(id=entry.pk)
+
+    def test_register_twice(self):
+        self.assertIs(register_totals(LedgerEntry, 'amount', MoneyTotal, group_by='account'), amount_totals)
+        self.assertEqual(LedgerEntry._money_totals, (amount_totals, fee_totals))
+        with pytest.raises(ValueError):
+            register_totals(LedgerEntry, 'amount', MoneyTotal)
+
+    def test_concurrent_create(self):
+        # The row is created by someone else between the update and the insert
+        rows = amount_totals._rows
+        calls = []
+
+        def missing_rows():
+            calls.append(1)
+            return rows().none() if len(calls) == 1 else rows()
+        amount_totals._rows = missing_rows
+        try:
+            self.b.amount = Money("5", "USD")
+            self.b.save()
+        finally:
+            del amount_totals._rows
+        self.assertEqual(amount_totals.totals(group="b"), [Money(5, "USD")])
+        self.assertRebuildAgrees()
+
+
+@pytest.mark.django_db
+class TestBaseCurrencyColumn(TestCase):
+
+    def setUp(self):
+        BASE_RATES.clear()
+        BASE_RATES.update({'USD': Decimal('0.5'), 'JPY': Decimal('0.01')})
+        RatedMoneyModel.objects.create(name="usd", price=Money(10, "USD"))
+        RatedMoneyModel.objects.create(name="eur", price=Money(6, "EUR"))
+        RatedMoneyModel.objects.create(name="jpy", price=Money(800, "JPY"))
+        RatedMoneyModel.objects.create(name="gbp", price=Money(1, "GBP"))
+        RatedMoneyModel.objects.create(name="none")
+
+    def names(self):
+        return list(RatedMoneyModel.objects.filter(price_base__isnull=False)
+                    .order_by('-price_base').values_list('name', flat=True))
+
+    def test_column(self):
+        field = RatedMoneyModel._meta.get_field('price_base')
+        self.assertTrue(field.db_index)
+        self.assertFalse(field.editable)
+
+    def test_save(self):
+        self.assertEqual(self.names(), ["jpy", "eur", "usd"])
+        self.assertEqual(RatedMoneyModel.objects.get(name="usd").price_base, Decimal(5))
+
+        instance = RatedMoneyModel.objects.get(name="usd")
+        instance.price = Money(20, "USD")
+        instance.save()
+        self.assertEqual(self.names(), ["usd", "jpy", "eur"])
+
+    def test_update(self):
+        RatedMoneyModel.objects.filter(name="eur").update(price=Money(100, "JPY"))
+        self.assertEqual(RatedMoneyModel.objects.get(name="eur").price_base, Decimal(1))
+
+        RatedMoneyModel.objects.filter(name="usd").update(price=F('price') * 2)
+        self.assertEqual(RatedMoneyModel.objects.get(name="usd").price_base, Decimal(10))
+
+    def test_update_amount(self):
+        RatedMoneyModel.objects.filter(name="usd").update(price=Decimal(30))
+        self.assertEqual(RatedMoneyModel.objects.get(name="usd").price_base, Decimal(15))
+        RatedMoneyModel.objects.filter(name="jpy").update(price=100)
+        self.assertEqual(RatedMoneyModel.objects.get(name="jpy").price_base, Decimal(1))
+
+    def test_update_currency(self):
+        RatedMoneyModel.objects.filter(name="eur").update(price_currency="USD")
+        instance = RatedMoneyModel.objects.get(name="eur")
+        self.assertEqual((instance.price, instance.price_base), (Money(6, "USD"), Decimal(3)))
+        RatedMoneyModel.objects.filter(name="usd").update(price_currency="GBP")
+        self.assertEqual(RatedMoneyModel.objects.get(name="usd").price_base, None)
+
+    def test_rerate(self):
+        BASE_RATES.update({'USD': Decimal('2'), 'GBP': Decimal('1.2')})
+        # A SELECT of primary keys and an UPDATE per chunk
+        with self.assertNumQueries(6):
+            self.assertEqual(RatedMoneyModel.objects.rerate('price', chunk_size=2), 5)
+        self.assertEqual(self.names(), ["usd", "jpy", "eur", "gbp"])
+
+        call_command('rerate_money_fields', 'tests.RatedMoneyModel', stdout=StringIO())
+        self.assertEqual(RatedMoneyModel.objects.get(name="gbp").price_base, Decimal('1.2'))
+
+        with pytest.raises(ValueError):
+            SimpleMoneyModel.objects.rerate('price')
+
+
+@pytest.mark.django_db
+class TestQLookups(TestCase):
+
+    def setUp(self):
+        self.usd = SimpleMoneyModel.objects.create(name="usd", price=Money(1, "USD"))
+        self.eur = SimpleMoneyModel.objects.create(name="eur", price=Money(1, "EUR"))
+        self.jpy = SimpleMoneyModel.objects.create(name="jpy", price=Money(5, "JPY"))
+        self.compact = CompactMoneyModel.objects.create(name="compact", price=Money(1, "USD"))
+        RelatedMoneyModel.objects.create(item=self.usd, fee=Money(2, "USD"), compact_item=self.compact)
+        RelatedMoneyModel.objects.create(item=self.eur, fee=Money(2, "EUR"))
+
+    def names(self, queryset):
+        return sorted(queryset.values_list('name', flat=True))
+
+    def test_q(self):
+        self.assertEqual(self.names(SimpleMoneyModel.objects.filter(Q(price=Money(1, "USD")))), ["usd"])
+        self.assertEqual(self.names(SimpleMoneyModel.objects.filter(
+            Q(price=Money(1, "EUR")) | Q(price__gt=Money(2, "JPY")))), ["eur", "jpy"])
+        self.assertEqual(self.names(SimpleMoneyModel.objects.filter(~Q(price=Money(1, "USD")))), ["eur", "jpy"])
+        self.assertEqual(self.names(SimpleMoneyModel.objects.exclude(
+            Q(name="jpy") | Q(price=Money(1, "EUR")))), ["usd"])
+        self.assertEqual(SimpleMoneyModel.objects.get(Q(price=Money(1, "EUR"))), self.eur)
+
+    def test_q_in(self):
+        q = Q(price__in=[Money(1, "USD"), Money(5, "JPY")]) | Q(name="eur")
+        self.assertEqual(self.names(SimpleMoneyModel.objects.filter(q)), ["eur", "jpy", "usd"])
+        q = Q(price__in=[Money(1, "USD"), Money(5, "JPY")]) & Q(price__lt=Money(2, "USD"))
+        self.assertEqual(self.names(SimpleMoneyModel.objects.filter(q)), ["usd"])
+
+    def test_complex_filter(self):
+        self.assertEqual(self.names(SimpleMoneyModel.objects.complex_filter(Q(price=Money(1, "USD")))), ["usd"])
+        self.assertEqual(self.names(SimpleMoneyModel.objects.complex_filter({'price': Money(1, "EUR")})),
+                         ["eur"])
+
+    def test_compact_q(self):
+        self.assertEqual(self.names(CompactMoneyModel.objects.filter(Q(price=Money(1, "USD")))), ["compact"])
+        self.assertEqual(self.names(CompactMoneyModel.objects.filter(Q(price=Money(1, "EUR")))), [])
+
+    def test_relations(self):
+        related = RelatedMoneyModel.objects.filter(item__price=Money(1, "EUR"))
+        self.assertEqual([r.item for r in related], [self.eur])
+        related = RelatedMoneyModel.objects.filter(Q(item__price__gte=Money(1, "USD")))
+        self.assertEqual([r.item for r in related], [self.usd])
+        related = RelatedMoneyModel.objects.filter(compact_item__price=Money(1, "USD"))
+        self.assertEqual([r.item for r in related], [self.usd])
+
+        # Reverse relations
+        self.assertEqual(self.names(SimpleMoneyModel.objects.filter(related__fee=Money(2, "EUR"))), ["eur"])
+        self.assertEqual(self.names(SimpleMoneyModel.objects.filter(
+            related__fee__in=[Money(2, "EUR"), Money(2, "USD")])), ["eur", "usd"])
+
+
+@pytest.mark.django_db
+class TestRewriteCurrency(TestCase):
+
+    def setUp(self):
+        for i in range(7):
+            SimpleMoneyModel.objects.create(name="item %s" % i, price=Money("%s.10" % i, "USD" if i % 2 else "EUR"))
+            CompactMoneyModel.objects.create(name="item %s" % i, price=Money("%s.25" % i, "USD"))
+
+    def rewrite(self, label, **options):
+        options.setdefault('stdout', StringIO())
+        call_command('rewrite_money_currency', label, **options)
+
+    def prices(self, model=SimpleMoneyModel):
+        return [o.price for o in model.objects.order_by('pk')]
+
+    def test_rewrite(self):
+        output = StringIO()
+        self.rewrite('tests.SimpleMoneyModel.price', from_currency='USD', to_currency='GBP',
+                     rate='0.5', batch_size=2, verbosity=2, stdout=output)
+        self.assertEqual(output.getvalue().count("Rewrote rows up to pk"), 4)
+        self.assertEqual(self.prices(), [
+            Money("0.10", "EUR"), Money("0.55", "GBP"), Money("2.10", "EUR"), Money("1.55", "GBP"),
+            Money("4.10", "EUR"), Money("2.55", "GBP"), Money("6.10", "EUR"),
+        ])
+
+    def test_rerate_same_currency(self):
+        self.rewrite('tests.SimpleMoneyModel.price', from_currency='EUR', rate='2', batch_size=3)
+        self.assertEqual(self.prices()[:2], [Money("0.20", "EUR"), Money("1.10", "USD")])
+
+    def test_compact(self):
+        self.rewrite('tests.CompactMoneyModel.price', from_currency='USD', to_currency='JPY', rate='100')
+        self.assertEqual(self.prices(CompactMoneyModel)[:3], [Money(25, "JPY"), Money(125, "JPY"), Money(225, "JPY")])
+
+    def test_resume(self):
+        command = RewriteCommand()
+        pks = list(SimpleMoneyModel.objects.order_by('pk').values_list('pk', flat=True))
+        state = {'label': 'tests.SimpleMoneyModel.price', 'from': 'EUR', 'to': 'EUR', 'rate': '2',
+                 'last_pk': pks[3], 'done': False}
+        command.load_checkpoint('eur', state, 'default')
+        command.save_checkpoint('eur', state, 'default')
+        checkpoint = 'eur'
+
+        self.rewrite('tests.SimpleMoneyModel.price', from_currency='EUR', rate='2', checkpoint=checkpoint)
+        self.assertEqual(self.prices()[::2], [Money("0.10", "EUR"), Money("2.10", "EUR"),
+                                              Money("8.20", "EUR"), Money("12.20", "EUR")])
+        self.assertTrue(command.read_checkpoint(checkpoint, 'default')['done'])
+
+        # Running again does not apply the rate twice
+        self.rewrite('tests.SimpleMoneyModel.price', from_currency='EUR', rate='2', checkpoint=checkpoint)
+        self.assertEqual(self.prices()[-1], Money("12.20", "EUR"))
+
+        with pytest.raises(CommandError):
+            self.rewrite('tests.SimpleMoneyModel.price', from_currency='EUR', rate='3', checkpoint=checkpoint)
+
+    def test_checkpoint_in_batch_transaction(self):
+        # A batch failing after its update leaves neither rows nor checkpoint changed
+        command = RewriteCommand()
+        save_checkpoint = command.save_checkpoint
+
+        def crash(name, state, using):
+            save_checkpoint(name, state, using)
+            if state['last_pk'] is not None and not state['done']:
+                raise RuntimeError("crash")
+        command.save_checkpoint = crash
+        options = dict((option.dest, option.default) for option in command.option_list)
+        options.update(from_currency='EUR', rate='2', batch_size=3, checkpoint='crash', stdout=StringIO())
+        with pytest.raises(RuntimeError):
+            command.execute('tests.SimpleMoneyModel.price', **options)
+        self.assertEqual(self.prices()[0], Money("0.10", "EUR"))
+        self.assertIsNone(command.read_checkpoint('crash', 'default'))
+
+        self.rewrite('tests.SimpleMoneyModel.price', from_currency='EUR', rate='2', batch_size=3,
+                     checkpoint='crash')
+        self.assertEqual(self.prices()[::2], [Money("0.20", "EUR"), Money("4.20", "EUR"),
+                                              Money("8.20", "EUR"), Money("12.20", "EUR")])
+
+    def test_rounded_to_new_currency(self):
+        self.rewrite('tests.SimpleMoneyModel.price', from_currency='USD', to_currency='JPY', rate='100.5')
+        self.assertEqual(self.prices()[1], Money("111", "JPY"))
+
+    def test_base_and_totals(self):
+        BASE_RATES.clear()
+        BASE_RATES.update({'USD': Decimal('0.5'), 'GBP': Decimal('2')})
+        instance = RatedMoneyModel.objects.create(name="usd", price=Money(10, "USD"))
+        self.rewrite('tests.RatedMoneyModel.price', from_currency='USD', to_currency='GBP', rate='0.2')
+        self.assertEqual(RatedMoneyModel.objects.get(pk=instance.pk).price_base, Decimal(4))
+
+        LedgerEntry.objects.create(account="a", amount=Money(10, "USD"))
+        self.rewrite('tests.LedgerEntry.amount', from_currency='USD', to_currency='GBP', rate='0.8')
+        self.assertEqual(amount_totals.totals(), [Money(8, "GBP")])
+
+    def test_errors(self):
+        with pytest.raises(CommandError):
+            self.rewrite('tests.SimpleMoneyModel.name', from_currency='USD', to_currency='EUR')
+        with pytest.raises(CommandError):
+            self.rewrite('tests.SimpleMoneyModel.price', from_currency='USD')
+
+
+@pytest.mark.django_db
+class TestCurrencySharding(TestCase):
+
+    multi_db = True
+
+    def setUp(self):
+        for name, amount in [("a", Money(1, "USD")), ("b", Money(2, "EUR")), ("c", Money(3, "CAD")),
+                             ("d", Money(4, "JPY")), ("e", Money(5, "EUR"))]:
+            ShardedMoneyModel.objects.create(name=name, amount=amount)
+
+    def shard_names(self, alias):
+        return sorted(ShardedMoneyModel.objects.using(alias).values_list('name', flat=True))
+
+    def test_writes_are_routed(self):
+        self.assertEqual(self.shard_names('us'), ["a", "c"])
+        self.assertEqual(self.shard_names('eu'), ["b", "e"])
+        self.assertEqual(self.shard_names('default'), ["d"])
+
+        instance = ShardedMoneyModel.objects.get(name="b")
+        self.assertEqual(instance._state.db, 'eu')
+        instance.name = "bb"
+        instance.save()
+        self.assertEqual(self.shard_names('eu'), ["bb", "e"])
+        instance.delete()
+        self.assertEqual(self.shard_names('eu'), ["e"])
+
+        ShardedMoneyModel.objects.bulk_create([ShardedMoneyModel(name="f", amount=Money(6, "USD")),
+                                               ShardedMoneyModel(name="g", amount=Money(7, "EUR"))])
+        self.assertEqual(self.shard_names('us'), ["a", "c", "f"])
+        self.assertEqual(self.shard_names('eu'), ["e", "g"])
+
+    def test_filter_is_routed(self):
+        queryset = ShardedMoneyModel.objects.filter(amount__gte=Money(1, "EUR"))
+        self.assertEqual(queryset.db, 'eu')
+        with self.assertNumQueries(1, using='eu'):
+            self.assertEqual([o.name for o in queryset], ["b", "e"])
+
+        self.assertEqual(ShardedMoneyModel.objects.filter(amount_currency='CAD').db, 'us')
+        self.assertEqual(ShardedMoneyModel.objects.get(amount=Money(4, "JPY")).name, "d")
+
+    def test_fan_out(self):
+        self.assertEqual([o.name for o in ShardedMoneyModel.objects.all()], ["a", "b", "c", "d", "e"])
+        self.assertEqual([o.name for o in ShardedMoneyModel.objects.order_by('-amount')[1:3]], ["d", "c"])
+        self.assertEqual(list(ShardedMoneyModel.objects.values_list('name', flat=True)), ["a", "b", "c", "d", "e"])
+        self.assertEqual([row['name'] for row in ShardedMoneyModel.objects.values('name').order_by('-name')],
+                         ["e", "d", "c", "b", "a"])
+        self.assertEqual(ShardedMoneyModel.objects.count(), 5)
+        self.assertEqual(ShardedMoneyModel.objects.filter(name__in=["a", "b"]).count(), 2)
+        self.assertTrue(ShardedMoneyModel.objects.filter(name="d").exists())
+        self.assertEqual(ShardedMoneyModel.objects.get(name="c").amount, Money(3, "CAD"))
+
+    def test_currency_change(self):
+        instance = ShardedMoneyModel.objects.get(name="b")
+        instance.amount = Money(2, "USD")
+        with pytest.raises(ValueError):
+            instance.save()
+        self.assertEqual(self.shard_names('eu'), ["b", "e"])
+        self.assertEqual(self.shard_names('us'), ["a", "c"])
+        self.assertEqual(ShardedMoneyModel.objects.count(), 5)
+
+        # Currencies of the same database are fine
+        instance = ShardedMoneyModel.objects.get(name="a")
+        instance.amount = Money(1, "CAD")
+        instance.save()
+        self.assertEqual(ShardedMoneyModel.objects.using('us').get(name="a").amount, Money(1, "CAD"))
+        self.assertEqual(ShardedMoneyModel.objects.count(), 5)
+
+    def test_currency_change_by_update(self):
+        with pytest.raises(ValueError):
+            ShardedMoneyModel.objects.filter(name="b").update(amount=Money(2, "USD"))
+        with pytest.raises(ValueError):
+            ShardedMoneyModel.objects.using('eu').update(amount_currency="USD")
+        self.assertEqual(ShardedMoneyModel.objects.using('us').update(amount=Money(9, "CAD")), 2)
+        self.assertEqual(self.shard_names('us'), ["a", "c"])
+
+    def test_rewrite_currency(self):
+        with pytest.raises(CommandError):
+            call_command('rewrite_money_currency', 'tests.ShardedMoneyModel.amount',
+                         from_currency='EUR', to_currency='USD', stdout=StringIO())
+        self.assertEqual(self.shard_names('eu'), ["b", "e"])
+
+        call_command('rewrite_money_currency', 'tests.ShardedMoneyModel.amount',
+                     from_currency='USD', to_currency='CAD', stdout=StringIO())
+        self.assertEqual(ShardedMoneyModel.objects.using('us').get(name="a").amount, Money(1, "CAD"))
+
+    def test_fan_out_aggregate_and_update(self):
+        self.assertEqual(ShardedMoneyModel.objects.aggregate(Count('id'), top=Max('amount')),
+                         {'id__count': 5, 'top': 5})
+        with pytest.raises(TypeError):
+            ShardedMoneyModel.objects.aggregate(Avg('amount'))
+
+        self.assertEqual(ShardedMoneyModel.objects.filter(name__in=["a", "b"]).update(name="x"), 2)
+        self.assertEqual(ShardedMoneyModel.objects.filter(name="x").count(), 2)
+        ShardedMoneyModel.objects.filter(name="x").delete()
+        self.assertEqual(ShardedMoneyModel.objects.count(), 3)
+
+    def test_pk_lookups(self):
+        # Each shard numbers its rows from 1
+        pk = ShardedMoneyModel.objects.using('us').get(name="a").pk
+        self.assertEqual(ShardedMoneyModel.objects.get(pk=pk, amount_currency="USD").name, "a")
+        self.assertEqual(ShardedMoneyModel.objects.using('us').get(pk=pk).name, "a")
+        for lookup in [lambda qs: qs.get(pk=pk), lambda qs: qs.filter(id__in=[pk]),
+                       lambda qs: qs.filter(Q(name="a") | Q(pk=pk)), lambda qs: qs.exclude(pk=pk),
+                       lambda qs: qs.in_bulk([pk])]:
+            with pytest.raises(ValueError):
+                lookup(ShardedMoneyModel.objects)
+
+    def test_unmerged_ordering(self):
+        pks = list(ShardedMoneyModel.objects.values_list('pk', flat=True).order_by('-pk'))
+        self.assertEqual(pks, sorted(pks, reverse=True))
+        for queryset in [ShardedMoneyModel.objects.values_list('amount', flat=True),
+                         ShardedMoneyModel.objects.values('name').order_by('amount'),
+                         ShardedMoneyModel.objects.order_by('?')]:
+            with pytest.raises(ValueError):
+                list(queryset)
+        self.assertEqual(sorted(ShardedMoneyModel.objects.values_list('amount', flat=True).order_by()),
+                         [1, 2, 3, 4, 5])
+
+    def test_unmerged_aggregates(self):
+        ShardedMoneyModel.objects.create(name="a", amount=Money(6, "EUR"))
+        self.assertEqual(ShardedMoneyModel.objects.aggregate(Count('name')), {'name__count': 6})
+        with pytest.raises(TypeError):
+            ShardedMoneyModel.objects.aggregate(Count('name', distinct=True))
+        with pytest.raises(TypeError):
+            ShardedMoneyModel.objects.all()[:2].aggregate(Max('amount'))
+
+    def test_shard_check_is_connected_to_sharded_models(self):
+        from django.db.models.signals import pre_save
+        from money.contrib.django.routers import _check_shard
+        receivers = pre_save._live_receivers
+        self.assertIn(_check_shard, receivers(ShardedMoneyModel))
+        self.assertNotIn(_check_shard, receivers(SimpleMoneyModel))
+        # Including the classes of deferred instances
+        instance = ShardedMoneyModel.objects.defer('name').get(name="b")
+        instance.amount = Money(2, "USD")
+        with pytest.raises(ValueError):
+            instance.save()
+
+    def test_other_models_stay_in_default(self):
+        from django.db import router
+        self.assertFalse(router.allow_syncdb('us', SimpleMoneyModel))
+        self.assertTrue(router.allow_syncdb('default', SimpleMoneyModel))
+        self.assertTrue(router.allow_syncdb('us', ShardedMoneyModel))
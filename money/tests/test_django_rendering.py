@@ -96,3 +96,81 @@ class TestEditView(TestCase):
 
         self.assertContains(response, '|item:name|value:ABC|')
         self.assertContains(response, '|item:price|value:JPY 555.5|')
+
+
+class TestCachedCurrencyChoices(TestCase):
+
+    def test_choices_are_cached(self):
+        from money.contrib.django.forms.fields import currency_choices
+        self.assertIs(currency_choices(), currency_choices())
+
+    def test_choices_follow_registry(self):
+        from money import CURRENCY, Currency
+        from money.contrib.django.forms.fields import currency_choices
+        choices = currency_choices()
+        CURRENCY['ZZZ'] = Currency(code='ZZZ', numeric='000', name='Test Currency')
+        try:
+            self.assertIn(('ZZZ', u'ZZZ - Test Currency'), currency_choices())
+        finally:
+            del CURRENCY['ZZZ']
+        self.assertEqual(currency_choices(), choices)
+
+    def test_cached_widget_renders_the_same(self):
+        class CachedForm(forms.Form):
+            price = MoneyField(cache_widget=True)
+
+        for initial in [Money('1.5', 'JPY'), Money('2', 'USD'), None]:
+            expected = TestForm(initial={'price': initial}, prefix='a').as_p()
+            self.assertEqual(CachedForm(initial={'price': initial}, prefix='a').as_p(), expected)
+            # Second rendering comes from the cache
+            self.assertEqual(CachedForm(initial={'price': initial}, prefix='a').as_p(), expected)
+
+
+class TestMoneyTemplateTags(TestCase):
+
+    def render(self, source, **context):
+        from django.template import Template, Context
+        return Template("{% load money_tags %}" + source).render(Context(context))
+
+    def test_money_format(self):
+        price = Money('1234.5', 'USD')
+        self.assertEqual(self.render("{{ price|money_format }}", price=price), u'$1234.50')
+        self.assertEqual(self.render("{{ price|money_format:'grouped' }}", price=price), u'$1,234.50')
+        self.assertEqual(self.render("{{ price|money_format:'code,grouped' }}", price=price), u'USD 1,234.50')
+        self.assertEqual(self.render("{{ price|money_amount }}", price=price), u'1234.50')
+        self.assertEqual(self.render("{{ price|money_symbol }}", price=price), u'$')
+
+    def test_non_money_values_pass_through(self):
+        self.assertEqual(self.render("{{ price|money_format }}", price=None), u'None')
+
+    def test_money_format_list(self):
+        prices = [Money('1', 'USD'), Money('2', 'JPY')]
+        output = self.render("{% for p in prices|money_format_list %}[{{ p }}]{% endfor %}", prices=prices)
+        self.assertEqual(output, u'[$1.00][\xa52]')
+
+
+class TestMoneyInstrumentationMiddleware(TestCase):
+
+    def test_header(self):
+        middleware = ('money.contrib.django.middleware.MoneyInstrumentationMiddleware',)
+        with self.settings(MIDDLEWARE_CLASSES=middleware, MONEY_INSTRUMENTATION_HEADER=True):
+            response = Client().get('/model-view/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('construct=', response['X-Money-Stats'])
+        self.assertIn('proxy_read=1 ', response['X-Money-Stats'])
+        self.assertIn('proxy_write=', response['X-Money-Stats'])
+
+    def test_no_header_by_default(self):
+        middleware = ('money.contrib.django.middleware.MoneyInstrumentationMiddleware',)
+        with self.settings(MIDDLEWARE_CLASSES=middleware):
+            response = Client().get('/model-view/')
+        self.assertFalse(response.has_header('X-Money-Stats'))
+
+    def test_view_error(self):
+        from money import instrumentation
+        middleware = ('money.contrib.django.middleware.MoneyInstrumentationMiddleware',)
+        with self.settings(MIDDLEWARE_CLASSES=middleware, DEBUG_PROPAGATE_EXCEPTIONS=True):
+            with pytest.raises(ValueError):
+                Client().get('/error-view/')
+        self.assertEqual(instrumentation._local.stack, [])
+        self.assertEqual(instrumentation._active[0], 0)
@@ -0,0 +1,68 @@
+from __future__ import division
+
+from decimal import Decimal
+
+import pytest
+
+from money import Money, CurrencyMismatchException, InvalidOperationException, money_context
+from money import expr, var
+
+
+def test_formula():
+    price = var('price', 'USD')
+    total = (price * var('qty') - var('discount', 'USD')) * (1 + var('tax')) / var('n')
+    assert total.currency.code == 'USD'
+    assert total.variables() == set(['price', 'qty', 'discount', 'tax', 'n'])
+
+    formula = total.compile()
+    row = dict(price=Money('9.99', 'USD'), qty=3, discount=Decimal('1.50'), tax='0.2', n=2)
+    expected = (Money('9.99', 'USD') * 3 - Money('1.50', 'USD')) * Decimal('1.2') / 2
+    assert formula(row) == expected
+    assert formula(**row) == expected
+    assert total.evaluate(**row) == expected
+
+    rows = [dict(row, qty=qty) for qty in range(5)]
+    assert list(formula.map(rows)) == [formula(r) for r in rows]
+
+
+def test_constants_and_numbers():
+    assert (expr(Money('10', 'USD')) / 3).evaluate() == Money(10, 'USD') / 3
+    assert (-expr(Money('10', 'USD')) + 4).evaluate() == Money(-6, 'USD')
+    assert (var('a') * 2 + Decimal('0.5')).evaluate(a=1) == Decimal('2.5')
+    assert (2 * expr(Money('1.5', 'EUR'))).evaluate() == Money(3, 'EUR')
+
+
+def test_single_final_rounding():
+    formula = (var('price', 'USD') / 3 * 3).compile()
+    assert formula(price=Money(10, 'USD')) == Money(10, 'USD') / 3 * 3
+    with money_context(extra_places=0):
+        formula = (var('price', 'USD') / 3).compile()
+        assert formula(price=Money(10, 'USD')).amount == Decimal('3.33')
+        assert ((var('price', 'USD') / 3) * 3).compile()(price=Money(10, 'USD')).amount == Decimal('10.00')
+
+
+def test_currency_checked_when_building():
+    with pytest.raises(CurrencyMismatchException):
+        var('a', 'USD') + var('b', 'EUR')
+    with pytest.raises(CurrencyMismatchException):
+        expr(Money(1, 'USD')) - Money(1, 'EUR')
+    with pytest.raises(InvalidOperationException):
+        var('a', 'USD') * var('b', 'USD')
+    with pytest.raises(InvalidOperationException):
+        var('a', 'USD') / expr(Money(1, 'USD'))
+    with pytest.raises(InvalidOperationException):
+        1 / var('a', 'USD')
+    with pytest.raises(TypeError):
+        1 - var('a', 'USD')
+    with pytest.raises(TypeError):
+        var('a') + 'x'
+
+
+def test_values_checked_when_evaluating():
+    formula = (var('price', 'USD') * var('qty')).compile()
+    with pytest.raises(CurrencyMismatchException):
+        formula(price=Money(1, 'EUR'), qty=1)
+    with pytest.raises(InvalidOperationException):
+        formula(price=Money(1, 'USD'), qty=Money(1, 'USD'))
+    with pytest.raises(KeyError):
+        formula(price=Money(1, 'USD'))
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from decimal import Decimal
+
+import pytest
+
+from money import Money, CURRENCY
+from money.formatting import MoneyFormat, get_format, format_money, format_money_list
+
+
+def test_format_symbol():
+    assert format_money(Money('1234.5', 'USD')) == u'$1,234.50'
+    assert format_money(Money('1234.5', 'EUR')) == u'€1,234.50'
+
+
+def test_format_code():
+    assert format_money(Money('1234.5', 'USD'), symbol=False) == u'USD 1,234.50'
+    # Currencies without a symbol always use the code
+    assert format_money(Money('12', 'AED')) == u'AED 12.00'
+
+
+def test_format_currency_decimals():
+    assert format_money(Money('1234.5', 'JPY')) == u'¥1,235'
+    assert format_money(Money('1.2345', 'BHD')) == u'BHD 1.235'
+    assert format_money(Money('0.005', 'USD')) == u'$0.01'
+    assert format_money(Money('0.005', 'USD'), decimals=3) == u'$0.005'
+
+
+def test_format_negative():
+    assert format_money(Money('-1234567.891', 'USD')) == u'-$1,234,567.89'
+    assert format_money(Money('-0.001', 'USD')) == u'$0.00'
+
+
+def test_format_separators():
+    fmt = MoneyFormat(CURRENCY['EUR'], decimal_sep=u',', thousand_sep=u'.')
+    assert fmt.format(Decimal('1234567.5')) == u'€1.234.567,50'
+    assert fmt.format_amount(Decimal('999')) == u'999,00'
+
+    fmt = MoneyFormat(CURRENCY['EUR'], grouping=0)
+    assert fmt.format(Decimal('1234567.5')) == u'€1234567.50'
+
+
+def test_formats_are_cached():
+    assert get_format(CURRENCY['USD']) is get_format(CURRENCY['USD'])
+    assert get_format(CURRENCY['USD']) is not get_format(CURRENCY['USD'], symbol=False)
+
+
+def test_format_list():
+    values = [Money('1', 'USD'), None, Money('1000', 'JPY'), Money('2.5', 'USD')]
+    assert format_money_list(values) == [u'$1.00', u'', u'¥1,000', u'$2.50']
+
+
+def test_str_is_cached():
+    money = Money('1234.5', 'USD')
+    assert str(money) == 'USD 1234.5'
+    assert str(money) is str(money)
+    assert unicode(money) == u'USD 1234.5'
+    assert repr(money) == 'USD 1234.5'
+
+
+def test_format_spec():
+    money = Money('1234.5', 'USD')
+    assert format(money, '') == 'USD 1234.5'
+    assert format(money, ',') == 'USD 1,234.50'
+    assert format(money, ',.2f') == 'USD 1,234.50'
+    assert format(money, '.3') == 'USD 1234.500'
+    assert format(money, '$,') == '$1,234.50'
+    assert format(money, '$,.0f') == '$1,235'
+    assert format(money, 'n,') == '1,234.50'
+    assert format(Money('1234.5', 'JPY'), 'c,') == 'JPY 1,235'
+
+
+def test_format_spec_sign_and_alignment():
+    assert format(Money('-5', 'EUR'), 'n>10') == '     -5.00'
+    assert format(Money('-5', 'EUR'), '$') == u'-€5.00'.encode('utf-8')
+    assert format(Money('5', 'EUR'), '+') == '+EUR 5.00'
+    assert format(Money('5', 'EUR'), 'n*<8') == '5.00****'
+    assert format(Money('5', 'EUR'), 'n^8') == '  5.00  '
+    assert format(Money('5', 'EUR'), '8') == 'EUR 5.00'
+
+
+def test_format_spec_in_templates():
+    money = Money('1234.5', 'EUR')
+    assert u'Total: {:$,}'.format(money) == u'Total: €1,234.50'
+    assert 'Total: {:,}'.format(money) == 'Total: EUR 1,234.50'
+    assert u'{}'.format(money) == u'EUR 1234.5'
+
+
+def test_format_spec_invalid():
+    with pytest.raises(ValueError):
+        format(Money('1', 'USD'), 'e')
+    with pytest.raises(ValueError):
+        format(Money('1', 'USD'), '010')
@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+
+from money import Money, CURRENCY, CurrencyMismatchException
+from money import instrumentation
+from money.instrumentation import collect
+
+
+def test_counts():
+    with collect() as stats:
+        a = Money('1.50', 'USD')
+        b = Money('USD 2.50')
+        a + b
+    assert stats.counts['construct'] == 3
+    assert stats.counts['parse'] == 1
+    assert stats.counts['currency_check'] == 1
+    assert stats.counts['currency_lookup'] >= 2
+    assert 'currency_mismatch' not in stats.counts
+    assert all(seconds >= 0 for seconds in stats.seconds.values())
+
+
+def test_mismatch():
+    with collect() as stats:
+        with pytest.raises(CurrencyMismatchException):
+            Money(1, 'USD') + Money(1, 'EUR')
+    assert stats.counts['currency_check'] == 1
+    assert stats.counts['currency_mismatch'] == 1
+
+
+def test_nested():
+    with collect() as outer:
+        Money(1, 'USD')
+        with collect() as inner:
+            Money(2, 'USD')
+    assert outer.counts['construct'] == 2
+    assert inner.counts['construct'] == 1
+
+
+def test_restored_when_disabled():
+    init = Money.__dict__['__init__']
+    from_string = Money.__dict__['_from_string']
+    with collect():
+        assert Money.__dict__['__init__'] is not init
+        assert '__getitem__' in type(CURRENCY).__dict__
+    assert Money.__dict__['__init__'] is init
+    assert Money.__dict__['_from_string'] is from_string
+    assert '__getitem__' not in type(CURRENCY).__dict__
+    assert Money.from_string('JPY 5') == Money(5, 'JPY')
+
+
+def test_other_threads_not_counted():
+    def work():
+        for _ in range(10):
+            Money(1, 'USD')
+
+    with collect() as stats:
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+    assert 'construct' not in stats.counts
+
+
+def test_summary():
+    with collect() as stats:
+        Money(1, 'USD')
+    assert stats.summary().startswith('construct=1 (')
+    assert stats.as_dict()['construct']['count'] == 1
+    assert instrumentation._active == [0]
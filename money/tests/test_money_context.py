@@ -0,0 +1,76 @@
+from __future__ import division
+
+import decimal
+import threading
+from decimal import Decimal, ROUND_DOWN
+
+import pytest
+
+from money import Money, MoneyContext, money_context, get_money_context, set_default_money_context
+
+
+def test_default_keeps_full_precision():
+    assert (Money(10, 'USD') / 3).amount == Decimal('3.333333333333333333333333333')
+    assert (Money('1.25', 'USD') * Decimal('0.3')).amount == Decimal('0.375')
+
+
+def test_default_ignores_the_thread_decimal_context():
+    with decimal.localcontext() as ctx:
+        ctx.prec = 5
+        assert (Money(10, 'USD') / 3).amount == Decimal('3.333333333333333333333333333')
+
+
+def test_extra_places():
+    with money_context(extra_places=2):
+        assert (Money(10, 'USD') / 3).amount == Decimal('3.3333')
+        assert (Money(10, 'JPY') / 3).amount == Decimal('3.33')
+        assert (Money(10, 'BHD') / 3).amount == Decimal('3.33333')
+        assert (Money('1.25', 'USD') * Decimal('0.3')).amount == Decimal('0.3750')
+    assert (Money(10, 'USD') / 3).amount == Decimal('3.333333333333333333333333333')
+
+
+def test_places_and_rounding():
+    context = MoneyContext(rounding=ROUND_DOWN, extra_places=0, places={'USD': 3})
+    assert context.places_for(Money(0, 'USD').currency) == 3
+    assert context.places_for(Money(0, 'EUR').currency) == 2
+    with money_context(context):
+        assert (Money(2, 'USD') / 3).amount == Decimal('0.666')
+        assert (Money(2, 'EUR') / 3).amount == Decimal('0.66')
+        assert Money(100, 'EUR') / 4 == Money(25, 'EUR')
+
+
+def test_nesting():
+    with money_context(extra_places=0) as outer:
+        with money_context(extra_places=4) as inner:
+            assert get_money_context() is inner
+        assert get_money_context() is outer
+        assert (Money(10, 'USD') / 3).amount == Decimal('3.33')
+
+
+def test_traps():
+    with pytest.raises(decimal.DivisionByZero):
+        Money(10, 'USD') / 0
+    with money_context(extra_places=2, traps=[]):
+        assert (Money(10, 'USD') / 0).amount == Decimal('Infinity')
+
+
+def test_set_default():
+    try:
+        set_default_money_context(MoneyContext(extra_places=1))
+        assert (Money(10, 'USD') / 3).amount == Decimal('3.333')
+    finally:
+        set_default_money_context(MoneyContext())
+
+
+def test_threads_are_independent():
+    results = []
+
+    def divide():
+        results.append((Money(10, 'USD') / 3).amount)
+
+    with money_context(extra_places=0):
+        thread = threading.Thread(target=divide)
+        thread.start()
+        thread.join()
+        assert (Money(10, 'USD') / 3).amount == Decimal('3.33')
+    assert results == [Decimal('3.333333333333333333333333333')]
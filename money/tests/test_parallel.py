@@ -0,0 +1,54 @@
+import random
+from decimal import Decimal
+
+from money import Money
+from money.parallel import parallel_sum, sum_by_currency
+
+
+def make_values(count=2000):
+    rnd = random.Random(1)
+    currencies = ['USD', 'EUR', 'JPY', 'BHD']
+    values = []
+    for i in range(count):
+        amount = Decimal(rnd.randint(-10 ** 6, 10 ** 6)).scaleb(-rnd.randint(0, 4))
+        values.append(Money(amount, currencies[i % 4]))
+    return values
+
+
+def test_sum_by_currency_is_exact():
+    values = [Money('0.1', 'USD'), Money('0.20', 'USD'), Money('1E+30', 'USD'), Money('-1E+30', 'USD'),
+              Money('1E-20', 'EUR'), None]
+    totals = sum_by_currency(values)
+    assert sorted(totals) == ['EUR', 'USD']
+    assert totals['USD'].amount == Decimal('0.30')
+    assert str(totals['USD'].amount) == '0.30'
+    assert totals['EUR'] == Money('1E-20', 'EUR')
+    assert sum_by_currency([]) == {}
+
+
+def test_matches_serial_sum_whatever_the_chunking():
+    values = make_values()
+    expected = sum_by_currency(values)
+    for chunk_size in (1, 7, 500, 5000):
+        result = parallel_sum(iter(values), workers=1, chunk_size=chunk_size)
+        assert dict((code, str(money)) for code, money in result.items()) == \
+            dict((code, str(money)) for code, money in expected.items())
+
+    result = parallel_sum(values, workers=3, chunk_size=97)
+    assert dict((code, str(money)) for code, money in result.items()) == \
+        dict((code, str(money)) for code, money in expected.items())
+
+
+def test_files(tmpdir):
+    values = make_values(1000)
+    first, second = tmpdir.join('a.txt'), tmpdir.join('b.txt')
+    first.write("\n".join(str(money) for money in values[:600]) + "\n")
+    second.write("\n".join(str(money) for money in values[600:]))
+    tmpdir.join('empty.txt').write("")
+    paths = [str(first), str(second), str(tmpdir.join('empty.txt'))]
+
+    expected = sum_by_currency(values)
+    for chunk_bytes in (1, 10, 333, 10 ** 6):
+        assert parallel_sum(paths, workers=1, chunk_bytes=chunk_bytes) == expected
+    assert parallel_sum(paths, workers=2, chunk_bytes=1000) == expected
+    assert parallel_sum(str(first), workers=1) == sum_by_currency(values[:600])
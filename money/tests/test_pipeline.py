@@ -0,0 +1,140 @@
+import multiprocessing
+import threading
+from collections import namedtuple
+
+import pytest
+from six.moves import queue
+
+from money import Money, CurrencyMismatchException
+from money.pipeline import Pipeline
+
+Event = namedtuple('Event', 'id status amount')
+
+
+def make_events(count=100):
+    currencies = ['USD', 'EUR', 'JPY']
+    return [Event(i, 'paid' if i % 4 else 'failed', Money(i, currencies[i % 3])) for i in range(count)]
+
+
+def expected_totals(events):
+    totals = {}
+    for event in events:
+        code = event.amount.currency.code
+        totals[code] = totals.get(code, Money(0, code)) + event.amount
+    return totals
+
+
+def double(event):
+    return event._replace(amount=event.amount * 2)
+
+
+def test_filter_map_totals():
+    events = make_events()
+    paid = [double(event) for event in events if event.status == 'paid']
+    pipeline = Pipeline(events, maxsize=5).filter(lambda event: event.status == 'paid').map(double)
+    assert pipeline.totals(amount=lambda event: event.amount) == expected_totals(paid)
+
+
+def test_parallel_map_keeps_order():
+    events = make_events()
+    result = list(Pipeline(events).map(double, workers=4))
+    assert result == [double(event) for event in events]
+    result = list(Pipeline(events[:10]).map(double, workers=2, processes=True))
+    assert result == [double(event) for event in events[:10]]
+
+
+def test_windows():
+    events = make_events(10)
+    windows = list(Pipeline(events).window(size=4))
+    assert [[event.id for event in window] for window in windows] == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+
+    windows = list(Pipeline(events).window(key=lambda event: event.id // 3))
+    assert [len(window) for window in windows] == [3, 3, 3, 1]
+
+    sums = list(Pipeline(events).window(size=5).sums(amount=lambda event: event.amount))
+    assert sums == [expected_totals(events[:5]), expected_totals(events[5:])]
+
+    with pytest.raises(ValueError):
+        Pipeline(events).window()
+
+
+def test_currency_mismatch():
+    pipeline = Pipeline([Money(1, 'USD'), Money(1, 'EUR')])
+    with pytest.raises(CurrencyMismatchException):
+        pipeline.totals(currency='USD')
+    assert Pipeline([Money(1, 'USD'), None, Money(2, 'USD')]).totals(currency='USD') == {'USD': Money(3, 'USD')}
+
+
+def test_errors_are_raised():
+    def fail(event):
+        if event.id == 50:
+            raise KeyError(event.id)
+        return event
+    with pytest.raises(KeyError):
+        list(Pipeline(make_events()).map(fail).window(size=10))
+
+
+def test_queue_source_and_backpressure():
+    events = make_events(200)
+    full = threading.Event()
+    taken = []
+
+    class CountingQueue(queue.Queue):
+        def get(self, *args, **kwargs):
+            item = queue.Queue.get(self, *args, **kwargs)
+            taken.append(item)
+            if len(taken) == 7:
+                full.set()
+            return item
+
+    source = CountingQueue()
+    for event in events:
+        source.put(event)
+    source.put(None)
+    consumed = []
+    for event in Pipeline.from_queue(source, maxsize=2).map(double):
+        consumed.append(event)
+        if len(consumed) == 1:
+            # While the consumer waits, both queues of two fill up and each
+            # stage holds one more record it can not put: 1 + 3 + 3 taken
+            assert full.wait(5)
+            assert len(taken) == 7
+    assert consumed == [double(event) for event in events]
+
+
+def assert_stopped(pipeline):
+    for thread in pipeline.threads:
+        thread.join(5)
+    assert pipeline.threads and not any(thread.is_alive() for thread in pipeline.threads)
+
+
+def test_early_exit_stops_the_stages():
+    before = threading.active_count()
+    pipeline = Pipeline(make_events(1000), maxsize=1).map(double)
+    for event in pipeline:
+        break
+    assert_stopped(pipeline)
+    assert threading.active_count() == before
+
+    # The pools of parallel stages are terminated before their thread ends
+    pipeline = Pipeline(make_events(1000), maxsize=1).map(double, workers=3)
+    for event in pipeline:
+        break
+    assert_stopped(pipeline)
+    assert threading.active_count() == before
+
+    pipeline = Pipeline(make_events(1000), maxsize=1).map(double, workers=2, processes=True)
+    for event in pipeline:
+        break
+    assert_stopped(pipeline)
+    assert threading.active_count() == before
+    assert multiprocessing.active_children() == []
+
+    # A queue source is not waited on forever
+    events = queue.Queue()
+    events.put(make_events(1)[0])
+    pipeline = Pipeline.from_queue(events).map(double)
+    for event in pipeline:
+        break
+    assert_stopped(pipeline)
+    assert threading.active_count() == before
@@ -6,6 +6,7 @@ urlpatterns = patterns(
     '',
     url(r'^instance-view/$', instance_view),
     url(r'^model-view/$', model_view),
+    url(r'^error-view/$', error_view),
     url(r'^model-save-view/(?P<amount>\S+)/(?P<currency>\S+)/$', model_from_db_view),
     url(r'^model-form-view/(?P<amount>\S+)/(?P<currency>\S+)/$', model_form_view),
     url(r'^regular_form/$', regular_form),
@@ -27,6 +27,11 @@ def model_view(request):
     return render_to_response('view.html', {'money': money})
 
 
+def error_view(request):
+    Money('1.0', 'JPY')
+    raise ValueError("error_view")
+
+
 def model_from_db_view(request, amount='0', currency='XXX'):
     # db roundtrip
     instance = SimpleMoneyModel.objects.create(price=Money(amount, currency))